@@ -4301,10 +4301,7 @@ class OracleSchemeDefinition(url_.SchemeDefinition):
 		context = url_.getcontext(context)
 		# Use one :class:`OracleURLConnection` for each ``user@host`` combination
 		server = url.server
-		try:
-			connections = context.schemes["oracle"]
-		except KeyError:
-			connections = context.schemes["oracle"] = {}
+		connections = context.schemes.setdefault("oracle", {})
 		try:
 			connection = connections[server]
 		except KeyError:
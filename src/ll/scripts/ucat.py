@@ -35,6 +35,11 @@ Options
 	Prints directory content recursively.
 	(Valid flag values are ``false``, ``no``, ``0``, ``true``, ``yes`` or ``1``)
 
+.. option:: -z <flag>, --compress <flag>
+
+	Compress the data while it's transferred from or to ``ssh`` URLs?
+	(Valid flag values are ``false``, ``no``, ``0``, ``true``, ``yes`` or ``1``)
+
 .. option:: -x <flag>, --ignoreerrors <flag>
 
 	Ignores file i/o errors occurring during the output process (otherwise
@@ -103,20 +108,15 @@ def main(args=None):
 	def catone(urlread):
 		if urlread.isdir():
 			if args.recursive:
-				for u in urlread.walkfiles(include=args.include, exclude=args.exclude, enterdirs=args.enterdir, skipdirs=args.skipdir):
+				for u in urlread.walkfiles(include=args.include, exclude=args.exclude, enterdir=args.enterdir, skipdir=args.skipdir):
 					catone(urlread/u)
 			else:
 				raise IOError(errno.EISDIR, "Is a directory", str(urlread))
 		else:
 			try:
 				with contextlib.closing(urlread.open("rb")) as fileread:
-					size = 0
-					while True:
-						data = fileread.read(262144)
-						if data:
-							sys.stdout.buffer.write(data)
-						else:
-							break
+					for data in fileread.iterchunks(compress=args.compress):
+						sys.stdout.buffer.write(data)
 			except Exception:
 				if not args.ignoreerrors:
 					raise
@@ -124,6 +124,7 @@ def main(args=None):
 	p = argparse.ArgumentParser(description="print URL content on the screen", epilog="For more info see http://python.livinglogic.de/scripts_ucat.html")
 	p.add_argument("urls", metavar="url", help="URLs to be printed", nargs="+", type=url.URL)
 	p.add_argument("-r", "--recursive", dest="recursive", help="Print stuff recursively? (default: %(default)s)", action=misc.FlagAction, default=False)
+	p.add_argument("-z", "--compress", dest="compress", help="Compress data transferred via ssh? (default: %(default)s)", action=misc.FlagAction, default=False)
 	p.add_argument("-x", "--ignoreerrors", dest="ignoreerrors", help="Ignore errors? (default: %(default)s)", action=misc.FlagAction, default=False)
 	p.add_argument("-i", "--include", dest="include", metavar="PATTERN", help="Include only URLs matching PATTERN", action="append")
 	p.add_argument("-e", "--exclude", dest="exclude", metavar="PATTERN", help="Exclude URLs matching PATTERN", action="append")
@@ -92,6 +92,23 @@ Options
 	and trailing whitespace and ``collapse`` collapses whitespace into a single
 	space before comparing lines.
 
+.. option:: --brief <flag>
+
+	Only report which files differ instead of showing the differences.
+	(Valid flag values are ``false``, ``no``, ``0``, ``true``, ``yes`` or ``1``)
+
+.. option:: -j <integer>, --jobs <integer>
+
+	The number of file pairs that will be checked concurrently (default 1).
+	Each worker uses its own connections for remote URLs. The results are
+	still output in order, each one as soon as it is available.
+
+Before two files are compared line by line, :program:`udiff` compares their
+sizes and checksums (for ``ssh`` URLs the checksum is computed on the remote
+side). Files of different size are skipped without reading them. Local files
+are memory mapped for computing the checksum and the mapped content is reused
+for the diff, so large files aren't read into memory.
+
 
 Examples
 ========
@@ -108,6 +125,13 @@ Recursively compare two directories, but skip the ``.git`` directory:
 
 	$ udiff foo/ bar/ -r --skipdir=.git
 
+Recursively list the files that differ between a local and a remote directory,
+checking eight files at a time:
+
+.. sourcecode:: bash
+
+	$ udiff foo/ ssh://user@host/~/foo/ -r --brief -j8
+
 Recursively compare two Oracle schemas:
 
 .. sourcecode:: bash
@@ -116,7 +140,7 @@ Recursively compare two Oracle schemas:
 """
 
 
-import sys, argparse, difflib
+import sys, io, argparse, difflib, hashlib, collections, concurrent.futures
 
 from ll import misc, url
 
@@ -172,11 +196,32 @@ class Line:
 		return hash(self.compareline)
 
 
+class ViewReader(io.RawIOBase):
+	"""
+	A readable stream for the content of a :class:`memoryview`. This makes it
+	possible to read the lines of a memory mapped file without copying the
+	content of the file into memory.
+	"""
+
+	def __init__(self, view):
+		self.view = view
+		self.pos = 0
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+		size = min(len(buffer), len(self.view) - self.pos)
+		buffer[:size] = self.view[self.pos:self.pos+size]
+		self.pos += size
+		return size
+
+
 def main(args=None):
 	def comparedirs(url1, url2):
 		if args.recursive:
-			iter1 = url1.walkfiles(include=args.include, exclude=args.exclude, enterdirs=args.enterdir, skipdirs=args.skipdir)
-			iter2 = url2.walkfiles(include=args.include, exclude=args.exclude, enterdirs=args.enterdir, skipdirs=args.skipdir)
+			iter1 = url1.walkfiles(include=args.include, exclude=args.exclude, enterdir=args.enterdir, skipdir=args.skipdir)
+			iter2 = url2.walkfiles(include=args.include, exclude=args.exclude, enterdir=args.enterdir, skipdir=args.skipdir)
 		else:
 			iter1 = iter(url1.files(include=args.include, exclude=args.exclude))
 			iter2 = iter(url2.files(include=args.include, exclude=args.exclude))
@@ -213,18 +258,68 @@ def main(args=None):
 				yield (url1, file1, url2, file2)
 				file1 = file2 = None
 
-	def comparefiles(url1, url2):
+	def fingerprint(url):
+		# Return the checksum of :obj:`url` and its content. Local files are
+		# memory mapped, so hashing them doesn't read them into memory, and the
+		# mapped content can be reused by a diff without reading the file again.
+		# For remote files the checksum is computed on the remote side and the
+		# content is :const:`None`.
+		if url.islocal():
+			with url.open("rb") as f:
+				data = f.mmap()
+			return (hashlib.sha1(data).hexdigest(), data)
+		return (url.checksum(), None)
+
+	def identical(url1, url2):
+		# Return a tuple ``(same, data1, data2)``. ``same`` specifies whether the
+		# files :obj:`url1` and :obj:`url2` have the same content, by comparing
+		# size and checksum (or ``None`` if this can't be determined, e.g. for
+		# ``oracle`` URLs). ``data1`` and ``data2`` are the content of the files
+		# (as :class:`memoryview` objects) if they differ and they have been
+		# mapped already (else :const:`None`).
+		# With ``--jobs`` this runs in a worker thread.
+		try:
+			if url1.size() != url2.size():
+				return (False, None, None)
+			(checksum1, data1) = fingerprint(url1)
+			(checksum2, data2) = fingerprint(url2)
+		except (NotImplementedError, OSError):
+			return (None, None, None)
+		if checksum1 == checksum2:
+			return (True, None, None)
+		return (False, data1, data2)
+
+	def readlines(url, data=None):
+		if data is None:
+			stream = url.open("r", encoding=args.encoding, errors=args.errors)
+		else:
+			stream = io.TextIOWrapper(io.BufferedReader(ViewReader(data)), encoding=args.encoding, errors=args.errors)
+		return [Line(line[:-1], args.blank) for line in stream]
+
+	def comparefiles(url1, url2, same, data1=None, data2=None):
 		def header(prefix, style, url):
 			if prefix:
 				return style(f"{prefix} {url}")
 			else:
 				return style(str(url))
 
-		lines1 = [Line(line[:-1], args.blank) for line in url1.open("r", encoding=args.encoding, errors=args.errors)]
-		lines2 = [Line(line[:-1], args.blank) for line in url2.open("r", encoding=args.encoding, errors=args.errors)]
-
 		if args.verbose:
 			stderr.writeln(header("", s4comment, f"diff {url1} {url2}"))
+		if same:
+			return
+
+		if args.brief:
+			# Files with different content might still be equal when whitespace
+			# is ignored
+			if same is None or args.blank != "literal":
+				same = readlines(url1, data1) == readlines(url2, data2)
+			if not same:
+				stdout.writeln(s4changedfile(f"Files {url1} and {url2} differ"))
+			return
+
+		lines1 = readlines(url1, data1)
+		lines2 = readlines(url2, data2)
+
 		started = False
 		for group in difflib.SequenceMatcher(None, lines1, lines2).get_grouped_opcodes(args.context):
 			if not started:
@@ -245,6 +340,42 @@ def main(args=None):
 					for line in lines2[j1:j2]:
 						stdout.writeln(s4addedline("+", line.originalline))
 
+	def report(url1, file1, url2, file2, result):
+		if url1 is None:
+			stdout.writeln(str(file2), ": only in ", str(url2))
+		elif url2 is None:
+			stdout.writeln(str(file1), ": only in ", str(url1))
+		else:
+			comparefiles(url1/file1, url2/file2, *result)
+
+	def schedule(url1, file1, url2, file2):
+		if executor is None:
+			result = identical(url1/file1, url2/file2) if url1 is not None and url2 is not None else None
+			report(url1, file1, url2, file2, result)
+		else:
+			future = executor.submit(identical, url1/file1, url2/file2) if url1 is not None and url2 is not None else None
+			pending.append((url1, file1, url2, file2, future))
+			# Don't let too many results (which might include file content) pile up
+			reportfinished(2*args.jobs)
+
+	def reportfinished(limit):
+		# Report the results of the comparisons at the start of :obj:`pending`
+		# (in the order they were scheduled) as soon as they are finished. If
+		# more than :obj:`limit` comparisons are pending, wait for them.
+		while pending:
+			(url1, file1, url2, file2, future) = pending[0]
+			if future is not None and not future.done() and len(pending) <= limit:
+				break
+			pending.popleft()
+			report(url1, file1, url2, file2, future.result() if future is not None else None)
+
+	def initworker():
+		# Each worker thread uses its own connections (this is required for
+		# ``ssh`` URLs, as a connection can only be used by one thread at a time)
+		context = url.Context()
+		context.__enter__()
+		contexts.append(context)
+
 	p = argparse.ArgumentParser(description="Compare files line by line", epilog="For more info see http://python.livinglogic.de/scripts_udiff.html")
 	p.add_argument("url1", metavar="url1", help="first URL (directories require a trailing /)", type=url.URL)
 	p.add_argument("url2", metavar="url2", help="second URL (directories require a trailing /)", type=url.URL)
@@ -259,6 +390,8 @@ def main(args=None):
 	p.add_argument(      "--skipdir", dest="skipdir", metavar="PATTERN", help="Skip directories matching PATTERN", action="append")
 	p.add_argument("-n", "--context", dest="context", help="Number of context lines (default %(default)s)", type=int, default=2)
 	p.add_argument("-b", "--blank", dest="blank", help="How to treat whitespace (default %(default)s)", default="literal", choices=("literal", "trail", "lead", "both", "collapse"))
+	p.add_argument(      "--brief", dest="brief", help="Only report whether files differ? (default %(default)s)", action=misc.FlagAction, default=False)
+	p.add_argument("-j", "--jobs", dest="jobs", metavar="INTEGER", help="Number of files to check concurrently (default: %(default)s)", type=int, default=1)
 
 	args = p.parse_args(args)
 
@@ -272,31 +405,42 @@ def main(args=None):
 	stderr = astyle.Stream(sys.stderr, color)
 
 
-	with url.Context():
-		if not args.url1.exists():
-			print(f"{args.url1} doesn't exist")
-			return 1
-		if not args.url2.exists():
-			print(f"{args.url2} doesn't exist")
-			return 1
-		if args.url1.isfile():
-			if args.url2.isfile():
-				comparefiles(args.url1, args.url2)
-			else:
-				print(f"Can't compare file {args.url1} with directory {args.url2}")
+	executor = None
+	pending = collections.deque()
+	contexts = []
+	if args.jobs > 1:
+		executor = concurrent.futures.ThreadPoolExecutor(args.jobs, initializer=initworker)
+
+	try:
+		with url.Context():
+			if not args.url1.exists():
+				print(f"{args.url1} doesn't exist")
 				return 1
-		else:
-			if args.url2.isfile():
-				print(f"Can't compare directory {args.url1} with file {args.url2}")
+			if not args.url2.exists():
+				print(f"{args.url2} doesn't exist")
 				return 1
+			if args.url1.isfile():
+				if args.url2.isfile():
+					comparefiles(args.url1, args.url2, *identical(args.url1, args.url2))
+				else:
+					print(f"Can't compare file {args.url1} with directory {args.url2}")
+					return 1
 			else:
-				for (url1, file1, url2, file2) in comparedirs(args.url1, args.url2):
-					if url1 is None:
-						stdout.writeln(str(file2), ": only in ", str(url2))
-					elif url2 is None:
-						stdout.writeln(str(file1), ": only in ", str(url1))
-					else:
-						comparefiles(url1/file1, url2/file2)
+				if args.url2.isfile():
+					print(f"Can't compare directory {args.url1} with file {args.url2}")
+					return 1
+				else:
+					for (url1, file1, url2, file2) in comparedirs(args.url1, args.url2):
+						schedule(url1, file1, url2, file2)
+					reportfinished(0)
+	finally:
+		if executor is not None:
+			for (url1, file1, url2, file2, future) in pending:
+				if future is not None:
+					future.cancel()
+			executor.shutdown()
+			for context in contexts:
+				context.closeall()
 
 
 if __name__ == "__main__":
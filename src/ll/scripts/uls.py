@@ -226,12 +226,19 @@ def main(args=None):
 		else:
 			return (0, 0)
 
-	def printone(url):
+	def printone(url, cursor=None):
+		# If :obj:`cursor` is given, it's the :class:`url_.Cursor` for :obj:`url`
+		# and will be used to get the metadata of :obj:`url`
 		if args.long:
 			sep = style_pad(args.separator)
-			stat = url.stat()
-			owner = url.owner()
-			group = url.group()
+			if cursor is not None:
+				stat = cursor.stat()
+				owner = cursor.owner()
+				group = cursor.group()
+			else:
+				stat = url.stat()
+				owner = url.owner()
+				group = url.group()
 			mtime = datetime.datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
 			mode = "".join([text[bool(stat.st_mode&bit)] for (bit, text) in modedata])
 			size = stat.st_size
@@ -246,7 +253,7 @@ def main(args=None):
 						break
 					size /= 1024.
 			stdout.write(mode, sep, rpad(owner, 8), sep, rpad(group, 8), sep, lpad(size, 5 if args.human else 12), sep, lpad(stat.st_nlink, 3), sep, mtime, sep)
-		if url.isdir():
+		if cursor.isdir if cursor is not None else url.isdir():
 			stdout.writeln(style_dir(str(url)))
 		else:
 			stdout.writeln(style_file(str(url)))
@@ -288,13 +295,15 @@ def main(args=None):
 					urls = [(url/child, str(child)) for child in url.listdir(include=args.include, exclude=args.exclude, ignorecase=args.ignorecase)]
 					printblock(None, urls)
 			else:
-				for child in url.listdir(include=args.include, exclude=args.exclude, ignorecase=args.ignorecase):
-					child = url/child
-					isdir = child.isdir()
-					if not args.recursive or isdir: # For files the print call is done by the recursive call to ``printall``
-						printone(child)
-					if args.recursive and (not isdir or url_.matchpatterns(child.path[-2], enterdir, skipdir)):
-						printall(base, child)
+				# Use :meth:`walk` instead of :meth:`listdir`, so that we can reuse the
+				# metadata collected during the traversal
+				for cursor in url.walk(beforedir=True, afterdir=False, file=True, enterdir=False):
+					isdir = cursor.isdir
+					if url_.matchpatterns(cursor.url.path[-1-isdir], include, exclude):
+						child = url/cursor.url
+						printone(child, cursor)
+						if args.recursive and isdir and url_.matchpatterns(child.path[-2], enterdir, skipdir):
+							printall(base, child)
 		else:
 			printone(url)
 
@@ -325,6 +334,8 @@ def main(args=None):
 	stdout = astyle.Stream(sys.stdout, color)
 	stderr = astyle.Stream(sys.stderr, color)
 
+	include = url_.compilepattern(args.include, ignorecase=args.ignorecase)
+	exclude = url_.compilepattern(args.exclude, ignorecase=args.ignorecase)
 	enterdir = url_.compilepattern(args.enterdir, ignorecase=args.ignorecase)
 	skipdir = url_.compilepattern(args.skipdir, ignorecase=args.ignorecase)
 
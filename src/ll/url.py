@@ -37,8 +37,9 @@ These three levels of functionality are implemented in three classes:
 
 
 import os, urllib.request, urllib.error, urllib.parse as urlparse, mimetypes, io, warnings
-import datetime, cgi, re, fnmatch, pickle, errno, threading
-import email
+import datetime, cgi, re, collections, fnmatch, pickle, errno, threading, hashlib, time, marshal, http.client
+import asyncio, functools, itertools, weakref, mmap, concurrent.futures
+import email, email.parser
 from email import utils
 
 default_ssh_python = os.environ.get("LL_URL_SSH_PYTHON")
@@ -55,6 +56,11 @@ try:
 except ImportError:
 	pass
 
+try:
+	import zlib
+except ImportError:
+	zlib = None
+
 try:
 	from PIL import Image
 except ImportError:
@@ -106,7 +112,17 @@ def _normalizepath(path_segments):
 	return new_path_segments
 
 
+_unsafesearch = {} # Maps "safe" strings to the :meth:`search` method of a regular expression for the characters :func:`urlparse.quote` would escape
+
 def _escape(s, safe="".join(chr(c) for c in range(128))):
+	# Most strings don't need escaping at all, so check this first, as
+	# :func:`urlparse.quote` is rather slow
+	try:
+		search = _unsafesearch[safe]
+	except KeyError:
+		search = _unsafesearch[safe] = re.compile(f"[^{re.escape(safe)}A-Za-z0-9_.~\\-]").search
+	if search(s) is None:
+		return s
 	return urlparse.quote(s, safe)
 
 
@@ -125,6 +141,23 @@ fragsafe = alphanum
 schemecharfirst = alpha
 schemechar = alphanum + "+-."
 
+# Matches path strings that are unchanged by unescaping and escaping their segments
+_plainpath = re.compile(f"[{re.escape(pathsafe)}/]*").fullmatch
+
+# Matches (non-empty) file names that can be appended to a path without any
+# further processing (no escaping, no scheme, no query, no fragment, no ``.``/``..``)
+_plainname = re.compile(f"(?!\\.\\.?$)[{re.escape(pathsafe.replace(':', ''))}]+").fullmatch
+
+# Matches the directory part of a path (including the final ``/``) that
+# doesn't contain any empty, ``.`` or ``..`` segments
+_normalizedhead = re.compile(r"/?(?:(?!\.\.?/)[^/]+/)*").fullmatch
+
+# Matches the scheme at the start of an URL (RFC2396, Section 3.1)
+_schemeprefix = re.compile(f"([{alpha}][{re.escape(schemechar)}]*):").match
+
+_parsecache = collections.OrderedDict() # Maps URL strings to their parsed components
+_parsecachesize = 1000
+
 
 def _urlencode(query_parts):
 	if query_parts is not None:
@@ -173,17 +206,103 @@ class Context(object):
 	object will be used for all :meth:`open` and :meth:`connect` calls inside the
 	:keyword:`with` block. (Note that after the end of the :keyword:`with` block
 	all connections will be closed.)
+
+	:obj:`httpcache` can be an :class:`HTTPCache` object (or the name of a
+	directory for one). It will then be used for all ``http`` and ``https``
+	requests made in this context.
+
+	:obj:`metacache` can be a :class:`MetadataCache` object (or :const:`True`
+	to create one). It will then be used to cache the results of the
+	:class:`URL` methods :meth:`~URL.mdate`, :meth:`~URL.size`,
+	:meth:`~URL.exists`, :meth:`~URL.isdir`, :meth:`~URL.isfile` and
+	:meth:`~URL.mimetype` in this context.
+
+	The asynchronous methods of :class:`URL` (:meth:`~URL.aopen`,
+	:meth:`~URL.amdate` etc.) run blocking operations in a thread pool of at
+	most :obj:`maxthreads` threads. At most :obj:`maxperhost` operations will
+	be running concurrently for each server (and only one for connections
+	that can't be used from multiple threads, like those for ``ssh`` and
+	``oracle`` URLs).
 	"""
-	def __init__(self):
+	def __init__(self, httpcache=None, metacache=None, maxthreads=16, maxperhost=8):
 		self.schemes = {}
+		self.maxthreads = maxthreads
+		self.maxperhost = maxperhost
+		self._executor = None
+		self._limits = weakref.WeakKeyDictionary() # Maps event loops to dictionaries mapping servers or connections to semaphores
+		self._lock = threading.Lock()
+		self._connectlocks = {} # Maps ``(scheme, server)`` to locks serializing the creation of connections
+		if httpcache is not None and not isinstance(httpcache, HTTPCache):
+			httpcache = HTTPCache(httpcache)
+		self.httpcache = httpcache
+		if metacache is True:
+			metacache = MetadataCache()
+		elif metacache is False:
+			metacache = None
+		self.metacache = metacache
 
 	def closeall(self):
 		"""
 		Close and drop all connections in this context.
 		"""
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
 		for scheme in self.schemes:
 			schemereg[scheme].closeall(self)
 		self.schemes = {}
+		self._connectlocks = {}
+
+	def _getlimit(self, url, connection=None):
+		# Return the semaphore that limits the number of concurrent operations
+		# for :obj:`url` (using :obj:`connection`) in the running event loop
+		limits = self._limits.setdefault(asyncio.get_running_loop(), {})
+		if connection is not None and not connection.threadsafe:
+			(key, value) = (connection, 1)
+		else:
+			(key, value) = ((url.scheme, url.server), self.maxperhost)
+		try:
+			return limits[key]
+		except KeyError:
+			limit = limits[key] = asyncio.Semaphore(value)
+			return limit
+
+	async def _arun(self, limit, function, *args, **kwargs):
+		# Run ``function(*args, **kwargs)`` in the thread pool (as soon as
+		# :obj:`limit` permits it)
+		with self._lock:
+			if self._executor is None:
+				self._executor = concurrent.futures.ThreadPoolExecutor(self.maxthreads, thread_name_prefix="ll.url")
+			executor = self._executor
+		async with limit:
+			return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+	async def _aconnect(self, url, **kwargs):
+		# Return the connection for :obj:`url` and the remaining keyword
+		# arguments. As creating a connection might block (e.g. for ``oracle``
+		# URLs), this is done in the thread pool too.
+		def connect():
+			# Only connecting to the same server is serialized (so that only one
+			# connection gets created for it), connecting to other servers might
+			# run concurrently. The context wide lock is only held for fetching
+			# the server lock.
+			with self._lock:
+				lock = self._connectlocks.setdefault((url.scheme, url.server), threading.Lock())
+			with lock:
+				(connection, kwargs_) = url._connect(context=self, **kwargs)
+			kwargs_.pop("context", None)
+			return (connection, kwargs_)
+		return await self._arun(self._getlimit(url), connect)
+
+	async def _aiterate(self, limit, iterator, batchsize=100):
+		# Asynchronously iterate through the blocking :obj:`iterator` fetching
+		# :obj:`batchsize` items at once in the thread pool
+		while True:
+			batch = await self._arun(limit, list, itertools.islice(iterator, batchsize))
+			if not batch:
+				break
+			for item in batch:
+				yield item
 
 	def __enter__(self):
 		self.prev = threadlocalcontext.context
@@ -195,6 +314,205 @@ class Context(object):
 		self.closeall()
 
 
+class MetadataCache(object):
+	"""
+	A :class:`MetadataCache` caches the results of the :class:`URL` methods
+	:meth:`~URL.mdate`, :meth:`~URL.size`, :meth:`~URL.exists`,
+	:meth:`~URL.isdir`, :meth:`~URL.isfile` and :meth:`~URL.mimetype`, when
+	it is used as the ``metacache`` of a :class:`Context`.
+
+	If :obj:`ttl` is not :const:`None` (a number of seconds or a
+	:class:`datetime.timedelta` object) cached values expire after this time,
+	otherwise they are kept until they are invalidated. Writing to a URL and
+	calling :meth:`~URL.remove`, :meth:`~URL.rename`, :meth:`~URL.mkdir` etc.
+	through the same :class:`Context` invalidate the cache for the URLs
+	involved (and for their parent directories) automatically. While a URL is
+	open for writing, results for it are not cached at all; the cache is
+	invalidated once more when the resource is closed. Changes made by other means
+	(e.g. by other processes or directly via a :class:`Connection`) require
+	calling :meth:`invalidate`.
+
+	Local URLs are cached under their absolute path (using the current
+	directory at the time of the call), so different spellings of the same
+	file share their cached values.
+
+	The attributes :attr:`hits` and :attr:`misses` count how many calls have
+	been answered from the cache and how many had to go to the connection.
+
+	Note that exceptions (e.g. for calling :meth:`~URL.mdate` on a file that
+	doesn't exist) are not cached.
+	"""
+	def __init__(self, ttl=None):
+		if isinstance(ttl, datetime.timedelta):
+			ttl = ttl.total_seconds()
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._entries = {} # Maps keys (see :meth:`_key`) to dictionaries mapping method names to ``(timestamp, value)``
+		self._children = {} # Maps keys to the set of keys one level below them that have entries (directly or below them)
+		self._writing = {} # Maps keys to the number of resources open for writing
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__qualname__} ttl={self.ttl!r} hits={self.hits!r} misses={self.misses!r} at {id(self):#x}>"
+
+	def __len__(self):
+		return len(self._entries)
+
+	@staticmethod
+	def _key(url):
+		# Return the cache key for :obj:`url`. Local URLs are made absolute, so
+		# that different spellings of the same file share their entry and
+		# relative URLs still refer to the right file after the current
+		# directory has been changed. Keys never end with a ``/``, so the key of
+		# the parent directory can be found by stripping the last path segment.
+		if not isinstance(url, URL):
+			url = URL(url)
+		if url.islocal():
+			path = os.path.abspath(url.local())
+			if os.sep != "/":
+				path = path.replace(os.sep, "/")
+			key = f"file:{path}"
+		else:
+			key = str(url)
+		return key.rstrip("/")
+
+	@staticmethod
+	def _parent(key):
+		# Return the key of the parent of :obj:`key` (or :const:`None`)
+		(parent, sep, name) = key.rpartition("/")
+		return parent if sep else None
+
+	def get(self, url, name, function):
+		"""
+		Return the cached result of the method named :obj:`name` for :obj:`url`.
+		If there is no such result (or it has expired) call :obj:`function`
+		(without arguments) to get it and put it into the cache.
+		"""
+		key = self._key(url)
+		(found, value) = self._lookup(key, name)
+		if found:
+			return value
+		value = function()
+		self._store(key, name, value)
+		return value
+
+	async def aget(self, url, name, function):
+		"""
+		Asynchronous version of :meth:`get`: :obj:`function` must return an
+		awaitable.
+		"""
+		key = self._key(url)
+		(found, value) = self._lookup(key, name)
+		if found:
+			return value
+		value = await function()
+		self._store(key, name, value)
+		return value
+
+	def _lookup(self, key, name):
+		# Return ``(True, value)`` for a valid cached result, else ``(False, None)``
+		if key not in self._writing:
+			entry = self._entries.get(key)
+			if entry is not None and name in entry:
+				(timestamp, value) = entry[name]
+				if self.ttl is None or time.monotonic() - timestamp < self.ttl:
+					self.hits += 1
+					return (True, value)
+		self.misses += 1
+		return (False, None)
+
+	def _store(self, key, name, value):
+		if key not in self._writing:
+			entry = self._entries.get(key)
+			if entry is None:
+				entry = self._entries[key] = {}
+				# Link the key into the tree of keys, so that :meth:`invalidate`
+				# finds the entries below a URL without checking all of them
+				child = key
+				parent = self._parent(child)
+				while parent is not None:
+					children = self._children.get(parent)
+					if children is not None:
+						children.add(child)
+						break
+					self._children[parent] = {child}
+					child = parent
+					parent = self._parent(child)
+			entry[name] = (time.monotonic() if self.ttl is not None else None, value)
+
+	def invalidate(self, url=None, parents=False):
+		"""
+		Remove the cached results for :obj:`url` and everything below it.
+		If :obj:`parents` is true the cached results for the URLs above it will
+		be removed too. If :obj:`url` is :const:`None` the complete cache will be
+		cleared.
+		"""
+		if url is None:
+			self._entries.clear()
+			self._children.clear()
+			return
+		self._invalidate(self._key(url), parents)
+
+	def _invalidate(self, key, parents):
+		# Remove the entries for :obj:`key` and everything below it
+		keys = [key]
+		while keys:
+			key2 = keys.pop()
+			self._entries.pop(key2, None)
+			keys.extend(self._children.pop(key2, ()))
+		# Unlink :obj:`key` from the tree (and its parents, if nothing else is
+		# below them) and remove the entries of the parents if requested
+		child = key
+		parent = self._parent(child)
+		unlink = True
+		while parent is not None and (unlink or parents):
+			if parents:
+				self._entries.pop(parent, None)
+			if unlink:
+				children = self._children.get(parent)
+				if children is None:
+					unlink = False
+				else:
+					children.discard(child)
+					if children or parent in self._entries:
+						unlink = False
+					else:
+						del self._children[parent]
+			child = parent
+			parent = self._parent(child)
+
+	def _beginwrite(self, url):
+		# :obj:`url` is about to be opened for writing (which might create
+		# parent directories too): Don't cache results for it until
+		# :meth:`_endwrite` is called with the key returned from here
+		key = self._key(url)
+		self._writing[key] = self._writing.get(key, 0) + 1
+		self._invalidate(key, True)
+		return key
+
+	def _endwrite(self, key):
+		count = self._writing.pop(key, 1) - 1
+		if count:
+			self._writing[key] = count
+		self._invalidate(key, True)
+
+	def _track(self, key, resource):
+		# Make closing :obj:`resource` (which has been opened for writing) end
+		# the write to :obj:`key`
+		close = resource.close
+		closed = False
+		def trackingclose():
+			nonlocal closed
+			try:
+				return close()
+			finally:
+				if not closed:
+					closed = True
+					self._endwrite(key)
+		resource.close = trackingclose
+		return resource
+
+
 class ThreadLocalContext(threading.local):
 	context = Context()
 
@@ -239,6 +557,12 @@ class Cursor(object):
 	``isfile``
 		Tur if ``url`` refers to a regular file.
 
+	``entry``
+		The :class:`os.DirEntry` object for ``url`` if the traversal is done
+		on the local filesystem, :const:`None` otherwise. Use :meth:`stat`,
+		:meth:`owner` and :meth:`group` to access the metadata of ``url``
+		without additional system calls where possible.
+
 	The following attributes specify which part of the tree should be traversed:
 
 	``beforedir``
@@ -274,6 +598,51 @@ class Cursor(object):
 		self.file = self._file = file
 		self.enterdir = self._enterdir = enterdir
 		self.isdir = self.isfile = None
+		self.entry = None
+		self._stat = None # :func:`stat` result delivered by a remote traversal
+		self._names = {} # Cache for user and group names
+
+	def stat(self):
+		"""
+		Return the result of a :func:`stat` call for the current URL.
+
+		For local traversals the result is cached by the :class:`os.DirEntry`
+		object, so calling :meth:`stat` (or :meth:`owner` and :meth:`group`)
+		multiple times for the same entry requires at most one system call.
+		For ``ssh`` traversals the result is transferred together with the
+		directory listing.
+		"""
+		if self.entry is not None:
+			return self.entry.stat()
+		elif self._stat is not None:
+			return self._stat
+		return (self.rooturl/self.url).stat()
+
+	def owner(self):
+		"""
+		Return the name of the owner of the current URL.
+		"""
+		if self.entry is not None:
+			uid = self.entry.stat().st_uid
+			try:
+				return self._names[("u", uid)]
+			except KeyError:
+				name = self._names[("u", uid)] = pwd.getpwuid(uid)[0]
+				return name
+		return (self.rooturl/self.url).owner()
+
+	def group(self):
+		"""
+		Return the name of the group of the current URL.
+		"""
+		if self.entry is not None:
+			gid = self.entry.stat().st_gid
+			try:
+				return self._names[("g", gid)]
+			except KeyError:
+				name = self._names[("g", gid)] = grp.getgrgid(gid)[0]
+				return name
+		return (self.rooturl/self.url).group()
 
 	def restore(self):
 		"""
@@ -293,6 +662,8 @@ class Connection(object):
 	:meth:`connect` method on a :class:`URL` object.
 	"""
 
+	threadsafe = False # Can the connection be used from multiple threads at the same time?
+
 	@misc.notimplemented
 	def stat(self, url):
 		"""
@@ -433,6 +804,20 @@ class Connection(object):
 		"""
 		return datetime.datetime.utcfromtimestamp(self.stat(url).st_mtime)
 
+	def checksum(self, url, algorithm="sha1"):
+		"""
+		Return the hex digest of the content of the file :obj:`url` using the
+		hash algorithm :obj:`algorithm` (any name supported by
+		:func:`hashlib.new`).
+
+		For remote files the hash is computed on the remote side.
+		"""
+		hash = hashlib.new(algorithm)
+		with self.open(url, "rb") as stream:
+			for chunk in stream.iterchunks():
+				hash.update(chunk)
+		return hash.hexdigest()
+
 	def resheaders(self, url):
 		"""
 		Return the MIME headers for the file/resource :obj:`url`.
@@ -487,6 +872,15 @@ class Connection(object):
 		Create the directory :obj:`url`.
 		"""
 
+	def stat_many(self, urls):
+		"""
+		Return a list with the results of :func:`stat` calls on all URLs in
+		:obj:`urls`.
+
+		For remote connections this requires only one round trip.
+		"""
+		return [self.stat(url) for url in urls]
+
 	@misc.notimplemented
 	def makedirs(self, url, mode=0o777):
 		"""
@@ -687,6 +1081,8 @@ class Connection(object):
 
 
 class LocalConnection(Connection):
+	threadsafe = True
+
 	def _url2filename(self, url):
 		return os.path.expanduser(url.local())
 
@@ -793,15 +1189,21 @@ class LocalConnection(Connection):
 			cursor.event = event
 			cursor.isdir = event != "file"
 			cursor.isfile = not cursor.isdir
+			cursor.entry = entry
 			return cursor
 
 		if name:
 			fullname = os.path.join(base, name)
 		else:
 			fullname = base
-		for childname in sorted(os.listdir(fullname)):
-			fullchildname = os.path.join(fullname, childname)
-			isdir = os.path.isdir(fullchildname)
+		# :func:`os.scandir` gives us the file type without an additional
+		# :func:`stat` call (on most platforms) and caches the :func:`stat`
+		# result for the consumer of the generator
+		with os.scandir(fullname) as entries:
+			entries = sorted(entries, key=lambda entry: entry.name)
+		for entry in entries:
+			childname = entry.name
+			isdir = entry.is_dir()
 			relchildname = os.path.join(name, childname) if name else childname
 			emitbeforedir = cursor.beforedir
 			emitafterdir = cursor.afterdir
@@ -838,7 +1240,12 @@ class LocalConnection(Connection):
 
 class SshConnection(Connection):
 	remote_code = """
-		import sys, os, pickle, re, fnmatch
+		import sys, os, pickle, re, fnmatch, threading
+		from stat import S_ISDIR
+		try:
+			import zlib
+		except ImportError:
+			zlib = None
 		try:
 			from urllib import request
 		except ImportError:
@@ -898,115 +1305,257 @@ class SshConnection(Connection):
 				result.append((isdir, childname))
 			return result
 
-		while True:
-			(filename, cmdname, args, kwargs) = channel.receive()
-			if isinstance(filename, unicode):
-				filename = os.path.expanduser(request.url2pathname(filename))
-			data = None
+		def listdirstat(dirname):
+			result = []
+			for childname in sorted(os.listdir(dirname)):
+				fullchildname = os.path.join(dirname, childname)
+				try:
+					stat = tuple(os.stat(fullchildname))
+				except OSError: # e.g. a dangling symlink
+					result.append((False, childname, None))
+				else:
+					result.append((S_ISDIR(stat[0]), childname, stat))
+			return result
+
+		def walk(dirname, files=True, dirs=True, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False):
+			include = compilepattern(include, ignorecase)
+			exclude = compilepattern(exclude, ignorecase)
+			enterdir = compilepattern(enterdir, ignorecase)
+			skipdir = compilepattern(skipdir, ignorecase)
+			result = []
+			def _walk(name):
+				fullname = os.path.join(dirname, name) if name else dirname
+				for (isdir, childname) in listdir(fullname):
+					relchildname = os.path.join(name, childname) if name else childname
+					if (dirs if isdir else files) and matchpatterns(childname, include, exclude):
+						result.append((isdir, relchildname))
+					if isdir and matchpatterns(childname, enterdir, skipdir):
+						_walk(relchildname)
+			_walk("")
+			return result
+
+		def readstream(streamchannel, stream, chunksize, compress, window):
+			# Send the rest of ``stream`` as a sequence of chunks terminated by an
+			# empty one. The client acknowledges each chunk (with ``None``), but
+			# we only wait for the acknowledgements if ``window`` chunks are
+			# unacknowledged. When the client doesn't want any more chunks (either
+			# because it got the empty one or because it stopped early) it sends
+			# ``False``, after that we stop reading.
+			inflight = 0
+			ended = False # Have we sent the empty chunk?
+			stopped = False # Has the client sent ``False``?
 			try:
-				if cmdname == "open":
-					try:
-						stream = open(filename, *args, **kwargs)
-					except IOError:
-						exc = sys.exc_info()[1]
-						if args:
-							mode = args[0]
-						else:
-							mode = kwargs.get("mode", "rb")
-						if "w" not in mode or exc.errno != 2: # didn't work for some other reason than a non existing directory
-							raise
-						(splitpath, splitname) = os.path.split(filename)
-						if splitpath:
-							os.makedirs(splitpath)
-							stream = open(filename, *args, **kwargs)
+				while True:
+					while inflight >= window and not stopped:
+						if streamchannel.receive() is False:
+							stopped = True
 						else:
-							raise # we don't have a directory to make so pass the error on
-					data = id(stream)
-					files[data] = stream
-				elif cmdname == "stat":
-					if isinstance(filename, unicode):
-						data = tuple(os.stat(filename))
+							inflight -= 1
+					if stopped:
+						break
+					data = stream.read(chunksize)
+					if data and compress:
+						data = zlib.compress(data, compress)
+					streamchannel.send(data)
+					inflight += 1
+					if not data:
+						ended = True
+						break
+			finally:
+				# If reading failed, tell the client that no more chunks will come
+				if not ended and not stopped:
+					streamchannel.send(b"")
+					inflight += 1
+				# Consume the outstanding acknowledgements and wait for the client
+				# to stop, so that the result will be read correctly
+				while inflight or not stopped:
+					if streamchannel.receive() is False:
+						stopped = True
 					else:
-						data = tuple(os.fstat(files[filename].fileno()))
-				elif cmdname == "lstat":
-					data = os.lstat(filename)
-				elif cmdname == "close":
+						inflight -= 1
+
+		def writestream(streamchannel, stream, compress):
+			# Receive chunks until an empty one arrives and acknowledge each one.
+			# If writing fails, the rest of the chunks will be consumed anyway.
+			exc = None
+			while True:
+				data = streamchannel.receive()
+				if not data:
+					break
+				streamchannel.send(None)
+				if exc is None:
 					try:
-						stream = files[filename]
-					except KeyError:
-						pass
+						if compress:
+							data = zlib.decompress(data)
+						stream.write(data)
+					except Exception:
+						exc = sys.exc_info()[1]
+			if exc is not None:
+				raise exc
+
+		def startstream(function, stream, *args):
+			# Run the stream ``function`` in its own thread using its own channel
+			# (the last argument) and send the result over this channel, so that
+			# the main channel can be used for other commands (and other streams)
+			# in the meantime
+			streamchannel = args[-1]
+			args = args[:-1]
+			def target():
+				try:
+					data = function(streamchannel, stream, *args)
+				except Exception:
+					exc = sys.exc_info()[1]
+					streamchannel.send((True, pickle.dumps(exc)))
+				else:
+					streamchannel.send((False, data))
+			thread = threading.Thread(target=target)
+			thread.daemon = True
+			thread.start()
+
+		def execute(filename, cmdname, args, kwargs):
+			if isinstance(filename, unicode):
+				filename = os.path.expanduser(request.url2pathname(filename))
+			data = None
+			if cmdname == "open":
+				try:
+					stream = open(filename, *args, **kwargs)
+				except IOError:
+					exc = sys.exc_info()[1]
+					if args:
+						mode = args[0]
 					else:
-						stream.close()
-						del files[filename]
-				elif cmdname == "chmod":
-					data = os.chmod(filename, *args, **kwargs)
-				elif cmdname == "chown":
-					(owner, group) = ownergroup(filename, *args, **kwargs)
-					if owner is not None:
-						data = os.chown(filename, owner, group)
-				elif cmdname == "lchown":
-					(owner, group) = ownergroup(filename, *args, **kwargs)
-					if owner is not None:
-						data = os.lchown(filename, owner, group)
-				elif cmdname == "uid":
-					stat = os.stat(filename)
-					data = stat.st_uid
-				elif cmdname == "gid":
-					stat = os.stat(filename)
-					data = stat.st_gid
-				elif cmdname == "owner":
-					import pwd
-					stat = os.stat(filename)
-					data = unicode(pwd.getpwuid(stat.st_uid)[0])
-				elif cmdname == "group":
-					import grp
-					stat = os.stat(filename)
-					data = unicode(grp.getgrgid(stat.st_gid)[0])
-				elif cmdname == "exists":
-					data = os.path.exists(filename)
-				elif cmdname == "isfile":
-					data = os.path.isfile(filename)
-				elif cmdname == "isdir":
-					data = os.path.isdir(filename)
-				elif cmdname == "islink":
-					data = os.path.islink(filename)
-				elif cmdname == "ismount":
-					data = os.path.ismount(filename)
-				elif cmdname == "access":
-					data = os.access(filename, *args, **kwargs)
-				elif cmdname == "remove":
-					data = os.remove(filename)
-				elif cmdname == "rmdir":
-					data = os.rmdir(filename)
-				elif cmdname == "rename":
-					data = os.rename(filename, os.path.expanduser(args[0]))
-				elif cmdname == "link":
-					data = os.link(filename, os.path.expanduser(args[0]))
-				elif cmdname == "symlink":
-					data = os.symlink(filename, os.path.expanduser(args[0]))
-				elif cmdname == "chdir":
-					data = os.chdir(filename)
-				elif cmdname == "mkdir":
-					data = os.mkdir(filename)
-				elif cmdname == "makedirs":
-					data = os.makedirs(filename)
-				elif cmdname == "makefifo":
-					data = os.makefifo(filename)
-				elif cmdname == "listdir":
-					data = listdir(filename)
-				elif cmdname == "next":
-					data = next(files[filename])
+						mode = kwargs.get("mode", "rb")
+					if "w" not in mode or exc.errno != 2: # didn't work for some other reason than a non existing directory
+						raise
+					(splitpath, splitname) = os.path.split(filename)
+					if splitpath:
+						try:
+							os.makedirs(splitpath)
+						except OSError:
+							if not os.path.isdir(splitpath): # somebody else might have created the directory in the meantime
+								raise
+						stream = open(filename, *args, **kwargs)
+					else:
+						raise # we don't have a directory to make so pass the error on
+				data = id(stream)
+				files[data] = stream
+			elif cmdname == "stat":
+				if isinstance(filename, unicode):
+					data = tuple(os.stat(filename))
 				else:
-					data = getattr(files[filename], cmdname)
-					data = data(*args, **kwargs)
+					data = tuple(os.fstat(files[filename].fileno()))
+			elif cmdname == "lstat":
+				data = os.lstat(filename)
+			elif cmdname == "close":
+				try:
+					stream = files[filename]
+				except KeyError:
+					pass
+				else:
+					stream.close()
+					del files[filename]
+			elif cmdname == "chmod":
+				data = os.chmod(filename, *args, **kwargs)
+			elif cmdname == "chown":
+				(owner, group) = ownergroup(filename, *args, **kwargs)
+				if owner is not None:
+					data = os.chown(filename, owner, group)
+			elif cmdname == "lchown":
+				(owner, group) = ownergroup(filename, *args, **kwargs)
+				if owner is not None:
+					data = os.lchown(filename, owner, group)
+			elif cmdname == "uid":
+				stat = os.stat(filename)
+				data = stat.st_uid
+			elif cmdname == "gid":
+				stat = os.stat(filename)
+				data = stat.st_gid
+			elif cmdname == "owner":
+				import pwd
+				stat = os.stat(filename)
+				data = unicode(pwd.getpwuid(stat.st_uid)[0])
+			elif cmdname == "group":
+				import grp
+				stat = os.stat(filename)
+				data = unicode(grp.getgrgid(stat.st_gid)[0])
+			elif cmdname == "exists":
+				data = os.path.exists(filename)
+			elif cmdname == "isfile":
+				data = os.path.isfile(filename)
+			elif cmdname == "isdir":
+				data = os.path.isdir(filename)
+			elif cmdname == "islink":
+				data = os.path.islink(filename)
+			elif cmdname == "ismount":
+				data = os.path.ismount(filename)
+			elif cmdname == "access":
+				data = os.access(filename, *args, **kwargs)
+			elif cmdname == "remove":
+				data = os.remove(filename)
+			elif cmdname == "rmdir":
+				data = os.rmdir(filename)
+			elif cmdname == "rename":
+				data = os.rename(filename, os.path.expanduser(args[0]))
+			elif cmdname == "link":
+				data = os.link(filename, os.path.expanduser(args[0]))
+			elif cmdname == "symlink":
+				data = os.symlink(filename, os.path.expanduser(args[0]))
+			elif cmdname == "chdir":
+				data = os.chdir(filename)
+			elif cmdname == "mkdir":
+				data = os.mkdir(filename)
+			elif cmdname == "makedirs":
+				data = os.makedirs(filename)
+			elif cmdname == "makefifo":
+				data = os.makefifo(filename)
+			elif cmdname == "listdir":
+				data = listdir(filename)
+			elif cmdname == "listdirstat":
+				data = listdirstat(filename)
+			elif cmdname == "walk":
+				data = walk(filename, *args, **kwargs)
+			elif cmdname == "checksum":
+				import hashlib
+				hash = hashlib.new(args[0])
+				with open(filename, "rb") as stream:
+					while True:
+						chunk = stream.read(262144)
+						if not chunk:
+							break
+						hash.update(chunk)
+				data = hash.hexdigest()
+			elif cmdname == "features":
+				data = dict(zlib=zlib is not None)
+			elif cmdname == "readstream":
+				data = startstream(readstream, files[filename], *args)
+			elif cmdname == "writestream":
+				data = startstream(writestream, files[filename], *args)
+			elif cmdname == "next":
+				data = next(files[filename])
+			else:
+				data = getattr(files[filename], cmdname)
+				data = data(*args, **kwargs)
+			return data
+
+		def run(filename, cmdname, args, kwargs):
+			try:
+				data = execute(filename, cmdname, args, kwargs)
 			except StopIteration:
 				exc = sys.exc_info()[1]
-				channel.send((True, pickle.dumps(exc)))
+				return (True, pickle.dumps(exc))
 			except Exception:
 				exc = sys.exc_info()[1]
-				channel.send((True, pickle.dumps(exc)))
+				return (True, pickle.dumps(exc))
+			else:
+				return (False, data)
+
+		while True:
+			(filename, cmdname, args, kwargs) = channel.receive()
+			if cmdname == "batch":
+				# Execute a list of commands and return all results in one message
+				channel.send((False, [run(*command) for command in args[0]]))
 			else:
-				channel.send((False, data))
+				channel.send(run(filename, cmdname, args, kwargs))
 	"""
 
 	def __init__(self, context, server, python=None, nice=None):
@@ -1015,6 +1564,7 @@ class SshConnection(Connection):
 		self.python = python
 		self.nice = nice
 		self._channel = None
+		self._features = None
 
 	def close(self):
 		if self._channel is not None and not self._channel.isclosed():
@@ -1030,26 +1580,140 @@ class SshConnection(Connection):
 			filename = filename[1:]
 		return filename
 
-	def _send(self, filename, cmd, *args, **kwargs):
+	def _gatewayspec(self):
+		# Return the ``execnet`` specification for the gateway
+		spec = f"ssh={self.server}"
+		python = self.python
+		if python is None:
+			python = default_ssh_python
+		if python is not None:
+			spec += f"//python={python}"
+		if self.nice is not None:
+			spec += f"//nice={self.nice}"
+		return spec
+
+	def _getchannel(self):
 		if self._channel is None:
-			server = f"ssh={self.server}"
-			python = self.python
-			if python is None:
-				python = default_ssh_python
-			if python is not None:
-				server += f"//python={python}"
-			if self.nice is not None:
-				server += f"//nice={self.nice}"
-			gateway = execnet.makegateway(server) # This requires ``execnet`` (http://codespeak.net/execnet/)
+			gateway = execnet.makegateway(self._gatewayspec()) # This requires ``execnet`` (http://codespeak.net/execnet/)
 			gateway.reconfigure(py2str_as_py3str=False, py3str_as_py2str=False)
 			self._channel = gateway.remote_exec(self.remote_code)
-		self._channel.send((filename, cmd, args, kwargs))
-		(isexc, data) = self._channel.receive()
+		return self._channel
+
+	def _send(self, filename, cmd, *args, **kwargs):
+		channel = self._getchannel()
+		channel.send((filename, cmd, args, kwargs))
+		(isexc, data) = channel.receive()
 		if isexc:
 			raise pickle.loads(data, fix_imports=True)
 		else:
 			return data
 
+	def _sendmany(self, commands):
+		# Execute the commands in the list :obj:`commands` (each one a tuple
+		# ``(filename, cmd, args, kwargs)``) with one round trip. Returns a list
+		# with an ``(isexc, data)`` tuple for each command.
+		return self._send(None, "batch", [(filename, cmd, tuple(args), dict(kwargs)) for (filename, cmd, args, kwargs) in commands])
+
+	def _compresslevel(self, compress):
+		# Return the zlib compression level to use for a stream (0 if the
+		# remote side doesn't support compression or it hasn't been requested)
+		if not compress:
+			return 0
+		if self._features is None:
+			self._features = self._send(None, "features")
+		if not self._features.get("zlib") or zlib is None:
+			return 0
+		return 6 if compress is True else compress
+
+	def _startstream(self, remoteid, cmd, *args):
+		# Start the stream command :obj:`cmd` on the remote side and return the
+		# channel that is used for this stream. Each stream uses its own channel,
+		# so that the main channel (and so other files on the same connection,
+		# e.g. the target of a copy to the same server) can be used while the
+		# stream is active.
+		streamchannel = self._getchannel().gateway.newchannel()
+		self._send(remoteid, cmd, *(args + (streamchannel,)))
+		return streamchannel
+
+	def _readstream(self, remoteid, chunksize, compress, window):
+		# Generator for the chunks of a file streamed by the remote side (see
+		# ``readstream`` in :attr:`remote_code`)
+		compress = self._compresslevel(compress)
+		channel = self._startstream(remoteid, "readstream", chunksize, compress, window)
+		result = None
+		stopped = False # Have we told the remote side to stop?
+		try:
+			while True:
+				data = channel.receive()
+				if data.__class__ is tuple:
+					# This is the result of the command: either the stream is
+					# complete or there was an exception
+					result = data
+					break
+				channel.send(None) # acknowledge the chunk
+				if data:
+					yield zlib.decompress(data) if compress else data
+				else:
+					channel.send(False) # end of stream: we're done
+					stopped = True
+		finally:
+			# If the consumer stopped early, tell the remote side to stop reading
+			# and skip the chunks that are already on their way
+			if result is None:
+				if not stopped:
+					channel.send(False)
+				while result is None:
+					data = channel.receive()
+					if data.__class__ is tuple:
+						result = data
+					else:
+						channel.send(None)
+			channel.close()
+		(isexc, data) = result
+		if isexc:
+			raise pickle.loads(data, fix_imports=True)
+
+	def _writestream(self, remoteid, chunks, compress, window):
+		# Send the chunks from the iterable :obj:`chunks` to the remote side (see
+		# ``writestream`` in :attr:`remote_code`)
+		compress = self._compresslevel(compress)
+		channel = self._startstream(remoteid, "writestream", compress)
+		size = 0
+		inflight = 0
+		try:
+			for data in chunks:
+				if not data:
+					continue
+				size += len(data)
+				if inflight >= window:
+					channel.receive() # wait for an acknowledgement
+					inflight -= 1
+				channel.send(zlib.compress(data, compress) if compress else data)
+				inflight += 1
+		finally:
+			channel.send(b"") # end of stream
+			while True:
+				result = channel.receive()
+				if result is not None: # skip the outstanding acknowledgements
+					break
+			channel.close()
+		(isexc, data) = result
+		if isexc:
+			raise pickle.loads(data, fix_imports=True)
+		return size
+
+	def checksum(self, url, algorithm="sha1"):
+		return self._send(self._url2filename(url), "checksum", algorithm)
+
+	def stat_many(self, urls):
+		filenames = [self._url2filename(url) for url in urls]
+		result = []
+		for (isexc, data) in self._sendmany([(filename, "stat", (), {}) for filename in filenames]):
+			if isexc:
+				raise pickle.loads(data, fix_imports=True)
+			result.append(os.stat_result(data)) # channel returned a tuple => wrap it
+		return result
+
 	def stat(self, url):
 		filename = self._url2filename(url)
 		data = self._send(filename, "stat")
@@ -1138,14 +1802,16 @@ class SshConnection(Connection):
 			cursor.event = event
 			cursor.isdir = event != "file"
 			cursor.isfile = not cursor.isdir
+			cursor._stat = os.stat_result(stat) if stat is not None else None
 			return cursor
 
 		if name:
 			fullname = os.path.join(base, name)
 		else:
 			fullname = base
-		for (isdir, childname) in self._send(fullname, "listdir"):
-			fullchildname = os.path.join(fullname, childname)
+		# The remote side returns the :func:`stat` results for all entries in
+		# the same message, so that :meth:`Cursor.stat` doesn't require a round trip
+		for (isdir, childname, stat) in self._send(fullname, "listdirstat"):
 			relchildname = os.path.join(name, childname) if name else childname
 			emitbeforedir = cursor.beforedir
 			emitafterdir = cursor.afterdir
@@ -1176,6 +1842,25 @@ class SshConnection(Connection):
 		cursor = Cursor(url, beforedir=beforedir, afterdir=afterdir, file=file, enterdir=enterdir)
 		return self._walk(cursor, self._url2filename(url), "")
 
+	def _remotewalk(self, url, files, dirs, include, exclude, enterdir, skipdir, ignorecase):
+		# Traverse the directory tree on the remote side and return the result
+		# with one round trip (patterns are passed as-is and compiled remotely)
+		data = self._send(self._url2filename(url), "walk", files, dirs, include, exclude, enterdir, skipdir, ignorecase)
+		for (isdir, name) in data:
+			if isdir:
+				yield Dir(name, scheme=None)
+			else:
+				yield File(name, scheme=None)
+
+	def walkall(self, url, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False):
+		return self._remotewalk(url, True, True, include, exclude, enterdir, skipdir, ignorecase)
+
+	def walkfiles(self, url, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False):
+		return self._remotewalk(url, True, False, include, exclude, enterdir, skipdir, ignorecase)
+
+	def walkdirs(self, url, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False):
+		return self._remotewalk(url, False, True, include, exclude, enterdir, skipdir, ignorecase)
+
 	def open(self, url, *args, **kwargs):
 		return RemoteFileResource(self, url, *args, **kwargs)
 
@@ -1184,6 +1869,8 @@ class SshConnection(Connection):
 
 
 class URLConnection(Connection):
+	threadsafe = True
+
 	def mimetype(self, url):
 		return url.open().mimetype()
 
@@ -1209,6 +1896,276 @@ class URLConnection(Connection):
 		return URLResource(url, headers=headers, data=data)
 
 
+class HTTPCache(object):
+	"""
+	An :class:`HTTPCache` stores the responses to ``http`` and ``https``
+	requests in a directory (one file per URL).
+
+	Cached responses will be reused without a request as long as they are
+	fresh according to the ``max-age`` directive of their ``Cache-Control``
+	header. After that they will be revalidated with a conditional request
+	(using the ``ETag`` and ``Last-Modified`` headers). Only successful
+	responses to ``GET`` requests that have at least one of these headers (and
+	don't forbid storing them via ``Cache-Control: no-store``) will be stored.
+
+	The attributes :attr:`hits`, :attr:`revalidations` and :attr:`misses`
+	count the requests that have been answered by the cache alone, by the cache
+	after the server responded with ``304 Not Modified`` and by the server.
+	"""
+	def __init__(self, directory):
+		self.directory = os.path.expanduser(str(directory))
+		self.hits = 0
+		self.revalidations = 0
+		self.misses = 0
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__qualname__} directory={self.directory!r} hits={self.hits!r} revalidations={self.revalidations!r} misses={self.misses!r} at {id(self):#x}>"
+
+	def _filename(self, url):
+		return os.path.join(self.directory, hashlib.sha1(str(url).encode("utf-8")).hexdigest())
+
+	@staticmethod
+	def _cachecontrol(headers):
+		# Return the directives of the ``Cache-Control`` header(s) as a dictionary
+		result = {}
+		for value in headers.get_all("Cache-Control") or ():
+			for directive in value.split(","):
+				(name, sep, arg) = directive.strip().partition("=")
+				result[name.lower()] = arg.strip('"') if sep else None
+		return result
+
+	@staticmethod
+	def _makeheaders(items):
+		headers = http.client.HTTPMessage()
+		for (name, value) in items:
+			headers[name] = value
+		return headers
+
+	def get(self, url):
+		"""
+		Return the cached response for :obj:`url` as a tuple
+		``(time, finalurl, headers, body)`` or :const:`None` if there is none.
+		"""
+		try:
+			with open(self._filename(url), "rb") as f:
+				(url_, time_, finalurl, headers, body) = marshal.load(f)
+		except (OSError, EOFError, ValueError, TypeError):
+			return None
+		if url_ != str(url): # hash collision
+			return None
+		return (time_, URL(finalurl), self._makeheaders(headers), body)
+
+	def isfresh(self, entry):
+		"""
+		Return whether the cache entry :obj:`entry` (as returned by :meth:`get`)
+		can be used without revalidation.
+		"""
+		cachecontrol = self._cachecontrol(entry[2])
+		if "no-cache" in cachecontrol:
+			return False
+		try:
+			maxage = int(cachecontrol.get("max-age") or 0)
+		except ValueError:
+			return False
+		return time.time() - entry[0] < maxage
+
+	def iscacheable(self, response):
+		"""
+		Return whether the :class:`http.client.HTTPResponse` :obj:`response` can
+		be stored in the cache.
+		"""
+		if response.status != 200:
+			return False
+		cachecontrol = self._cachecontrol(response.headers)
+		if "no-store" in cachecontrol:
+			return False
+		return "ETag" in response.headers or "Last-Modified" in response.headers or "max-age" in cachecontrol
+
+	def put(self, url, finalurl, headers, body):
+		"""
+		Store the response for :obj:`url` in the cache.
+		"""
+		filename = self._filename(url)
+		os.makedirs(self.directory, exist_ok=True)
+		data = marshal.dumps((str(url), time.time(), str(finalurl), list(headers.items()), body))
+		# Write to a temporary file first, so that concurrent readers never see a partial file
+		tempname = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tempname, "wb") as f:
+			f.write(data)
+		os.replace(tempname, filename)
+
+	def refresh(self, url, entry, headers):
+		"""
+		Update the cache entry :obj:`entry` for :obj:`url` with the headers from
+		a ``304 Not Modified`` response and return the new headers.
+		"""
+		newheaders = self._makeheaders(entry[2].items())
+		for name in ("Cache-Control", "Date", "ETag", "Expires", "Last-Modified"):
+			if name in headers:
+				del newheaders[name]
+				for value in headers.get_all(name):
+					newheaders[name] = value
+		self.put(url, entry[1], newheaders, entry[3])
+		return newheaders
+
+	def clear(self):
+		"""
+		Remove all cached responses.
+		"""
+		try:
+			names = os.listdir(self.directory)
+		except FileNotFoundError:
+			return
+		for name in names:
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except FileNotFoundError:
+				pass
+
+
+class HTTPConnection(URLConnection):
+	"""
+	A :class:`HTTPConnection` is used for ``http`` and ``https`` URLs on one
+	server. It keeps a pool of persistent (keep-alive) connections to the
+	server, uses ``HEAD`` requests for fetching metadata and uses the
+	:class:`HTTPCache` of the :class:`Context` (if there is one).
+	"""
+	maxredirects = 10
+
+	def __init__(self, context, scheme, server):
+		self.context = context
+		self.scheme = scheme
+		self.server = server
+		self._idle = [] # Connections available for the next request
+		self._lock = threading.Lock()
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__name__} to {self.scheme}://{self.server} at {id(self):#x}>"
+
+	def close(self):
+		with self._lock:
+			(idle, self._idle) = (self._idle, [])
+		for conn in idle:
+			conn.close()
+
+	def _acquire(self, host, port):
+		# Return a tuple ``(conn, reused)`` with an :mod:`http.client` connection
+		with self._lock:
+			if self._idle:
+				return (self._idle.pop(), True)
+		if self.scheme == "https":
+			return (http.client.HTTPSConnection(host, port), False)
+		return (http.client.HTTPConnection(host, port), False)
+
+	def _release(self, conn, response):
+		# Reuse :obj:`conn` only if the body of :obj:`response` has been read
+		# completely (otherwise the rest of it would still be in the socket)
+		if response.isclosed():
+			with self._lock:
+				self._idle.append(conn)
+		else:
+			conn.close()
+
+	def _send(self, method, url, headers, data):
+		# Send one request and return the tuple ``(response, conn)``
+		parts = urlparse.urlsplit(str(url))
+		path = parts.path or "/"
+		if parts.query:
+			path += "?" + parts.query
+		while True:
+			(conn, reused) = self._acquire(parts.hostname, parts.port)
+			try:
+				conn.request(method, path, body=data, headers=headers)
+				response = conn.getresponse()
+			except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+				conn.close()
+				# The server might have closed an idle connection, so retry
+				# idempotent requests with another one
+				if reused and method in ("GET", "HEAD"):
+					continue
+				raise
+			except BaseException:
+				conn.close()
+				raise
+			return (response, conn)
+
+	def _request(self, method, url, headers=None, data=None):
+		# Send a request (following redirects) and return the tuple
+		# ``(finalurl, response, conn, connection)``. ``connection`` is the
+		# :class:`HTTPConnection` that ``conn`` must be returned to.
+		headers = dict(headers) if headers is not None else {}
+		headers.setdefault("User-Agent", f"Python-urllib/{urllib.request.__version__}")
+		if data is not None:
+			data = urlparse.urlencode(data).encode("ascii")
+			headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+		connection = self
+		for i in range(self.maxredirects+1):
+			(response, conn) = connection._send(method, url, headers, data)
+			if response.status in (301, 302, 303, 307, 308) and "Location" in response.headers:
+				response.read()
+				connection._release(conn, response)
+				if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+					method = "GET"
+					data = None
+					headers.pop("Content-Type", None)
+				url = url/response.headers["Location"]
+				if url.scheme not in ("http", "https"):
+					raise urllib.error.HTTPError(str(url), response.status, f"redirection to {url.scheme!r} URL not supported", response.headers, None)
+				connection = url.connect(context=self.context)
+			elif response.status >= 400:
+				body = response.read()
+				connection._release(conn, response)
+				raise urllib.error.HTTPError(str(url), response.status, response.reason, response.headers, io.BytesIO(body))
+			else:
+				return (url, response, conn, connection)
+		raise urllib.error.HTTPError(str(url), response.status, "too many redirects", response.headers, None)
+
+	def _head(self, url):
+		# Return the response headers for :obj:`url` without fetching the body
+		cache = self.context.httpcache
+		if cache is not None:
+			entry = cache.get(url)
+			if entry is not None and cache.isfresh(entry):
+				cache.hits += 1
+				return entry[2]
+		try:
+			(finalurl, response, conn, connection) = self._request("HEAD", url)
+		except urllib.error.HTTPError as exc:
+			if exc.code not in (405, 501): # ``HEAD`` not supported by the server
+				raise
+			with self.open(url) as resource:
+				return resource.resheaders()
+		response.read()
+		connection._release(conn, response)
+		return response.headers
+
+	def mimetype(self, url):
+		contenttype = self._head(url).get("Content-Type")
+		if contenttype is None:
+			return None
+		return cgi.parse_header(contenttype)[0]
+
+	def size(self, url):
+		cl = self._head(url).get("Content-Length")
+		return int(cl) if cl else None
+
+	def mdate(self, url):
+		lm = self._head(url).get("Last-Modified")
+		return mime2dt(lm) if lm is not None else None
+
+	def resheaders(self, url):
+		return self._head(url)
+
+	def open(self, url, mode="rb", headers=None, data=None):
+		if mode != "rb":
+			raise NotImplementedError(f"mode {mode!r} not supported")
+		# Fall back to :mod:`urllib.request` when a proxy has to be used
+		proxies = urllib.request.getproxies()
+		if self.scheme in proxies and not urllib.request.proxy_bypass(url.host):
+			return URLResource(url, headers=headers, data=data)
+		return HTTPResource(self, url, headers=headers, data=data)
+
+
 def here(scheme="file"):
 	"""
 	Return the current directory as an :class:`URL` object.
@@ -1383,6 +2340,44 @@ class Resource(object):
 		self.seek(pos)
 		return imagesize
 
+	def iterchunks(self, chunksize=262144, compress=False):
+		"""
+		Return an iterator over the rest of the resource in chunks of (at most)
+		:obj:`chunksize` bytes.
+
+		If :obj:`compress` is true and the resource supports it, the data will
+		be transferred in compressed form (this is used by ``ssh`` URLs, for
+		other resources :obj:`compress` is ignored).
+		"""
+		while True:
+			data = self.read(chunksize)
+			if not data:
+				break
+			yield data
+
+	def readinto(self, buffer):
+		"""
+		Read bytes into the writable bytes-like object :obj:`buffer` and return
+		the number of bytes read (``0`` at the end of the resource).
+		"""
+		view = memoryview(buffer).cast("B")
+		data = self.read(len(view))
+		view[:len(data)] = data
+		return len(data)
+
+	def writechunks(self, chunks, compress=False):
+		"""
+		Write all chunks from the iterable :obj:`chunks` to the resource and
+		return the number of bytes written.
+
+		:obj:`compress` has the same meaning as for :meth:`iterchunks`.
+		"""
+		size = 0
+		for data in chunks:
+			self.write(data)
+			size += len(data)
+		return size
+
 	def __enter__(self):
 		return self
 
@@ -1408,7 +2403,7 @@ class FileResource(Resource):
 				raise
 			(splitpath, splitname) = os.path.split(self.name)
 			if splitpath:
-				os.makedirs(splitpath)
+				os.makedirs(splitpath, exist_ok=True) # somebody else might have created the directory in the meantime
 				file = open(self.name, mode, *args, **kwargs)
 			else:
 				raise # we don't have a directory to make so pass the error on
@@ -1421,6 +2416,22 @@ class FileResource(Resource):
 	def __iter__(self):
 		return iter(self.file)
 
+	def readinto(self, buffer):
+		return self.file.readinto(buffer)
+
+	def mmap(self):
+		"""
+		Return a read-only :class:`memoryview` of the complete content of the
+		file. The file will be memory mapped, i.e. the content will not be read
+		into memory (and the view remains usable after the resource has been
+		closed).
+		"""
+		try:
+			mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError: # Empty files can't be mapped
+			return memoryview(b"")
+		return memoryview(mapped)
+
 	def close(self):
 		if self.file is not None:
 			self.file.close()
@@ -1447,7 +2458,13 @@ class RemoteFileResource(Resource):
 	"""
 	A subclass of :class:`Resource` that handles remote files (those using
 	the ``ssh`` scheme).
+
+	Files opened in binary read-only mode are read in chunks of
+	:attr:`bufsize` bytes, so that reading lines (or small blocks) doesn't
+	require a round trip for every call.
 	"""
+	bufsize = 65536
+
 	def __init__(self, connection, url, mode="rb", *args, **kwargs):
 		self.connection = connection
 		self.url = URL(url)
@@ -1457,6 +2474,9 @@ class RemoteFileResource(Resource):
 		filename = self.connection._url2filename(url)
 		self.name = str(self.url)
 		self.remoteid = self._send(filename, "open", mode, *args, **kwargs)
+		# Read-ahead buffer (or :const:`None` if the file is unbuffered)
+		self._buffer = b"" if "r" in mode and "b" in mode and "+" not in mode else None
+		self._bufpos = 0
 
 	def __repr__(self):
 		return f"<{'closed' if self.connection is None else 'open'} {self.__class__.__module__}.{self.__class__.__name__} {self.name}, mode {self.mode!r} at {id(self):#x}>"
@@ -1475,26 +2495,129 @@ class RemoteFileResource(Resource):
 	def closed(self):
 		return self.connection is None
 
+	def _available(self):
+		# Number of bytes in the read-ahead buffer
+		return len(self._buffer) - self._bufpos
+
+	def _fill(self, size):
+		# Append at least :obj:`size` bytes (if available) to the buffer.
+		# Return false at the end of the file.
+		data = self._send(self.remoteid, "read", max(size, self.bufsize))
+		if not data:
+			return False
+		self._buffer = self._buffer[self._bufpos:] + data
+		self._bufpos = 0
+		return True
+
+	def _consume(self, end):
+		# Return the buffered data up to the offset :obj:`end`
+		data = self._buffer[self._bufpos:end]
+		self._bufpos = end
+		return data
+
 	def read(self, size=None):
-		return self._send(self.remoteid, "read", size) if size is not None else self._send(self.remoteid, "read")
+		if self._buffer is None:
+			return self._send(self.remoteid, "read", size) if size is not None else self._send(self.remoteid, "read")
+		if size is None or size < 0:
+			data = self._consume(len(self._buffer)) + self._send(self.remoteid, "read")
+			self._buffer = b""
+			self._bufpos = 0
+			return data
+		while self._available() < size and self._fill(size-self._available()):
+			pass
+		return self._consume(min(self._bufpos+size, len(self._buffer)))
 
 	def readline(self, size=-1):
-		return self._send(self.remoteid, "readline", size) if size is not None else self._send(self.remoteid, "readline")
+		if self._buffer is None:
+			return self._send(self.remoteid, "readline", size) if size is not None else self._send(self.remoteid, "readline")
+		if size is None:
+			size = -1
+		searched = 0 # Number of available bytes that have been searched for a line feed
+		while True:
+			pos = self._buffer.find(b"\n", self._bufpos+searched)
+			if pos >= 0:
+				end = pos+1
+				break
+			if 0 <= size <= self._available():
+				end = len(self._buffer)
+				break
+			searched = self._available()
+			if not self._fill(0):
+				end = len(self._buffer)
+				break
+		if 0 <= size < end-self._bufpos:
+			end = self._bufpos+size
+		return self._consume(end)
 
 	def readlines(self, size=-1):
-		return self._send(self.remoteid, "readlines", size) if size is not None else self._send(self.remoteid, "readlines")
+		if self._buffer is None:
+			return self._send(self.remoteid, "readlines", size) if size is not None else self._send(self.remoteid, "readlines")
+		lines = []
+		total = 0
+		while True:
+			line = self.readline()
+			if not line:
+				break
+			lines.append(line)
+			total += len(line)
+			if size is not None and 0 < size <= total:
+				break
+		return lines
+
+	def iterchunks(self, chunksize=262144, compress=False, window=4):
+		"""
+		Return an iterator over the rest of the file in chunks of (at most)
+		:obj:`chunksize` bytes.
+
+		The remote side sends the chunks without waiting for each one to be
+		requested (with at most :obj:`window` chunks in transit). If
+		:obj:`compress` is true (or a zlib compression level) and the remote
+		side supports it, chunks will be transferred in compressed form.
+		"""
+		if self.connection is None:
+			raise ValueError("I/O operation on closed file")
+		if self._buffer is not None and self._available():
+			yield self._consume(len(self._buffer))
+		yield from self.connection._readstream(self.remoteid, chunksize, compress, window)
+
+	def writechunks(self, chunks, compress=False, window=4):
+		"""
+		Write all chunks from the iterable :obj:`chunks` to the file and return
+		the number of bytes written.
+
+		The chunks are sent without waiting for each one to be written (with at
+		most :obj:`window` chunks in transit). :obj:`compress` has the same
+		meaning as for :meth:`iterchunks`.
+		"""
+		if self.connection is None:
+			raise ValueError("I/O operation on closed file")
+		return self.connection._writestream(self.remoteid, chunks, compress, window)
 
 	def __iter__(self):
 		return self
 
 	def __next__(self):
-		return self._send(self.remoteid, "next")
+		if self._buffer is None:
+			return self._send(self.remoteid, "next")
+		line = self.readline()
+		if not line:
+			raise StopIteration
+		return line
 
 	def seek(self, offset, whence=0):
+		if self._buffer is not None:
+			if whence == 1:
+				# The remote position is ahead of our position
+				offset -= self._available()
+			self._buffer = b""
+			self._bufpos = 0
 		return self._send(self.remoteid, "seek", offset, whence)
 
 	def tell(self):
-		return self._send(self.remoteid, "tell")
+		pos = self._send(self.remoteid, "tell")
+		if self._buffer is not None:
+			pos -= self._available()
+		return pos
 
 	def truncate(self, size=None):
 		if size is None:
@@ -1546,7 +2669,10 @@ class URLResource(Resource):
 		req = urllib.request.Request(url=self.name, data=data, headers=headers)
 		self._stream = urllib.request.urlopen(req)
 		self._finalurl = URL(self._stream.url) # Remember the final URL in case of a redirect
-		self._resheaders = self._stream.info()
+		self._setheaders(self._stream.info())
+
+	def _setheaders(self, headers):
+		self._resheaders = headers
 		self._mimetype = None
 		self._encoding = None
 		contenttype = self._resheaders.get("Content-Type")
@@ -1626,6 +2752,362 @@ class URLResource(Resource):
 			yield data
 
 
+class HTTPResource(URLResource):
+	"""
+	A subclass of :class:`URLResource` that handles ``http`` and ``https`` URLs
+	via the connection pool of an :class:`HTTPConnection` (and its HTTP cache).
+	"""
+	def __init__(self, connection, url, mode="rb", headers=None, data=None):
+		if "w" in mode:
+			raise ValueError(f"writing mode {mode!r} not supported")
+		self.url = URL(url)
+		self.name = str(self.url)
+		self.mode = mode
+		self.reqheaders = headers
+		self.reqdata = data
+		self._finalurl = None
+		self._stream = None
+		self._conn = None # The :mod:`http.client` connection (if the response hasn't been read yet)
+		self._connection = None # The :class:`HTTPConnection` that :attr:`_conn` belongs to
+
+		cache = connection.context.httpcache if data is None else None
+		entry = None
+		if cache is not None:
+			entry = cache.get(self.url)
+			if entry is not None:
+				if cache.isfresh(entry):
+					cache.hits += 1
+					self._setcached(entry[1], entry[2], entry[3])
+					return
+				# Revalidate the cached response
+				headers = dict(headers) if headers is not None else {}
+				if "ETag" in entry[2]:
+					headers["If-None-Match"] = entry[2]["ETag"]
+				if "Last-Modified" in entry[2]:
+					headers["If-Modified-Since"] = entry[2]["Last-Modified"]
+
+		(finalurl, response, conn, connection) = connection._request("GET" if data is None else "POST", self.url, headers, data)
+		if entry is not None and response.status == 304:
+			response.read()
+			connection._release(conn, response)
+			cache.revalidations += 1
+			self._setcached(entry[1], cache.refresh(self.url, entry, response.headers), entry[3])
+		elif cache is not None and cache.iscacheable(response):
+			body = response.read()
+			connection._release(conn, response)
+			cache.misses += 1
+			cache.put(self.url, finalurl, response.headers, body)
+			self._setcached(finalurl, response.headers, body)
+		else:
+			if cache is not None:
+				cache.misses += 1
+			self._finalurl = finalurl
+			self._stream = response
+			self._conn = conn
+			self._connection = connection
+			self._setheaders(response.headers)
+
+	def _setcached(self, finalurl, headers, body):
+		self._finalurl = finalurl
+		self._stream = io.BytesIO(body)
+		self._setheaders(headers)
+
+	def close(self):
+		if self._stream is not None:
+			if self._conn is not None:
+				self._connection._release(self._conn, self._stream)
+				self._conn = None
+				self._connection = None
+			self._stream.close()
+			self._stream = None
+
+
+class AsyncResource(object):
+	"""
+	An :class:`AsyncResource` wraps a :class:`Resource` for use with
+	:mod:`asyncio`: All methods of the resource are available as coroutines
+	that run the method in the thread pool of the :class:`Context`.
+
+	:class:`AsyncResource` objects are returned by :meth:`URL.aopen`. They
+	support ``async with`` and ``async for`` (iterating through the lines).
+	"""
+	def __init__(self, context, resource, limit):
+		self.context = context
+		self.resource = resource
+		self._limit = limit
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__qualname__} resource={self.resource!r} at {id(self):#x}>"
+
+	def __getattr__(self, name):
+		function = getattr(self.resource, name)
+		async def call(*args, **kwargs):
+			return await self.context._arun(self._limit, function, *args, **kwargs)
+		return call
+
+	@property
+	def closed(self):
+		return self.resource.closed
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.close()
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		line = await self.readline()
+		if not line:
+			raise StopAsyncIteration
+		return line
+
+
+class AsyncHTTPResource(object):
+	"""
+	An :class:`AsyncHTTPResource` is used by :meth:`URL.aopen` for ``http`` and
+	``https`` URLs. It speaks HTTP/1.1 directly via :mod:`asyncio` streams
+	instead of using a thread. It has the same interface as
+	:class:`AsyncResource`.
+
+	The semaphore limiting the number of concurrent requests to the server is
+	held until the resource is closed.
+	"""
+	maxredirects = 10
+
+	def __init__(self, context, url, limit, method="GET", headers=None):
+		self.context = context
+		self.url = url
+		self.name = str(url)
+		self.mode = "rb"
+		self.reqheaders = headers
+		self._limit = limit
+		self._method = method
+		self._finalurl = None
+		self._resheaders = None
+		self._reader = None
+		self._writer = None
+		self._buffer = bytearray()
+		self._bufpos = 0 # Offset of the unread data in :attr:`_buffer`
+		self._remaining = None # Number of body bytes left (``None`` for "read until EOF")
+		self._chunked = False
+		self._eof = False
+		self._locked = False
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__qualname__} {self.name!r} at {id(self):#x}>"
+
+	async def _open(self):
+		await self._limit.acquire()
+		self._locked = True
+		try:
+			url = self.url
+			for i in range(self.maxredirects+1):
+				status = await self._request(url)
+				if status in (301, 302, 303, 307, 308) and "Location" in self._resheaders:
+					await self._disconnect()
+					url = url/self._resheaders["Location"]
+					if url.scheme not in ("http", "https"):
+						raise urllib.error.HTTPError(str(url), status, f"redirection to {url.scheme!r} URL not supported", self._resheaders, None)
+				elif status >= 400:
+					body = await self.read() if self._method != "HEAD" else b""
+					raise urllib.error.HTTPError(str(url), status, self._reason, self._resheaders, io.BytesIO(body))
+				else:
+					self._finalurl = url
+					return self
+			raise urllib.error.HTTPError(str(url), status, "too many redirects", self._resheaders, None)
+		except BaseException:
+			await self.close()
+			raise
+
+	async def _request(self, url):
+		# Send the request for :obj:`url`, read the response headers and return
+		# the status code
+		parts = urlparse.urlsplit(str(url))
+		if url.scheme == "https":
+			(self._reader, self._writer) = await asyncio.open_connection(parts.hostname, parts.port or 443, ssl=True)
+		else:
+			(self._reader, self._writer) = await asyncio.open_connection(parts.hostname, parts.port or 80)
+		path = parts.path or "/"
+		if parts.query:
+			path += "?" + parts.query
+		headers = {"Host": parts.netloc.rpartition("@")[2], "User-Agent": f"Python-urllib/{urllib.request.__version__}", "Accept-Encoding": "identity"}
+		if self.reqheaders is not None:
+			headers.update(self.reqheaders)
+		headers["Connection"] = "close"
+		request = "".join(f"{name}: {value}\r\n" for (name, value) in headers.items())
+		self._writer.write(f"{self._method} {path} HTTP/1.1\r\n{request}\r\n".encode("iso-8859-1"))
+		await self._writer.drain()
+
+		while True:
+			statusline = (await self._reader.readline()).decode("iso-8859-1")
+			(version, sep, rest) = statusline.partition(" ")
+			(status, sep, reason) = rest.partition(" ")
+			if not version.startswith("HTTP/") or not status.isdigit():
+				raise http.client.BadStatusLine(statusline)
+			status = int(status)
+			lines = []
+			while True:
+				line = await self._reader.readline()
+				if line in (b"\r\n", b"\n", b""):
+					break
+				lines.append(line)
+			if status >= 200: # skip ``100 Continue`` etc.
+				break
+		self._reason = reason.strip()
+		self._resheaders = email.parser.Parser(_class=http.client.HTTPMessage).parsestr(b"".join(lines).decode("iso-8859-1"))
+
+		self._buffer = bytearray()
+		self._bufpos = 0
+		self._eof = self._chunked = False
+		self._remaining = None
+		if self._method == "HEAD" or status in (204, 304):
+			self._eof = True
+		elif "chunked" in self._resheaders.get("Transfer-Encoding", "").lower():
+			self._chunked = True
+			self._remaining = 0
+		elif self._resheaders.get("Content-Length"):
+			self._remaining = int(self._resheaders["Content-Length"])
+			self._eof = not self._remaining
+		return status
+
+	async def _fill(self):
+		# Read the next piece of the body into the buffer. Return false at the end of the body.
+		if self._eof:
+			return False
+		if self._chunked:
+			if not self._remaining:
+				line = await self._reader.readline()
+				self._remaining = int(line.split(b";", 1)[0].strip() or b"0", 16)
+				if not self._remaining:
+					# Skip the trailer
+					while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+						pass
+					self._eof = True
+					return False
+			data = await self._reader.read(min(self._remaining, 65536))
+			if not data:
+				raise http.client.IncompleteRead(bytes(self._buffer[self._bufpos:]))
+			self._remaining -= len(data)
+			if not self._remaining:
+				await self._reader.readline() # skip the CRLF after the chunk
+		elif self._remaining is not None:
+			data = await self._reader.read(min(self._remaining, 65536))
+			if not data:
+				raise http.client.IncompleteRead(bytes(self._buffer[self._bufpos:]), self._remaining)
+			self._remaining -= len(data)
+			self._eof = not self._remaining
+		else:
+			data = await self._reader.read(65536)
+			if not data:
+				self._eof = True
+				return False
+		self._buffer += data
+		return True
+
+	def _available(self):
+		# Number of unread bytes in the buffer
+		return len(self._buffer) - self._bufpos
+
+	def _consume(self, end):
+		# Return the unread data in the buffer up to the offset :obj:`end`.
+		# Consumed data is only dropped from the buffer once it makes up at
+		# least half of it, so reading stays linear in the size of the body.
+		data = bytes(self._buffer[self._bufpos:end])
+		self._bufpos = min(end, len(self._buffer))
+		if self._bufpos >= len(self._buffer):
+			self._buffer.clear()
+			self._bufpos = 0
+		elif 2*self._bufpos >= len(self._buffer):
+			del self._buffer[:self._bufpos]
+			self._bufpos = 0
+		return data
+
+	async def read(self, size=-1):
+		if size is None or size < 0:
+			while await self._fill():
+				pass
+			return self._consume(len(self._buffer))
+		while self._available() < size and await self._fill():
+			pass
+		return self._consume(self._bufpos + size)
+
+	async def readline(self, size=-1):
+		start = self._bufpos
+		while True:
+			pos = self._buffer.find(b"\n", start)
+			if pos >= 0 or (size is not None and 0 <= size <= self._available()):
+				break
+			start = len(self._buffer) # Don't search the same data again
+			if not await self._fill():
+				break
+		end = len(self._buffer) if pos < 0 else pos+1
+		if size is not None and size >= 0:
+			end = min(end, self._bufpos + size)
+		return self._consume(end)
+
+	async def readlines(self):
+		return [line async for line in self]
+
+	async def _disconnect(self):
+		if self._writer is not None:
+			self._writer.close()
+			try:
+				await self._writer.wait_closed()
+			except OSError:
+				pass
+			self._reader = self._writer = None
+
+	async def close(self):
+		await self._disconnect()
+		if self._locked:
+			self._locked = False
+			self._limit.release()
+
+	@property
+	def closed(self):
+		return not self._locked
+
+	async def finalurl(self):
+		return self._finalurl
+
+	async def resheaders(self):
+		return self._resheaders
+
+	async def mimetype(self):
+		contenttype = self._resheaders.get("Content-Type")
+		return cgi.parse_header(contenttype)[0] if contenttype is not None else None
+
+	async def encoding(self):
+		contenttype = self._resheaders.get("Content-Type")
+		return cgi.parse_header(contenttype)[1].get("charset") if contenttype is not None else None
+
+	async def size(self):
+		cl = self._resheaders.get("Content-Length")
+		return int(cl) if cl else None
+
+	async def mdate(self):
+		lm = self._resheaders.get("Last-Modified")
+		return mime2dt(lm) if lm is not None else None
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.close()
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		line = await self.readline()
+		if not line:
+			raise StopAsyncIteration
+		return line
+
+
 class SchemeDefinition(object):
 	"""
 	A :class:`SchemeDefinition` instance defines the properties of a particular
@@ -1720,10 +3202,7 @@ class SshSchemeDefinition(SchemeDefinition):
 			raise ValueError("ssh URLs need a custom context")
 		# Use one :class:`SshConnection` for each user/host/python combination
 		server = url.server
-		try:
-			connections = context.schemes["ssh"]
-		except KeyError:
-			connections = context.schemes["ssh"] = {}
+		connections = context.schemes.setdefault("ssh", {})
 		try:
 			connection = connections[(server, python, nice)]
 		except KeyError:
@@ -1739,9 +3218,26 @@ class SshSchemeDefinition(SchemeDefinition):
 			connection.close()
 
 
+class HTTPSchemeDefinition(SchemeDefinition):
+	def _connect(self, url, context=None, **kwargs):
+		context = getcontext(context)
+		# Use one :class:`HTTPConnection` (i.e. one connection pool) for each server
+		connections = context.schemes.setdefault(self.scheme, {})
+		server = url.server
+		try:
+			connection = connections[server]
+		except KeyError:
+			connection = connections.setdefault(server, HTTPConnection(context, self.scheme, server))
+		return (connection, kwargs)
+
+	def closeall(self, context):
+		for connection in context.schemes[self.scheme].values():
+			connection.close()
+
+
 schemereg = {
-	"http": SchemeDefinition("http", usehierarchy=True, useserver=True, usefrag=True, isremote=True, defaultport=80),
-	"https": SchemeDefinition("https", usehierarchy=True, useserver=True, usefrag=True, isremote=True, defaultport=443),
+	"http": HTTPSchemeDefinition("http", usehierarchy=True, useserver=True, usefrag=True, isremote=True, defaultport=80),
+	"https": HTTPSchemeDefinition("https", usehierarchy=True, useserver=True, usefrag=True, isremote=True, defaultport=443),
 	"ftp": SchemeDefinition("ftp", usehierarchy=True, useserver=True, usefrag=True, isremote=True, defaultport=21),
 	"file": LocalSchemeDefinition("file", usehierarchy=True, useserver=False, usefrag=True, islocal=True),
 	"root": LocalSchemeDefinition("root", usehierarchy=True, useserver=False, usefrag=True, islocal=True),
@@ -1762,6 +3258,16 @@ class Path(object):
 		self._segments = []
 		self.path = path
 
+	@classmethod
+	def _frompath(cls, path, segments=None):
+		# Create a :class:`Path` from the already escaped and normalized string
+		# :obj:`path`. If :obj:`segments` is :const:`None` the segments will only
+		# be created when they're needed.
+		self = cls.__new__(cls)
+		self._path = path
+		self._segments = list(segments) if segments is not None else None
+		return self
+
 	def _prefix(cls, path):
 		if path.startswith("/"):
 			return "/"
@@ -1803,7 +3309,7 @@ class Path(object):
 			return self.segments[-len(segments):] == segments
 
 	def clone(self):
-		return Path(self)
+		return self._frompath(self._path)
 
 	def __repr__(self):
 		return f"Path({self._path!r})"
@@ -1893,6 +3399,11 @@ class Path(object):
 		elif isinstance(path, (list, tuple)):
 			self._segments = list(map(_unescape, path))
 			self._path = self._prefix(self._path) + self._segments2path(self._segments)
+		elif _plainpath(path) is not None and not path.startswith("//"):
+			# Unescaping and escaping wouldn't change anything, so we can use
+			# :obj:`path` as it is and create the segments when they're needed
+			self._path = path
+			self._segments = None
 		else:
 			path = _escape(path)
 			prefix = self._prefix(path)
@@ -2049,6 +3560,12 @@ class Path(object):
 		Join two paths.
 		"""
 		if isinstance(other, str):
+			# Shortcut for appending a simple file name to a normalized path
+			if _plainname(other) is not None:
+				path = self._path
+				head = path[:path.rfind("/")+1]
+				if _normalizedhead(head) is not None:
+					return self._frompath(head + other)
 			other = Path(other)
 		if isinstance(other, Path):
 			newpath = Path()
@@ -2538,20 +4055,24 @@ class URL(object):
 			Getting :attr:`url` reassembles the URL from the components.
 			"""
 			result = ""
-			if self.scheme is not None:
-				result += self.scheme + ":"
-			if self.reg.usehierarchy:
-				if self.authority is not None:
-					result += "//" + self.authority
-					if not self.path.isabs:
+			reg = self.reg
+			if self._scheme is not None:
+				result += self._scheme + ":"
+			if reg.usehierarchy:
+				authority = self.authority
+				path = self._path._path
+				if authority is not None:
+					result += "//" + authority
+					if not path.startswith("/"):
 						result += "/"
-				result += str(self.path)
-				if self.query is not None:
-					result += "?" + self.query
+				result += path
+				query = self.query
+				if query is not None:
+					result += "?" + query
 			else:
-				result += self.opaque_part
-			if self.reg.usefrag and self.frag is not None:
-				result += "#" + _escape(self.frag, fragsafe)
+				result += self._opaque_part
+			if reg.usefrag and self._frag is not None:
+				result += "#" + _escape(self._frag, fragsafe)
 			return result
 
 		def __set__(self, url):
@@ -2560,57 +4081,42 @@ class URL(object):
 			may also be an :class:`URL` instance, in which case the URL will be
 			copied.
 			"""
-			self._clear()
 			if url is None:
-				return
+				self._clear()
 			elif isinstance(url, URL):
-				self.scheme = url.scheme
-				self.userinfo = url.userinfo
-				self.host = url.host
-				self.port = url.port
-				self.path = url.path.clone()
-				self.reg_name = url.reg_name
-				self.opaque_part = url.opaque_part
-				self.query = url.query
-				self.frag = url.frag
+				self.reg = url.reg
+				self._scheme = url._scheme
+				self._userinfo = url._userinfo
+				self._host = url._host
+				self._port = url._port
+				self._path = url._path.clone()
+				self._reg_name = url._reg_name
+				self._opaque_part = url._opaque_part
+				self._setquery(url._query, url._query_parts)
+				self._frag = url._frag
 			else:
-				url = _escape(url)
-				# find the scheme (RFC2396, Section 3.1)
-				pos = url.find(":")
-				if pos != -1:
-					scheme = url[:pos]
-					if self._checkscheme(scheme): # if the scheme is illegal assume there is none (e.g. "/foo.php?x=http://www.bar.com", will *not* have the scheme "/foo.php?x=http")
-						self.scheme = scheme # the info about what we have to expect in the rest of the URL can be found in self.reg now
-						url = url[pos+1:]
-
-				# find the fragment (RFC2396, Section 4.1)
-				if self.reg.usefrag:
-					# the fragment itself may not contain a "#", so find the last "#"
-					pos = url.rfind("#")
-					if pos != -1:
-						self.frag = _unescape(url[pos+1:])
-						url = url[:pos]
-
-				if self.reg.usehierarchy:
-					# find the query (RFC2396, Section 3.4)
-					pos = url.rfind("?")
-					if pos != -1:
-						self.query = url[pos+1:]
-						url = url[:pos]
-					if url.startswith("//"):
-						url = url[2:]
-						# find the authority part (RFC2396, Section 3.2)
-						pos = url.find("/")
-						if pos != -1:
-							authority = url[:pos]
-							url = url[pos:] # keep the "/"
-						else:
-							authority = url
-							url = "/"
-						self.authority = authority
-					self.path = Path(url)
+				try:
+					parsed = _parsecache[url]
+				except KeyError:
+					self._parse(url)
+					segments = self._path._segments
+					if segments is not None:
+						segments = tuple(segments)
+					_parsecache[url] = (self.reg, self._scheme, self._userinfo, self._host, self._port, self._path._path, segments, self._reg_name, self._query, self._query_parts, self._opaque_part, self._frag)
+					self._setquery(self._query, self._query_parts) # Don't share :attr:`_query_parts` with the cache
+					while len(_parsecache) > _parsecachesize:
+						try:
+							_parsecache.popitem(last=False)
+						except KeyError: # emptied by another thread
+							break
 				else:
-					self.opaque_part = url
+					(self.reg, self._scheme, self._userinfo, self._host, self._port, path, segments, self._reg_name, query, query_parts, self._opaque_part, self._frag) = parsed
+					self._path = Path._frompath(path, segments)
+					self._setquery(query, query_parts)
+					try:
+						_parsecache.move_to_end(url)
+					except KeyError: # removed by another thread
+						pass
 
 		def __delete__(self):
 			"""
@@ -2619,6 +4125,52 @@ class URL(object):
 			"""
 			self._clear()
 
+	def _setquery(self, query, query_parts):
+		# Set the query from another :class:`URL` (copying the mutable :obj:`query_parts`)
+		if query_parts:
+			query_parts = {name: list(values) for (name, values) in query_parts.items()}
+		self._query = query
+		self._query_parts = query_parts
+
+	def _parse(self, url):
+		# Parse the string :obj:`url` into the components
+		self._clear()
+		url = _escape(url)
+		# find the scheme (RFC2396, Section 3.1)
+		match = _schemeprefix(url)
+		if match is not None: # if the scheme is illegal assume there is none (e.g. "/foo.php?x=http://www.bar.com", will *not* have the scheme "/foo.php?x=http")
+			self.scheme = match.group(1) # the info about what we have to expect in the rest of the URL can be found in self.reg now
+			url = url[match.end():]
+
+		# find the fragment (RFC2396, Section 4.1)
+		if self.reg.usefrag:
+			# the fragment itself may not contain a "#", so find the last "#"
+			pos = url.rfind("#")
+			if pos != -1:
+				self.frag = _unescape(url[pos+1:])
+				url = url[:pos]
+
+		if self.reg.usehierarchy:
+			# find the query (RFC2396, Section 3.4)
+			pos = url.rfind("?")
+			if pos != -1:
+				self.query = url[pos+1:]
+				url = url[:pos]
+			if url.startswith("//"):
+				url = url[2:]
+				# find the authority part (RFC2396, Section 3.2)
+				pos = url.find("/")
+				if pos != -1:
+					authority = url[:pos]
+					url = url[pos:] # keep the "/"
+				else:
+					authority = url
+					url = "/"
+				self.authority = authority
+			self._path = Path(url)
+		else:
+			self.opaque_part = url
+
 	def withext(self, ext):
 		"""
 		Return a new :class:`URL` where the filename extension has been replaced
@@ -2687,6 +4239,12 @@ class URL(object):
 			... 	print(f)
 		"""
 		if isinstance(other, str):
+			# Shortcut for appending a simple file name
+			if self.reg.usehierarchy and _plainname(other) is not None:
+				newurl = URL(self)
+				newurl._query = newurl._query_parts = newurl._frag = None
+				newurl._path = self._path/other
+				return newurl
 			other = URL(other)
 		if isinstance(other, URL):
 			newurl = URL()
@@ -2953,11 +4511,23 @@ class URL(object):
 			:obj:`nice`
 				Nice level for the remove python (used by ``ssh`` URLs)
 		"""
-		(connection, kwargs) = self._connect(**kwargs)
-		if "context" in kwargs:
-			kwargs = kwargs.copy()
-			del kwargs["context"]
-		return connection.open(self, *args, **kwargs)
+		mode = args[0] if args else kwargs.get("mode", "rb")
+		cache = getcontext(kwargs.get("context")).metacache if mode.strip("bt") != "r" else None
+		if cache is not None:
+			key = cache._beginwrite(self)
+		try:
+			(connection, kwargs) = self._connect(**kwargs)
+			if "context" in kwargs:
+				kwargs = kwargs.copy()
+				del kwargs["context"]
+			resource = connection.open(self, *args, **kwargs)
+		except BaseException:
+			if cache is not None:
+				cache._endwrite(key)
+			raise
+		if cache is not None:
+			cache._track(key, resource)
+		return resource
 
 	def openread(self, *args, **kwargs):
 		return self.open(mode="rb", *args, **kwargs)
@@ -2988,6 +4558,22 @@ class URL(object):
 		else:
 			return iter(self.open())
 
+	def _cached(self, name, kwargs):
+		# Call the connection method :obj:`name` for :obj:`self` (using the
+		# metadata cache of the context if there is one)
+		cache = getcontext(kwargs.get("context")).metacache
+		if cache is None:
+			return getattr(self.connect(**kwargs), name)(self)
+		return cache.get(self, name, lambda: getattr(self.connect(**kwargs), name)(self))
+
+	def _invalidate(self, kwargs, *others, parents=False):
+		# Invalidate the metadata cache of the context for :obj:`self` and :obj:`others`
+		cache = getcontext(kwargs.get("context")).metacache
+		if cache is not None:
+			cache.invalidate(self, parents=parents)
+			for other in others:
+				cache.invalidate(other, parents=parents)
+
 	# All the following methods need a connection and simply forward the operation to the connection
 	def stat(self, **kwargs):
 		return self.connect(**kwargs).stat(self)
@@ -2996,12 +4582,15 @@ class URL(object):
 		return self.connect(**kwargs).lstat(self)
 
 	def chmod(self, mode, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).chmod(self, mode)
 
 	def chown(self, owner=None, group=None, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).chown(self, owner=owner, group=group)
 
 	def lchown(self, owner=None, group=None, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).lchown(self, owner=owner, group=group)
 
 	def uid(self, **kwargs):
@@ -3017,16 +4606,16 @@ class URL(object):
 		return self.connect(**kwargs).group(self)
 
 	def mimetype(self, **kwargs):
-		return self.connect(**kwargs).mimetype(self)
+		return self._cached("mimetype", kwargs)
 
 	def exists(self, **kwargs):
-		return self.connect(**kwargs).exists(self)
+		return self._cached("exists", kwargs)
 
 	def isfile(self, **kwargs):
-		return self.connect(**kwargs).isfile(self)
+		return self._cached("isfile", kwargs)
 
 	def isdir(self, **kwargs):
-		return self.connect(**kwargs).isdir(self)
+		return self._cached("isdir", kwargs)
 
 	def islink(self, **kwargs):
 		return self.connect(**kwargs).islink(self)
@@ -3038,7 +4627,7 @@ class URL(object):
 		return self.connect(**kwargs).access(self, mode)
 
 	def size(self, **kwargs):
-		return self.connect(**kwargs).size(self)
+		return self._cached("size", kwargs)
 
 	def imagesize(self, **kwargs):
 		return self.connect(**kwargs).imagesize(self)
@@ -3050,33 +4639,43 @@ class URL(object):
 		return self.connect(**kwargs).adate(self)
 
 	def mdate(self, **kwargs):
-		return self.connect(**kwargs).mdate(self)
+		return self._cached("mdate", kwargs)
+
+	def checksum(self, algorithm="sha1", **kwargs):
+		return self.connect(**kwargs).checksum(self, algorithm)
 
 	def resheaders(self, **kwargs):
 		return self.connect(**kwargs).resheaders(self)
 
 	def remove(self, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).remove(self)
 
 	def rmdir(self, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).rmdir(self)
 
 	def rename(self, target, **kwargs):
+		self._invalidate(kwargs, target)
 		return self.connect(**kwargs).rename(self, target)
 
 	def link(self, target, **kwargs):
+		self._invalidate(kwargs, target)
 		return self.connect(**kwargs).link(self, target)
 
 	def symlink(self, target, **kwargs):
+		self._invalidate(kwargs, target)
 		return self.connect(**kwargs).symlink(self, target)
 
 	def chdir(self, **kwargs):
 		return self.connect(**kwargs).chdir(self)
 
 	def mkdir(self, mode=0o777, **kwargs):
+		self._invalidate(kwargs)
 		return self.connect(**kwargs).mkdir(self, mode=mode)
 
 	def makedirs(self, mode=0o777, **kwargs):
+		self._invalidate(kwargs, parents=True)
 		return self.connect(**kwargs).makedirs(self, mode=mode)
 
 	def walk(self, beforedir=True, afterdir=False, file=True, enterdir=True, **kwargs):
@@ -3100,4 +4699,166 @@ class URL(object):
 	def walkdirs(self, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False, **kwargs):
 		return self.connect(**kwargs).walkdirs(self, include=include, exclude=exclude, enterdir=enterdir, skipdir=skipdir, ignorecase=ignorecase)
 
+	# Asynchronous versions of the methods above (for use with :mod:`asyncio`)
+	def _ahttp(self, context, mode="rb", headers=None, **kwargs):
+		# Can we use :class:`AsyncHTTPResource` for this request?
+		if self.scheme not in ("http", "https") or context.httpcache is not None or mode != "rb" or kwargs:
+			return False
+		proxies = urllib.request.getproxies()
+		return self.scheme not in proxies or urllib.request.proxy_bypass(self.host)
+
+	async def _acall(self, name, *args, context=None, **kwargs):
+		# Call the connection method :obj:`name` in the thread pool
+		context = getcontext(context)
+		(connection, kwargs) = await context._aconnect(self, **kwargs)
+		return await context._arun(context._getlimit(self, connection), getattr(connection, name), self, *args)
+
+	async def _acached(self, name, kwargs):
+		# Asynchronous version of :meth:`_cached`
+		context = getcontext(kwargs.get("context"))
+		async def call():
+			if name in ("mimetype", "size", "mdate") and self._ahttp(context):
+				return await getattr(await self._ahead(context), name)()
+			return await self._acall(name, **kwargs)
+		cache = context.metacache
+		if cache is None:
+			return await call()
+		return await cache.aget(self, name, call)
+
+	async def _ahead(self, context):
+		# Return an (already closed) :class:`AsyncHTTPResource` containing the response headers
+		resource = AsyncHTTPResource(context, self, context._getlimit(self), method="HEAD")
+		try:
+			await resource._open()
+		except urllib.error.HTTPError as exc:
+			if exc.code not in (405, 501): # ``HEAD`` not supported by the server
+				raise
+			resource = AsyncHTTPResource(context, self, context._getlimit(self))
+			await resource._open()
+		await resource.close()
+		return resource
+
+	async def aopen(self, *args, **kwargs):
+		"""
+		Asynchronous version of :meth:`open`. Returns an :class:`AsyncResource`
+		(or an :class:`AsyncHTTPResource` for ``http`` and ``https`` URLs). The
+		methods of the resource are coroutines.
+
+		The :class:`Context` used for this method (and the other asynchronous
+		methods) determines the size of the thread pool and the limit for the
+		number of concurrent operations per server.
+		"""
+		context = getcontext(kwargs.pop("context", None))
+		mode = args[0] if args else kwargs.get("mode", "rb")
+		if len(args) <= 1 and self._ahttp(context, *args, **kwargs):
+			return await AsyncHTTPResource(context, self, context._getlimit(self), headers=kwargs.get("headers"))._open()
+		cache = context.metacache if mode.strip("bt") != "r" else None
+		if cache is not None:
+			key = cache._beginwrite(self)
+		try:
+			(connection, kwargs) = await context._aconnect(self, **kwargs)
+			limit = context._getlimit(self, connection)
+			resource = await context._arun(limit, connection.open, self, *args, **kwargs)
+		except BaseException:
+			if cache is not None:
+				cache._endwrite(key)
+			raise
+		if cache is not None:
+			cache._track(key, resource)
+		return AsyncResource(context, resource, limit)
+
+	async def aopenread(self, *args, **kwargs):
+		return await self.aopen(mode="rb", *args, **kwargs)
+
+	async def aopenwrite(self, *args, **kwargs):
+		return await self.aopen(mode="wb", *args, **kwargs)
+
+	async def astat(self, **kwargs):
+		return await self._acall("stat", **kwargs)
+
+	async def aexists(self, **kwargs):
+		return await self._acached("exists", kwargs)
+
+	async def aisfile(self, **kwargs):
+		return await self._acached("isfile", kwargs)
+
+	async def aisdir(self, **kwargs):
+		return await self._acached("isdir", kwargs)
+
+	async def amimetype(self, **kwargs):
+		return await self._acached("mimetype", kwargs)
+
+	async def asize(self, **kwargs):
+		return await self._acached("size", kwargs)
+
+	async def amdate(self, **kwargs):
+		return await self._acached("mdate", kwargs)
+
+	async def aresheaders(self, **kwargs):
+		context = getcontext(kwargs.get("context"))
+		if self._ahttp(context):
+			return await (await self._ahead(context)).resheaders()
+		return await self._acall("resheaders", **kwargs)
+
+	async def achecksum(self, algorithm="sha1", **kwargs):
+		return await self._acall("checksum", algorithm, **kwargs)
+
+	async def aremove(self, **kwargs):
+		self._invalidate(kwargs)
+		return await self._acall("remove", **kwargs)
+
+	async def armdir(self, **kwargs):
+		self._invalidate(kwargs)
+		return await self._acall("rmdir", **kwargs)
+
+	async def arename(self, target, **kwargs):
+		self._invalidate(kwargs, target)
+		return await self._acall("rename", target, **kwargs)
+
+	async def amkdir(self, mode=0o777, **kwargs):
+		self._invalidate(kwargs)
+		return await self._acall("mkdir", mode, **kwargs)
+
+	async def amakedirs(self, mode=0o777, **kwargs):
+		self._invalidate(kwargs, parents=True)
+		return await self._acall("makedirs", mode, **kwargs)
+
+	async def alistdir(self, include=None, exclude=None, ignorecase=False, **kwargs):
+		return await self._acall("listdir", include, exclude, ignorecase, **kwargs)
+
+	async def afiles(self, include=None, exclude=None, ignorecase=False, **kwargs):
+		return await self._acall("files", include, exclude, ignorecase, **kwargs)
+
+	async def adirs(self, include=None, exclude=None, ignorecase=False, **kwargs):
+		return await self._acall("dirs", include, exclude, ignorecase, **kwargs)
+
+	async def _awalk(self, name, include, exclude, enterdir, skipdir, ignorecase, context=None, **kwargs):
+		context = getcontext(context)
+		(connection, kwargs) = await context._aconnect(self, **kwargs)
+		limit = context._getlimit(self, connection)
+		iterator = await context._arun(limit, getattr(connection, name), self, include=include, exclude=exclude, enterdir=enterdir, skipdir=skipdir, ignorecase=ignorecase)
+		async for url in context._aiterate(limit, iterator):
+			yield url
+
+	def awalkall(self, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False, **kwargs):
+		"""
+		Asynchronous version of :meth:`walkall`: Return an asynchronous iterator
+		(i.e. one that can be used with ``async for``).
+		"""
+		return self._awalk("walkall", include, exclude, enterdir, skipdir, ignorecase, **kwargs)
+
+	def awalkfiles(self, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False, **kwargs):
+		"""
+		Asynchronous version of :meth:`walkfiles`: Return an asynchronous
+		iterator (i.e. one that can be used with ``async for``).
+		"""
+		return self._awalk("walkfiles", include, exclude, enterdir, skipdir, ignorecase, **kwargs)
+
+	def awalkdirs(self, include=None, exclude=None, enterdir=None, skipdir=None, ignorecase=False, **kwargs):
+		"""
+		Asynchronous version of :meth:`walkdirs`: Return an asynchronous iterator
+		(i.e. one that can be used with ``async for``).
+		"""
+		return self._awalk("walkdirs", include, exclude, enterdir, skipdir, ignorecase, **kwargs)
+
 warnings.filterwarnings("always", module="url")
@@ -13,7 +13,7 @@
 This module contains functions related to the handling of CSS.
 """
 
-import os, contextlib, operator
+import os, contextlib, operator, collections
 
 try:
 	import cssutils
@@ -94,6 +94,59 @@ def _doimport(wantmedia, parentsheet, base):
 				yield rule
 
 
+def _itersheets(node, base=None, media=None, title=None):
+	# Iterate through all stylesheets in the HTML tree :obj:`node`. This
+	# produces ``(key, getrules)`` tuples, where ``key`` identifies the
+	# stylesheet (i.e. its content or URL and all arguments that influence
+	# which rules are produced) and ``getrules`` is a function that parses the
+	# stylesheet and returns an iterator over its rules.
+	# For the meaning of :obj:`base`, :obj:`media` and :obj:`title` see :func:`iterrules`.
+	if base is not None:
+		base = url.URL(base)
+
+	def matchlink(node):
+		if node.attrs.media.hasmedia(media):
+			if title is None:
+				if "title" not in node.attrs and "alternate" not in str(node.attrs.rel).split():
+					return True
+			elif not node.attrs.title.isfancy() and str(node.attrs.title) == title and "alternate" in str(node.attrs.rel).split():
+				return True
+		return False
+
+	def matchstyle(node):
+		if node.attrs.media.hasmedia(media):
+			if title is None:
+				if "title" not in node.attrs:
+					return True
+			elif str(node.attrs.title) == title:
+				return True
+		return False
+
+	def parsestyle(content, href, sheetmedia):
+		stylesheet = cssutils.parseString(content, href=href, media=sheetmedia)
+		return _doimport(media, stylesheet, base)
+
+	def parselink(href, sheetmedia):
+		stylesheet = cssutils.parseUrl(str(href), media=sheetmedia)
+		return _doimport(media, stylesheet, href)
+
+	for cssnode in node.walknodes(_isstyle):
+		if isinstance(cssnode, html.style):
+			href = str(base) if base is not None else None
+			if matchstyle(cssnode):
+				content = str(cssnode.content)
+				sheetmedia = str(cssnode.attrs.media)
+				yield (("style", content, href, sheetmedia, media), lambda content=content, href=href, sheetmedia=sheetmedia: parsestyle(content, href, sheetmedia))
+		else: # link
+			if "href" in cssnode.attrs:
+				href = cssnode.attrs.href.asURL()
+				if base is not None:
+					href = base/href
+				if matchlink(cssnode):
+					sheetmedia = str(cssnode.attrs.media)
+					yield (("link", str(href), sheetmedia, media), lambda href=href, sheetmedia=sheetmedia: parselink(href, sheetmedia))
+
+
 def iterrules(node, base=None, media=None, title=None):
 	"""
 	Return an iterator for all CSS rules defined in the HTML tree :obj:`node`.
@@ -119,46 +172,107 @@ def iterrules(node, base=None, media=None, title=None):
 	For a description of "persistent", "preferred" and "alternate" stylesheets
 	see <http://www.w3.org/TR/2002/WD-xhtml2-20020805/mod-styleSheet.html#sec_20.1.2.>
 	"""
-	if base is not None:
-		base = url.URL(base)
+	def doiter(node):
+		for (key, getrules) in _itersheets(node, base=base, media=media, title=title):
+			yield from getrules()
+	return misc.Iterator(doiter(node))
 
-	def matchlink(node):
-		if node.attrs.media.hasmedia(media):
-			if title is None:
-				if "title" not in node.attrs and "alternate" not in str(node.attrs.rel).split():
-					return True
-			elif not node.attrs.title.isfancy() and str(node.attrs.title) == title and "alternate" in str(node.attrs.rel).split():
-				return True
-		return False
 
-	def matchstyle(node):
-		if node.attrs.media.hasmedia(media):
-			if title is None:
-				if "title" not in node.attrs:
-					return True
-			elif str(node.attrs.title) == title:
-				return True
-		return False
+class _Rule:
+	# A compiled CSS rule as used by :func:`applystylesheets`
+
+	def __init__(self, specificity, selector, properties):
+		self.specificity = specificity
+		self.selector = selector
+		self.properties = properties
+
+
+def _compilerules(rules):
+	# Compile the :mod:`cssutils` rules :obj:`rules` into a list of :class:`_Rule` objects
+	return [
+		_Rule(sel.specificity, selector(sel), [(prop.name, prop.cssText) for prop in rule.style])
+		for rule in rules
+		for sel in rule.selectorList
+	]
+
+
+def _bucketkey(sel):
+	# Return the key of the bucket in which the compiled selector :obj:`sel`
+	# should be put. This is determined by the rightmost compound selector.
+	while isinstance(sel, xfind.BinaryCombinator):
+		sel = sel.right
+	if isinstance(sel, CSSTypeSelector):
+		for subselector in sel.selectors:
+			if isinstance(subselector, xfind.hasid) and len(subselector.ids) == 1:
+				return ("id", subselector.ids[0])
+		for subselector in sel.selectors:
+			if isinstance(subselector, xfind.hasclass) and len(subselector.classnames) == 1:
+				return ("class", subselector.classnames[0])
+		if sel.type is not None:
+			return ("type", sel.type)
+	return None # universal
+
+
+class _RuleIndex:
+	# An index of compiled rules by the id, class or type name their rightmost
+	# compound selector requires. This is used by :func:`applystylesheets` so
+	# that each element only has to be tested against rules that might match.
+	# The buckets contain ``(order, rule)`` tuples (as the :class:`_Rule`
+	# objects might be shared via the cache, the order can't be stored in them).
+
+	def __init__(self, rules):
+		self.buckets = collections.defaultdict(list)
+		self.universal = []
+		for (i, rule) in enumerate(rules):
+			key = _bucketkey(rule.selector)
+			if key is None:
+				self.universal.append((i, rule))
+			else:
+				self.buckets[key].append((i, rule))
+
+	def candidates(self, node):
+		# Return all rules that might match the element :obj:`node` (in the original order)
+		candidates = []
+		buckets = self.buckets
+		id = node.attrs.get("id")
+		if not id.isfancy():
+			candidates.extend(buckets.get(("id", str(id)), ()))
+		classes = node.attrs.get("class")
+		if not classes.isfancy():
+			for classname in set(str(classes).split()):
+				candidates.extend(buckets.get(("class", classname), ()))
+		candidates.extend(buckets.get(("type", node.xmlname), ()))
+		candidates.extend(self.universal)
+		candidates.sort(key=operator.itemgetter(0))
+		return [rule for (order, rule) in candidates]
+
+
+_rulecache = collections.OrderedDict()
+_rulecachesize = 100
+
+
+def _cachedrules(key, getrules):
+	# Return the compiled rules for the stylesheet identified by :obj:`key`
+	# (using the cache)
+	try:
+		rules = _rulecache[key]
+	except KeyError:
+		rules = _rulecache[key] = _compilerules(getrules())
+		while len(_rulecache) > _rulecachesize:
+			_rulecache.popitem(last=False)
+	else:
+		_rulecache.move_to_end(key)
+	return rules
 
-	def doiter(node):
-		for cssnode in node.walknodes(_isstyle):
-			if isinstance(cssnode, html.style):
-				href = str(base) if base is not None else None
-				if matchstyle(cssnode):
-					stylesheet = cssutils.parseString(str(cssnode.content), href=href, media=str(cssnode.attrs.media))
-					yield from _doimport(media, stylesheet, base)
-			else: # link
-				if "href" in cssnode.attrs:
-					href = cssnode.attrs.href.asURL()
-					if base is not None:
-						href = base/href
-					if matchlink(cssnode):
-						stylesheet = cssutils.parseUrl(str(href), media=str(cssnode.attrs.media))
-						yield from _doimport(media, stylesheet, href)
-	return misc.Iterator(doiter(node))
 
+def clearcache():
+	"""
+	Clear the cache of parsed stylesheets used by :func:`applystylesheets`.
+	"""
+	_rulecache.clear()
 
-def applystylesheets(node, base=None, media=None, title=None):
+
+def applystylesheets(node, base=None, media=None, title=None, cache=False):
 	"""
 	:func:`applystylesheets` modifies the XIST tree :obj:`node` by removing all
 	CSS (from :class:`html.link` and :class:`html.style` elements and their
@@ -167,38 +281,51 @@ def applystylesheets(node, base=None, media=None, title=None):
 
 	For the meaning of :obj:`base`, :obj:`media` and :obj:`title` see
 	:func:`iterrules`.
-	"""
 
-	def iterstyles(node, rules):
-		yield from rules
-		# According to CSS 2.1 (http://www.w3.org/TR/CSS21/cascade.html#specificity)
-		# style attributes have the highest weight, so we yield it last
-		# (CSS 3 uses the same weight)
-		if "style" in node.attrs:
-			style = node.attrs.style
-			if not style.isfancy():
-				yield (
-					(1, 0, 0, 0),
-					xfind.IsSelector(node),
-					cssutils.parseStyle(str(style)) # parse the style out of the style attribute
-				)
+	If :obj:`cache` is true, parsed stylesheets will be cached (by the content
+	of the :class:`html.style` element or the URL of the :class:`html.link`
+	element) and reused in later calls. (Note that this means that changes to
+	stylesheets that are referenced via URLs (or ``@import``\ed) won't be
+	noticed until :func:`clearcache` is called, so caching should only be used
+	when the stylesheets don't change.)
+	"""
 
 	rules = []
-	for rule in iterrules(node, base=base, media=media, title=title):
-		for sel in rule.selectorList:
-			rules.append((sel.specificity, selector(sel), rule.style))
-	rules.sort(key=operator.itemgetter(0))
+	for (key, getrules) in _itersheets(node, base=base, media=media, title=title):
+		if cache:
+			rules.extend(_cachedrules(key, getrules))
+		else:
+			rules.extend(_compilerules(getrules()))
+	rules.sort(key=operator.attrgetter("specificity"))
+	index = _RuleIndex(rules)
+
+	inlinestyles = {} # Cache for parsed ``style`` attributes
 	count = 0
 	for cursor in node.walk(xsc.Element):
 		del cursor.node[_isstyle] # drop style sheet nodes
 		if cursor.node.Attrs.isdeclared("style"):
 			styles = {}
-			for (spec, sel, style) in iterstyles(cursor.node, rules):
-				if cursor.path in sel:
-					for prop in style:
+			for rule in index.candidates(cursor.node):
+				if cursor.path in rule.selector:
+					for (name, value) in rule.properties:
 						# Properties from later rules overwrite those from earlier ones
 						# We're storing the count so that sorting keeps the order
-						styles[prop.name] = (count, prop.cssText)
+						styles[name] = (count, value)
+						count += 1
+			# According to CSS 2.1 (http://www.w3.org/TR/CSS21/cascade.html#specificity)
+			# style attributes have the highest weight, so we handle it last
+			# (CSS 3 uses the same weight)
+			if "style" in cursor.node.attrs:
+				style = cursor.node.attrs.style
+				if not style.isfancy():
+					style = str(style)
+					try:
+						properties = inlinestyles[style]
+					except KeyError:
+						# parse the style out of the style attribute
+						properties = inlinestyles[style] = [(prop.name, prop.cssText) for prop in cssutils.parseStyle(style)]
+					for (name, value) in properties:
+						styles[name] = (count, value)
 						count += 1
 			style = " ".join(f"{value};" for (count, value) in sorted(styles.values()))
 			if style:
@@ -209,19 +336,15 @@ def applystylesheets(node, base=None, media=None, title=None):
 ### Selector helper functions
 ###
 
-def _is_nth_node(iterator, node, index):
-	# Return whether :obj:`node` is the :obj:`index`'th node in :obj:`iterator` (starting at 1)
+def _is_nth_node(siblings, node, index):
+	# Return whether :obj:`node` is the :obj:`index`'th node in the :class:`xfind.Siblings` object :obj:`siblings` (starting at 1)
 	# :obj:`index` is an int or int string or "even" or "odd"
 	if index == "even":
-		for (i, child) in enumerate(iterator):
-			if child is node:
-				return i % 2 == 1
-		return False
+		pos = siblings.index(node)
+		return pos is not None and pos % 2 == 1
 	elif index == "odd":
-		for (i, child) in enumerate(iterator):
-			if child is node:
-				return i % 2 == 0
-		return False
+		pos = siblings.index(node)
+		return pos is not None and pos % 2 == 0
 	else:
 		if not isinstance(index, int):
 			try:
@@ -232,26 +355,20 @@ def _is_nth_node(iterator, node, index):
 				if index < 1:
 					return False
 		try:
-			return iterator[index-1] is node
+			return siblings.nodes[index-1] is node
 		except IndexError:
 			return False
 
 
-def _is_nth_last_node(iterator, node, index):
-	# Return whether :obj:`node` is the :obj:`index`'th last node in :obj:`iterator`
+def _is_nth_last_node(siblings, node, index):
+	# Return whether :obj:`node` is the :obj:`index`'th last node in the :class:`xfind.Siblings` object :obj:`siblings`
 	# :obj:`index` is an int or int string or "even" or "odd"
 	if index == "even":
-		pos = None
-		for (i, child) in enumerate(iterator):
-			if child is node:
-				pos = i
-		return pos is None or (i-pos) % 2 == 1
+		pos = siblings.index(node)
+		return pos is None or (len(siblings)-1-pos) % 2 == 1
 	elif index == "odd":
-		pos = None
-		for (i, child) in enumerate(iterator):
-			if child is node:
-				pos = i
-		return pos is None or (i-pos) % 2 == 0
+		pos = siblings.index(node)
+		return pos is None or (len(siblings)-1-pos) % 2 == 0
 	else:
 		if not isinstance(index, int):
 			try:
@@ -262,15 +379,24 @@ def _is_nth_last_node(iterator, node, index):
 				if index < 1:
 					return False
 		try:
-			return iterator[-index] is node
+			return siblings.nodes[-index] is node
 		except IndexError:
 			return False
 
 
-def _children_of_type(node, type):
-	for child in node:
-		if isinstance(child, xsc.Element) and child.xmlname == type:
-			yield child
+def _is_only_node(siblings, node):
+	# Return whether :obj:`node` is the only node in the :class:`xfind.Siblings` object :obj:`siblings`
+	return not siblings.nodes or (len(siblings) == 1 and siblings.nodes[0] is node)
+
+
+def _elements(path):
+	# Return the element siblings of the last node in :obj:`path` as a :class:`xfind.Siblings` object
+	return xfind.siblings(path).group("elements", lambda child: isinstance(child, xsc.Element))
+
+
+def _children_of_type(path, type):
+	# Return the element siblings of the last node in :obj:`path` with the element name :obj:`type` as a :class:`xfind.Siblings` object
+	return xfind.siblings(path).group(("elementsoftype", type), lambda child: isinstance(child, xsc.Element) and child.xmlname == type)
 
 
 ###
@@ -354,7 +480,7 @@ class CSSFirstChildSelector(CSSWeightedSelector):
 	that are the first child of its parent.
 	"""
 	def __contains__(self, path):
-		return len(path) >= 2 and _is_nth_node(path[-2][xsc.Element], path[-1], 1)
+		return len(path) >= 2 and _is_nth_node(_elements(path), path[-1], 1)
 
 	def __str__(self):
 		return "CSSFirstChildSelector()"
@@ -366,7 +492,7 @@ class CSSLastChildSelector(CSSWeightedSelector):
 	that are the last child of its parent.
 	"""
 	def __contains__(self, path):
-		return len(path) >= 2 and _is_nth_last_node(path[-2][xsc.Element], path[-1], 1)
+		return len(path) >= 2 and _is_nth_last_node(_elements(path), path[-1], 1)
 
 	def __str__(self):
 		return "CSSLastChildSelector()"
@@ -380,7 +506,7 @@ class CSSFirstOfTypeSelector(CSSWeightedSelector):
 	def __contains__(self, path):
 		if len(path) >= 2:
 			node = path[-1]
-			return isinstance(node, xsc.Element) and _is_nth_node(misc.Iterator(_children_of_type(path[-2], node.xmlname)), node, 1)
+			return isinstance(node, xsc.Element) and _is_nth_node(_children_of_type(path, node.xmlname), node, 1)
 		return False
 
 	def __str__(self):
@@ -395,7 +521,7 @@ class CSSLastOfTypeSelector(CSSWeightedSelector):
 	def __contains__(self, path):
 		if len(path) >= 2:
 			node = path[-1]
-			return isinstance(node, xsc.Element) and _is_nth_last_node(misc.Iterator(_children_of_type(path[-2], node.xmlname)), node, 1)
+			return isinstance(node, xsc.Element) and _is_nth_last_node(_children_of_type(path, node.xmlname), node, 1)
 		return False
 
 	def __str__(self):
@@ -411,10 +537,7 @@ class CSSOnlyChildSelector(CSSWeightedSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				for child in path[-2][xsc.Element]:
-					if child is not node:
-						return False
-				return True
+				return _is_only_node(_elements(path), node)
 		return False
 
 	def __str__(self):
@@ -430,10 +553,7 @@ class CSSOnlyOfTypeSelector(CSSWeightedSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				for child in _children_of_type(path[-2], node.xmlname):
-					if child is not node:
-						return False
-				return True
+				return _is_only_node(_children_of_type(path, node.xmlname), node)
 		return False
 
 	def __str__(self):
@@ -536,7 +656,7 @@ class CSSNthChildSelector(CSSFunctionSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				return _is_nth_node(path[-2][xsc.Element], node, self.value)
+				return _is_nth_node(_elements(path), node, self.value)
 		return False
 
 
@@ -549,7 +669,7 @@ class CSSNthLastChildSelector(CSSFunctionSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				return _is_nth_last_node(path[-2][xsc.Element], node, self.value)
+				return _is_nth_last_node(_elements(path), node, self.value)
 		return False
 
 
@@ -562,7 +682,7 @@ class CSSNthOfTypeSelector(CSSFunctionSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				return _is_nth_node(misc.Iterator(_children_of_type(path[-2], node.xmlname)), node, self.value)
+				return _is_nth_node(_children_of_type(path, node.xmlname), node, self.value)
 		return False
 
 
@@ -575,7 +695,7 @@ class CSSNthLastOfTypeSelector(CSSFunctionSelector):
 		if len(path) >= 2:
 			node = path[-1]
 			if isinstance(node, xsc.Element):
-				return _is_nth_last_node(misc.Iterator(_children_of_type(path[-2], node.xmlname)), node, self.value)
+				return _is_nth_last_node(_children_of_type(path, node.xmlname), node, self.value)
 		return False
 
 
@@ -620,14 +740,10 @@ class CSSAdjacentSiblingCombinator(xfind.BinaryCombinator):
 	def __contains__(self, path):
 		if len(path) >= 2 and path in self.right:
 			# Find sibling
-			node = path[-1]
-			sibling = None
-			for child in path[-2][xsc.Element]:
-				if child is node:
-					break
-				sibling = child
-			if sibling is not None:
-				return path[:-1]+[sibling] in self.left
+			elements = _elements(path)
+			pos = elements.index(path[-1])
+			if pos:
+				return xfind._replacelast(path, elements.nodes[pos-1]) in self.left
 		return False
 
 	def __str__(self):
@@ -643,12 +759,12 @@ class CSSGeneralSiblingCombinator(xfind.BinaryCombinator):
 
 	def __contains__(self, path):
 		if len(path) >= 2 and path in self.right:
-			node = path[-1]
-			for child in path[-2][xsc.Element]:
-				if child is node: # no previous element siblings
-					return False
-				if path[:-1]+[child] in self.left:
-					return True
+			elements = _elements(path)
+			pos = elements.index(path[-1])
+			if pos: # ``None`` or ``0`` means no previous element siblings
+				for child in elements.nodes[:pos]:
+					if xfind._replacelast(path, child) in self.left:
+						return True
 		return False
 
 	def __str__(self):
@@ -763,6 +879,10 @@ def selector(selectors, prefixes=None):
 			elif t == "NUMBER":
 				# can only appear in a function => set the function value
 				rule.selectors[-1].value = v
+			elif t == "IDENT":
+				# ``even`` or ``odd`` as the argument of a function => set the function value
+				if rule.selectors and isinstance(rule.selectors[-1], CSSFunctionSelector):
+					rule.selectors[-1].value = v
 			elif t == "STRING":
 				# can only appear in a attribute selector => set the attribute value
 				attributevalue = v
@@ -273,37 +273,245 @@ def xml2py(source):
 	return "\n".join(lines)
 
 
-def xml2mod(source, name=None, filename="unnamed.py"):
-	return misc.module(xml2py(source), filename, name)
+###
+### Caching of compiled detox templates
+###
+
+def _xistversion():
+	try:
+		from importlib import metadata
+		return metadata.version("ll-xist")
+	except Exception:
+		return "dev"
+
+
+def _compilerhash():
+	# Return a hash of the source of this module (i.e. the detox compiler), so
+	# that cached code is invalidated when the compiler changes, even if the
+	# version number doesn't (e.g. in a development checkout)
+	import hashlib
+	try:
+		with open(__file__, "rb") as f:
+			return hashlib.sha1(f.read()).hexdigest()
+	except OSError:
+		return ""
+
+
+class CodeCache:
+	"""
+	A :class:`CodeCache` object caches the code objects of compiled detox
+	templates, so that loading a template only requires compiling it once.
+
+	Code objects are stored in memory and (via :mod:`marshal`) on disk. If
+	:obj:`directory` is :const:`None`, the cache file for a template file will
+	be stored in a ``__pycache__`` directory next to the template file (like
+	Python does for ``.pyc`` files), otherwise all files will be stored in
+	:obj:`directory` (i.e. in this case the file names of the templates should
+	be unique). Templates that don't come from a file will only be cached in
+	memory, unless :obj:`directory` is given. Templates without a file name
+	will always be cached in memory only.
+
+	Cache entries are keyed by a hash of the template source, the XIST version,
+	the source of the detox compiler and the Python bytecode version, so cache
+	entries will not be used when any of them changes.
+
+	The attributes :attr:`hits`, :attr:`diskhits`, :attr:`misses` and
+	:attr:`errors` count how often a code object was found in memory, was
+	loaded from disk, had to be compiled or could not be written to disk.
+	"""
 
+	def __init__(self, directory=None):
+		self.directory = directory
+		self.tag = f"detox-{_xistversion()}"
+		self._compilerhash = _compilerhash()
+		self._codes = {}
+		self.hits = 0
+		self.diskhits = 0
+		self.misses = 0
+		self.errors = 0
+
+	def __repr__(self):
+		return f"<{self.__class__.__module__}.{self.__class__.__qualname__} directory={self.directory!r} hits={self.hits!r} diskhits={self.diskhits!r} misses={self.misses!r} at {id(self):#x}>"
+
+	def _header(self, source):
+		import hashlib, importlib.util
+		return importlib.util.MAGIC_NUMBER + hashlib.sha1(f"{self.tag}\n{self._compilerhash}\n{source}".encode("utf-8")).digest()
+
+	def cachefilename(self, filename):
+		"""
+		Return the name of the cache file for the template file :obj:`filename`
+		(or :const:`None` if the code for this template will not be stored on
+		disk).
+		"""
+		if filename is None:
+			return None
+		(dirname, basename) = os.path.split(filename)
+		basename = f"{basename}.{self.tag}.pyc"
+		if self.directory is not None:
+			return os.path.join(self.directory, basename)
+		if os.path.isfile(filename):
+			return os.path.join(dirname, "__pycache__", basename)
+		return None
+
+	def code(self, source, filename=None):
+		"""
+		Return the code object for the detox template source :obj:`source`
+		(either from the cache or by compiling it).
+
+		:obj:`filename` is the name of the template file. If it is
+		:const:`None`, the code object will only be cached in memory.
+		"""
+		import marshal
+		header = self._header(source)
+		key = (filename, header)
+		try:
+			code = self._codes[key]
+		except KeyError:
+			pass
+		else:
+			self.hits += 1
+			return code
+
+		cachefilename = self.cachefilename(filename)
+		if cachefilename is not None:
+			try:
+				with open(cachefilename, "rb") as f:
+					data = f.read()
+			except OSError:
+				pass
+			else:
+				if data[:len(header)] == header:
+					try:
+						code = marshal.loads(data[len(header):])
+					except (EOFError, ValueError, TypeError):
+						pass
+					else:
+						self.diskhits += 1
+						self._codes[key] = code
+						return code
+
+		self.misses += 1
+		code = compile(xml2py(source), filename or "unnamed.py", "exec")
+		self._codes[key] = code
+		if cachefilename is not None:
+			# Write to a temporary file first, so that other processes and threads
+			# never see a partially written file (the name of the temporary file
+			# is unique, so they don't write into each other's file either)
+			import tempfile
+			tmpfilename = None
+			try:
+				(dirname, basename) = os.path.split(cachefilename)
+				os.makedirs(dirname, exist_ok=True)
+				(fd, tmpfilename) = tempfile.mkstemp(prefix=f"{basename}.", suffix=".tmp", dir=dirname)
+				with open(fd, "wb") as f:
+					f.write(header)
+					f.write(marshal.dumps(code))
+				os.replace(tmpfilename, cachefilename)
+			except OSError:
+				self.errors += 1
+			finally:
+				# Don't leave the temporary file behind if anything went wrong
+				if tmpfilename is not None:
+					try:
+						os.remove(tmpfilename)
+					except OSError:
+						pass
+		return code
+
+	def clear(self):
+		"""
+		Clear the in-memory cache (files on disk will be kept).
+		"""
+		self._codes.clear()
+
+
+codecache = CodeCache()
+
+
+def xml2mod(source, name=None, filename=None, cache=None):
+	"""
+	Compile the detox template source :obj:`source` into a module.
 
-# The following stuff has been copied from Kids import hook
+	If :obj:`cache` is a :class:`CodeCache` object, the code object for the
+	module will be fetched from the cache, if it is true (but not a
+	:class:`CodeCache` object) the default cache :obj:`codecache` will be used.
+	The code object will only be stored on disk if :obj:`filename` is given.
+	"""
+	if not cache:
+		return misc.module(xml2py(source), filename or "unnamed.py", name)
+	if not isinstance(cache, CodeCache):
+		cache = codecache
+	modfilename = filename or "unnamed.py"
+	if name is None:
+		name = os.path.splitext(os.path.basename(modfilename))[0]
+	mod = types.ModuleType(name)
+	mod.__file__ = modfilename
+	exec(cache.code(source, filename), mod.__dict__)
+	return mod
+
+
+###
+### Import hook
+###
 
 DETOX_EXT = ".detox"
 
 
-def enable_import(suffixes=None):
-	class DetoxLoader:
-		def __init__(self, path=None):
-			if path and os.path.isdir(path):
-				self.path = path
-			else:
-				raise ImportError
-
-		def find_module(self, fullname):
-			path = os.path.join(self.path, fullname.split(".")[-1])
-			for ext in [cls.DETOX_EXT] + self.suffixes:
-				if os.path.exists(path + ext):
-					self.filename = path + ext
-					return self
-			return None
+class DetoxFinder:
+	"""
+	Meta path finder for importing detox templates (used by
+	:func:`enable_import`).
+	"""
 
-		def load_module(self, fullname):
-			try:
-				return sys.modules[fullname]
-			except KeyError:
-				return xml2mod(open(self.filename, "r").read(), name=fullname, filename=self.filename, store=True, loader=self)
+	def __init__(self, suffixes, cache):
+		self.suffixes = suffixes
+		self.cache = cache
 
-	DetoxLoader.suffixes = suffixes or []
-	sys.path_hooks.append(DetoxLoader)
-	sys.path_importer_cache.clear()
+	def find_spec(self, fullname, path=None, target=None):
+		import importlib.util
+		name = fullname.rpartition(".")[2]
+		for dirname in (sys.path if path is None else path):
+			filename = os.path.join(dirname or ".", name)
+			for ext in [DETOX_EXT] + self.suffixes:
+				if os.path.isfile(filename + ext):
+					loader = DetoxLoader(filename + ext, self.cache)
+					return importlib.util.spec_from_file_location(fullname, filename + ext, loader=loader)
+		return None
+
+
+class DetoxLoader:
+	"""
+	Loader for detox templates (used by :func:`enable_import`).
+	"""
+
+	def __init__(self, filename, cache):
+		self.filename = filename
+		self.cache = cache
+
+	def create_module(self, spec):
+		return None
+
+	def exec_module(self, module):
+		with open(self.filename, "r", encoding="utf-8") as f:
+			source = f.read()
+		if self.cache is None:
+			code = compile(xml2py(source), self.filename, "exec")
+		else:
+			code = self.cache.code(source, self.filename)
+		exec(code, module.__dict__)
+
+
+def enable_import(suffixes=None, cache=True):
+	"""
+	Install an import hook that allows importing detox templates from files
+	with the extension ``.detox`` (and any extension in :obj:`suffixes`).
+
+	If :obj:`cache` is true, the code objects of the compiled templates will
+	be cached by :obj:`codecache` (or by :obj:`cache`, if this is a
+	:class:`CodeCache` object).
+	"""
+	if cache and not isinstance(cache, CodeCache):
+		cache = codecache
+	elif not cache:
+		cache = None
+	sys.meta_path.append(DetoxFinder(list(suffixes or []), cache))
@@ -111,7 +111,7 @@ class GlobalAttrs(xsc.Attrs):
 	"""
 	def validateattr(self, path):
 		node = path[-1]
-		if node.xmlns is None and not self.isdeclared(node) and not node.xmlname.startswith(("data-", "aria-")):
+		if node.xmlns is None and not type(self).isdeclared(node) and not node.xmlname.startswith(("data-", "aria-")):
 			yield xsc.UndeclaredAttrWarning(self.__class__, node)
 
 	class accesskey(xsc.TextAttr):
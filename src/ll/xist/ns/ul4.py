@@ -9,6 +9,8 @@
 ## See ll/xist/__init__.py for the license
 
 
+import collections
+
 from ll import misc
 from ll.xist import xsc
 
@@ -191,3 +193,67 @@ class def_(xsc.ProcInst):
 	xmlname = "def"
 	prettyindentbefore = 0
 	prettyindentafter = 1
+
+
+###
+### Compiling XIST trees into UL4 templates
+###
+
+_templatecache = collections.OrderedDict()
+_templatecachesize = 100
+
+
+def totemplate(node, name=None, whitespace="keep", signature=None, cache=True, **publishargs):
+	"""
+	Publish the XIST tree :obj:`node` (which may contain the processing
+	instructions and elements from this module) and compile the resulting
+	string into a :class:`ll.ul4c.Template` object.
+
+	:obj:`name`, :obj:`whitespace` and :obj:`signature` are passed to the
+	:class:`~ll.ul4c.Template` constructor, :obj:`publishargs` are used for
+	publishing :obj:`node`.
+
+	If :obj:`cache` is true, compiled templates are cached by a fingerprint of
+	:obj:`node` (i.e. the type, content and attributes of all nodes in the tree)
+	and the other arguments, so for an equal tree :obj:`node` will neither be
+	published nor will the template source be tokenized and parsed again. Trees
+	that contain nodes without a fingerprint are cached by their published
+	source instead. The cache holds the 100 most recently used templates and
+	can be cleared with :func:`clearcache`.
+
+	Note that a cached template is shared by all calls for equal trees, so it
+	must be treated as read-only (e.g. its :attr:`name` must not be changed).
+	Pass ``cache=False`` to get a template object of your own.
+	"""
+	from ll import ul4c
+	if not cache:
+		return ul4c.Template(node.string(**publishargs), name=name, whitespace=whitespace, signature=signature)
+	source = None
+	key = xsc.Converter()._fingerprint(node)
+	if key is not None:
+		key = (key, tuple(sorted(publishargs.items())), name, whitespace, signature)
+		try:
+			hash(key)
+		except TypeError: # e.g. ``prefixes`` is a :class:`dict`
+			key = None
+	if key is None:
+		source = node.string(**publishargs)
+		key = (source, name, whitespace, signature)
+	try:
+		template = _templatecache[key]
+	except KeyError:
+		if source is None:
+			source = node.string(**publishargs)
+		template = _templatecache[key] = ul4c.Template(source, name=name, whitespace=whitespace, signature=signature)
+		while len(_templatecache) > _templatecachesize:
+			_templatecache.popitem(last=False)
+	else:
+		_templatecache.move_to_end(key)
+	return template
+
+
+def clearcache():
+	"""
+	Clear the cache of templates used by :func:`totemplate`.
+	"""
+	_templatecache.clear()
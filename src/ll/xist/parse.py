@@ -75,7 +75,8 @@ can be produced by source objects:
 
 	``"bytes"``
 		This event is produced by source objects  (and :class:`Transcoder` objects).
-		The event data is a byte string.
+		The event data is a byte string (or another bytes-like object, like a
+		:class:`memoryview`, for sources that avoid copying their data).
 
 	``"str"``
 		The event data is a string. This event is produced by :class:`Decoder`
@@ -247,7 +248,7 @@ This scripts outputs::
 """
 
 
-import os, os.path, warnings, io, codecs, contextlib
+import os, os.path, warnings, io, codecs, contextlib, mmap
 
 from xml.parsers import expat
 
@@ -287,6 +288,9 @@ class UnknownEventError(TypeError):
 ### Sources: Classes that create on event stream
 ###
 
+_buffertypes = (bytearray, memoryview, mmap.mmap) # Bytes-like objects that sources accept in addition to :class:`bytes`
+
+
 class String:
 	"""
 	Provides parser input from a string.
@@ -294,7 +298,9 @@ class String:
 	def __init__(self, data, url=None):
 		"""
 		Create a :class:`String` object. :obj:`data` must be a :class:`bytes` or
-		:class:`str` object. :obj:`url` specifies the URL for the source
+		:class:`str` object or a bytes-like object (like :class:`bytearray`,
+		:class:`memoryview` or :class:`mmap.mmap`, which will be passed to the
+		parser without copying). :obj:`url` specifies the URL for the source
 		(defaulting to ``"STRING"``).
 		"""
 		self.url = url_.URL(url if url is not None else "STRING")
@@ -310,6 +316,8 @@ class String:
 			yield ("bytes", self.data)
 		elif isinstance(self.data, str):
 			yield ("str", self.data)
+		elif isinstance(self.data, _buffertypes):
+			yield ("bytes", memoryview(self.data))
 		else:
 			raise TypeError("data must be str or bytes")
 
@@ -335,7 +343,7 @@ class Iter:
 		"""
 		yield ("url", self.url)
 		for data in self.iterable:
-			if isinstance(data, bytes):
+			if isinstance(data, (bytes, *_buffertypes)):
 				yield ("bytes", data)
 			elif isinstance(data, int): # From iterating over a ``bytes`` object
 				yield ("bytes", bytes([data]))
@@ -354,9 +362,11 @@ class Stream:
 	def __init__(self, stream, url=None, bufsize=8192):
 		"""
 		Create a :class:`Stream` object. :obj:`stream` must have a :meth:`read`
-		method (with a ``size`` argument). :obj:`url` specifies the URL for the
-		source (defaulting to ``"STREAM"``). :obj:`bufsize` specifies the
-		chunksize for reads from the stream.
+		method (with a ``size`` argument) returning :class:`bytes` or :class:`str`
+		objects (or other bytes-like objects, which will be passed on without
+		copying). :obj:`url` specifies the URL for the source (defaulting to
+		``"STREAM"``). :obj:`bufsize` specifies the chunksize for reads from the
+		stream.
 		"""
 		self.url = url_.URL(url if url is not None else "STREAM")
 		self.stream = stream
@@ -371,7 +381,7 @@ class Stream:
 		while True:
 			data = self.stream.read(self.bufsize)
 			if data:
-				if isinstance(data, bytes):
+				if isinstance(data, (bytes, *_buffertypes)):
 					yield ("bytes", data)
 				elif isinstance(data, str):
 					yield ("str", data)
@@ -386,16 +396,21 @@ class File:
 	Provides parser input from a file.
 	"""
 
-	def __init__(self, filename, bufsize=8192):
+	def __init__(self, filename, bufsize=8192, mmap=False):
 		"""
 		Create a :class:`File` object. :obj:`filename` is the name of the file
 		and may start with ``~`` or ``~user`` for the home directory of the
 		current or the specified user. :obj:`bufsize` specifies the chunksize
 		for reads from the file.
+
+		If :obj:`mmap` is true, the file will be memory mapped and the
+		``"bytes"`` events will contain :class:`memoryview` objects referencing
+		the mapped file instead of copies of the data.
 		"""
 		self.url = url_.File(filename)
 		self._filename = os.path.expanduser(filename)
 		self.bufsize = bufsize
+		self.mmap = mmap
 
 	def __iter__(self):
 		"""
@@ -404,6 +419,16 @@ class File:
 		"""
 		yield ("url", self.url)
 		with open(self._filename, "rb") as stream:
+			if self.mmap:
+				try:
+					data = memoryview(mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+				except ValueError: # Empty files can't be mapped
+					pass
+				else:
+					bufsize = self.bufsize
+					for pos in range(0, len(data), bufsize):
+						yield ("bytes", data[pos:pos+bufsize])
+					return
 			while True:
 				data = stream.read(self.bufsize)
 				if data:
@@ -1186,6 +1211,24 @@ class NS:
 		yield ("endtagns", data)
 
 
+_internsize = 1000 # Maximum number of short strings that the tree builders keep for reuse
+
+
+def _intern(strings, data):
+	# Return the string object from the dictionary :obj:`strings` that is equal
+	# to :obj:`data` (adding :obj:`data` if there is none). The dictionary is
+	# cleared when it gets too large, so that the memory used for it doesn't
+	# depend on the size of the document (which is important for
+	# ``itertree(..., prune=True)``).
+	try:
+		return strings[data]
+	except KeyError:
+		if len(strings) >= _internsize:
+			strings.clear()
+		strings[data] = data
+		return data
+
+
 class Node:
 	"""
 	A :class:`Node` object is used in a parsing pipeline to instantiate XIST
@@ -1224,7 +1267,11 @@ class Node:
 
 		:obj:`loc` specified whether location information should be attached to
 		the nodes that get generated (the :obj:`startloc` attribute (and
-		:obj:`endloc` attribute for elements))
+		:obj:`endloc` attribute for elements)). If :obj:`loc` is ``"compact"``
+		the locations will be stored in compact form (see
+		:meth:`xsc.Location.compact`), which saves time and memory. The
+		:class:`xsc.Location` objects will then be created when the
+		:obj:`startloc` or :obj:`endloc` attribute is accessed.
 		"""
 		self.pool = (pool if pool is not None else xsc.threadlocalpool.pool)
 		if base is not None:
@@ -1233,6 +1280,8 @@ class Node:
 		self._url = url_.URL()
 		self.loc = loc
 		self._position = (None, None)
+		self._loc = None
+		self._strings = {}
 		self._stack = []
 		self._inattr = False
 		self._indoctype = False
@@ -1244,6 +1293,24 @@ class Node:
 		else:
 			return self._base
 
+	def _location(self):
+		# All nodes created at the same position (i.e. an element, its
+		# attributes and their content) share the same :class:`xsc.Location`
+		# (or the same compact location)
+		if self._loc is None:
+			if self.loc == "compact":
+				self._loc = xsc.Location.compact(self._url, *self._position)
+			else:
+				self._loc = xsc.Location(self._url, *self._position)
+		return self._loc
+
+	def _text(self, data):
+		# Short strings (whitespace, attribute values etc.) are likely to be
+		# repeated, so reuse the first string object for all of them
+		if len(data) <= 32:
+			data = _intern(self._strings, data)
+		return xsc.Text(data)
+
 	def __call__(self, input):
 		for (evtype, data) in input:
 			try:
@@ -1256,11 +1323,12 @@ class Node:
 
 	def url(self, data):
 		self._url = data
+		self._loc = None
 
 	def xmldecl(self, data):
 		node = xml.XML(version=data["version"], encoding=data["encoding"], standalone=data["standalone"])
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		return ("xmldeclnode", node)
 
 	def begindoctype(self, data):
@@ -1272,7 +1340,7 @@ class Node:
 			content = data["name"]
 		node = xsc.DocType(content)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		self.doctype = node
 		self._indoctype = True
 
@@ -1285,7 +1353,7 @@ class Node:
 	def entity(self, data):
 		node = self.pool.entity(data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		node.parsed(self, "entity")
 		if self._inattr:
 			self._stack[-1].append(node)
@@ -1295,7 +1363,7 @@ class Node:
 	def comment(self, data):
 		node = xsc.Comment(data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		node.parsed(self, "comment")
 		if self._inattr:
 			self._stack[-1].append(node)
@@ -1303,9 +1371,9 @@ class Node:
 			return ("commentnode", node)
 
 	def cdata(self, data):
-		node = xsc.Text(data)
+		node = self._text(data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		node.parsed(self, "cdata")
 		if self._inattr:
 			self._stack[-1].append(node)
@@ -1313,9 +1381,9 @@ class Node:
 			return ("textnode", node)
 
 	def text(self, data):
-		node = xsc.Text(data)
+		node = self._text(data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		node.parsed(self, "text")
 		if self._inattr:
 			self._stack[-1].append(node)
@@ -1325,7 +1393,7 @@ class Node:
 	def enterstarttagns(self, data):
 		node = self.pool.element(*data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		self._stack.append(node)
 		node.parsed(self, "starttagns")
 
@@ -1334,7 +1402,7 @@ class Node:
 		self._stack[-1].attrs[attrkey] = ()
 		node = self._stack[-1].attrs[attrkey]
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		self._stack.append(node)
 		self._inattr = True
 		node.parsed(self, "enterattrns")
@@ -1352,14 +1420,14 @@ class Node:
 	def endtagns(self, data):
 		node = self._stack.pop()
 		if self.loc:
-			node.endloc = xsc.Location(self._url, *self._position)
+			node.endloc = self._location()
 		node.parsed(self, "endtagns")
 		return ("leaveelementnode", node)
 
 	def procinst(self, data):
 		node = self.pool.procinst(*data)
 		if self.loc:
-			node.startloc = xsc.Location(self._url, *self._position)
+			node.startloc = self._location()
 		node.parsed(self, "procinst")
 		if self._inattr:
 			self._stack[-1].append(node)
@@ -1368,6 +1436,7 @@ class Node:
 
 	def position(self, data):
 		self._position = data
+		self._loc = None
 
 
 class Tidy:
@@ -1473,21 +1542,22 @@ class Tidy:
 ### Consumers: Functions that consume an event stream
 ###
 
-def events(*pipeline):
-	"""
-	Return an iterator over the events produced by the pipeline objects in
-	:obj:`pipeline`.
-	"""
-	source = pipeline[0]
-
+def _source(source):
 	# Propagate first pipeline object to a source object (if unambiguous, else use it as it is)
-	if isinstance(source, (bytes, str)):
+	if isinstance(source, (bytes, str, *_buffertypes)):
 		source = String(source)
 	elif isinstance(source, url_.URL):
 		source = URL(source)
+	return source
+
 
+def events(*pipeline):
+	"""
+	Return an iterator over the events produced by the pipeline objects in
+	:obj:`pipeline`.
+	"""
 	# Execute the pipeline, propagating pipeline objects in the process
-	output = iter(source)
+	output = iter(_source(pipeline[0]))
 	for pipe in pipeline[1:]:
 		if isinstance(pipe, xsc.Pool):
 			pipe = Node(pool=pipe)
@@ -1548,7 +1618,7 @@ def tree(*pipeline, validate=False):
 	return path[0]
 
 
-def itertree(*pipeline, entercontent=True, enterattrs=False, enterattr=False, enterelementnode=False, leaveelementnode=True, enterattrnode=True, leaveattrnode=False, selector=None, validate=False):
+def itertree(*pipeline, entercontent=True, enterattrs=False, enterattr=False, enterelementnode=False, leaveelementnode=True, enterattrnode=True, leaveattrnode=False, selector=None, validate=False, prune=False):
 	"""
 	Parse the event stream :obj:`pipeline` iteratively.
 
@@ -1558,6 +1628,15 @@ def itertree(*pipeline, entercontent=True, enterattrs=False, enterattr=False, en
 	:obj:`validate` specifies whether each node should be validated after it has
 	been fully parsed.
 
+	If :obj:`prune` is true, nodes that have been matched by :obj:`selector`
+	will be removed from the tree after they have been completely parsed (and
+	have been returned to the calling code), together with all their preceding
+	siblings. This means that memory usage is proportional to the depth of the
+	tree and the size of the matched nodes, and not to the size of the complete
+	document. (However this means that the ancestors of a matched node will be
+	incomplete, and selectors that depend on the preceding siblings of a node
+	will not work properly.)
+
 	The rest of the arguments can be used to control when :func:`itertree`
 	returns to the calling code. For an explanation of their meaning see the
 	class :class:`ll.xist.xsc.Cursor`.
@@ -1607,12 +1686,17 @@ def itertree(*pipeline, entercontent=True, enterattrs=False, enterattr=False, en
 			cursor.index.pop()
 			if skipcontent is cursor.node:
 				skipcontent = None
-			if cursor.leaveelementnode and cursor.path in selector and skipcontent is None:
+			matched = (cursor.leaveelementnode or prune) and cursor.path in selector and skipcontent is None
+			if matched and cursor.leaveelementnode:
 				yield cursor
 				cursor.restore()
 			cursor.path.pop()
 			cursor.node = cursor.path[-1]
-			cursor.index[-1] += 1
+			if matched and prune:
+				del cursor.node[:]
+				cursor.index[-1] = 0
+			else:
+				cursor.index[-1] += 1
 		else:
 			cursor.path[-1].append(node)
 			cursor.path.append(node)
@@ -1620,9 +1704,281 @@ def itertree(*pipeline, entercontent=True, enterattrs=False, enterattr=False, en
 			if validate:
 				for warning in node.validate(False, cursor.path):
 					warnings.warn(warning)
-			if cursor.path in selector and skipcontent is None:
+			matched = cursor.path in selector and skipcontent is None
+			if matched:
 				yield cursor
 				cursor.restore()
 			cursor.path.pop()
 			cursor.node = cursor.path[-1]
-			cursor.index[-1] += 1
+			if matched and prune:
+				del cursor.node[:]
+				cursor.index[-1] = 0
+			else:
+				cursor.index[-1] += 1
+
+
+class _FastTreeBuilder:
+	"""
+	Builds an XIST tree directly from the callbacks of an expat parser (used
+	by :func:`fasttree`).
+	"""
+
+	def __init__(self, pool=None, prefixes=None, base=None, encoding=None, loc=True, validate=False):
+		self.pool = (pool if pool is not None else xsc.threadlocalpool.pool)
+		# Reuse the argument handling of :class:`NS`
+		self._prefixstack = [NS(prefixes)._prefixstack[0][1]]
+		if base is not None:
+			base = url_.URL(base)
+		self._base = base
+		self._url = url_.URL()
+		self.encoding = encoding
+		self.loc = loc
+		self.validate = validate
+		# Caches for the classes used for elements, attributes, entities and processing instructions
+		self._elementclasses = {}
+		self._attrkeys = {}
+		self._entityclasses = {}
+		self._procinstclasses = {}
+		self._strings = {} # Short strings for reusing string objects (see :meth:`Node._text`)
+
+	@property
+	def base(self):
+		if self._base is None:
+			return self._url
+		else:
+			return self._base
+
+	def __call__(self, source):
+		self._parser = parser = expat.ParserCreate(self.encoding)
+		parser.buffer_text = True
+		parser.ordered_attributes = True
+		parser.UseForeignDTD(True)
+		parser.CharacterDataHandler = self._handle_text
+		parser.StartElementHandler = self._handle_startelement
+		parser.EndElementHandler = self._handle_endelement
+		parser.ProcessingInstructionHandler = self._handle_procinst
+		parser.CommentHandler = self._handle_comment
+		parser.DefaultHandler = self._handle_default
+
+		self._path = [xsc.Frag()]
+		self._text = [] # Text collected since the last node
+		self._textloc = None # Location of the first text in ``self._text``
+
+		try:
+			for (evtype, data) in source:
+				if evtype == "bytes":
+					parser.Parse(data, False)
+				elif evtype == "url":
+					self._url = data
+				else:
+					raise UnknownEventError(self, (evtype, data))
+			parser.Parse(b"", True)
+			self._flushtext()
+			return self._path[0]
+		finally:
+			del self._parser
+			del self._path
+			del self._text
+			del self._textloc
+
+	def _location(self):
+		if self.loc == "compact":
+			return xsc.Location.compact(self._url, self._parser.CurrentLineNumber-1, self._parser.CurrentColumnNumber)
+		return xsc.Location(self._url, self._parser.CurrentLineNumber-1, self._parser.CurrentColumnNumber)
+
+	def _append(self, node):
+		# Append the (non-element) node :obj:`node` to the current element
+		path = self._path
+		path[-1].append(node)
+		if self.validate:
+			for warning in node.validate(False, path):
+				warnings.warn(warning)
+
+	def _flushtext(self):
+		# Create a text node from all the text collected so far
+		if self._text:
+			text = "".join(self._text)
+			if len(text) <= 32:
+				text = _intern(self._strings, text)
+			node = xsc.Text(text)
+			node.startloc = self._textloc
+			del self._text[:]
+			node.parsed(self, "text")
+			self._append(node)
+
+	def _handle_text(self, data):
+		if not self._text and self.loc:
+			self._textloc = self._location()
+		self._text.append(data)
+
+	def _handle_default(self, data):
+		if data.startswith("&") and data.endswith(";"):
+			self._flushtext()
+			name = data[1:-1]
+			try:
+				cls = self._entityclasses[name]
+			except KeyError:
+				cls = self._entityclasses[name] = self.pool.entityclass(name)
+			node = cls()
+			if cls is xsc.Entity:
+				node.xmlname = name
+			if self.loc:
+				node.startloc = self._location()
+			node.parsed(self, "entity")
+			self._append(node)
+
+	def _handle_comment(self, data):
+		self._flushtext()
+		node = xsc.Comment(data)
+		if self.loc:
+			node.startloc = self._location()
+		node.parsed(self, "comment")
+		self._append(node)
+
+	def _handle_procinst(self, target, data):
+		self._flushtext()
+		try:
+			cls = self._procinstclasses[target]
+		except KeyError:
+			cls = self._procinstclasses[target] = self.pool.procinstclass(target)
+		node = cls(data)
+		if cls is xsc.ProcInst:
+			node.xmlname = target
+		if self.loc:
+			node.startloc = self._location()
+		node.parsed(self, "procinst")
+		self._append(node)
+
+	def _handle_startelement(self, name, attrs):
+		self._flushtext()
+		loc = self._location() if self.loc else None
+
+		# Namespace handling (this works like :meth:`NS.leavestarttag`)
+		prefixes = self._prefixstack[-1]
+		newprefixes = None
+		for i in range(0, len(attrs), 2):
+			attrname = attrs[i]
+			if attrname == "xmlns" or attrname.startswith("xmlns:"):
+				if newprefixes is None:
+					newprefixes = prefixes.copy()
+				newprefixes[attrname[6:] or None] = attrs[i+1] or None
+		if newprefixes is not None:
+			prefixes = newprefixes
+		self._prefixstack.append(prefixes)
+
+		(prefix, sep, name) = name.rpartition(":")
+		prefix = prefix or None
+		try:
+			xmlns = prefixes[prefix]
+		except KeyError:
+			raise xsc.IllegalPrefixError(prefix)
+
+		try:
+			cls = self._elementclasses[(xmlns, name)]
+		except KeyError:
+			cls = self._elementclasses[(xmlns, name)] = self.pool.elementclass(xmlns, name)
+		node = cls()
+		if cls is xsc.Element:
+			node.xmlns = xmlns
+			node.xmlname = name
+		if loc is not None:
+			node.startloc = loc
+		self._path[-1].append(node)
+		self._path.append(node)
+		node.parsed(self, "starttagns")
+
+		nodeattrs = node.attrs
+		for i in range(0, len(attrs), 2):
+			attrname = attrs[i]
+			if attrname == "xmlns" or attrname.startswith("xmlns:"):
+				continue
+			try:
+				attrkey = self._attrkeys[attrname]
+			except KeyError:
+				if ":" in attrname:
+					(attrprefix, localname) = attrname.split(":", 1)
+					if attrprefix == "xml":
+						attrxmlns = xsc.xml_xmlns
+					else:
+						try:
+							attrxmlns = prefixes[attrprefix]
+						except KeyError:
+							raise xsc.IllegalPrefixError(attrprefix)
+					attrkey = self.pool.attrkey(attrxmlns, localname)
+					# The prefix mapping might change, so cache only local attributes
+				else:
+					attrkey = self._attrkeys[attrname] = self.pool.attrkey(None, attrname)
+			nodeattrs[attrkey] = ()
+			attr = nodeattrs[attrkey]
+			if loc is not None:
+				attr.startloc = loc
+			attr.parsed(self, "enterattrns")
+			text = attrs[i+1]
+			if len(text) <= 32:
+				text = _intern(self._strings, text)
+			text = xsc.Text(text)
+			if loc is not None:
+				text.startloc = loc
+			text.parsed(self, "text")
+			attr.append(text)
+			attr.parsed(self, "leaveattrns")
+		node.parsed(self, "leavestarttagns")
+
+	def _handle_endelement(self, name):
+		self._flushtext()
+		path = self._path
+		node = path[-1]
+		if self.loc:
+			node.endloc = self._location()
+		node.parsed(self, "endtagns")
+		if self.validate:
+			for warning in node.validate(False, path):
+				warnings.warn(warning)
+		path.pop()
+		self._prefixstack.pop()
+
+
+def fasttree(source, pool=None, prefixes=None, base=None, encoding=None, loc=True, validate=False):
+	"""
+	Parse the XML input :obj:`source` with expat and return a tree of XIST
+	nodes.
+
+	The result is the same as for::
+
+		tree(
+			source,
+			Expat(encoding=encoding, loc=loc),
+			NS(prefixes),
+			Node(pool=pool, base=base, loc=loc),
+			validate=validate
+		)
+
+	but :func:`fasttree` doesn't go through the event pipeline. Instead the
+	XIST nodes are created directly from the expat callbacks and the class
+	lookups in :obj:`pool` are cached for the duration of the parsing run.
+
+	:obj:`source` can be anything that can be used as the first object in a
+	parsing pipeline (i.e. a source object like :class:`String`, :class:`File`
+	or :class:`URL`, a :class:`bytes` object or a :class:`ll.url.URL`).
+
+	:obj:`pool`, :obj:`base` and :obj:`loc` have the same meaning as for
+	:class:`Node`, :obj:`prefixes` has the same meaning as for :class:`NS`
+	and :obj:`encoding` has the same meaning as for :class:`Expat`. If
+	:obj:`loc` is false, no location information will be recorded for the nodes,
+	if it is ``"compact"`` the locations will be stored in compact form.
+	:obj:`validate` has the same meaning as for :func:`tree`.
+
+	Example::
+
+		>>> from ll.xist import xsc, parse
+		>>> from ll.xist.ns import html
+		>>> doc = parse.fasttree(
+		... 	b"<a href='http://www.python.org/'>Python</a>",
+		... 	pool=xsc.Pool(html),
+		... 	prefixes=html,
+		... )
+		>>> doc.string()
+		'<a href="http://www.python.org/">Python</a>'
+	"""
+	builder = _FastTreeBuilder(pool=pool, prefixes=prefixes, base=base, encoding=encoding, loc=loc, validate=validate)
+	return builder(_source(source))
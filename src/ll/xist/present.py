@@ -148,6 +148,9 @@ s4number = astyle.Style.fromenv("LL_XIST_STYLE_NUMBER", "blue:black")
 # style to be used for variable strings in error messages etc.
 s4string = astyle.Style.fromenv("LL_XIST_STYLE_STRING", "magenta:black")
 
+# style to be used for elided nodes
+s4elided = astyle.Style.fromenv("LL_XIST_STYLE_ELIDED", "blue:black:bold")
+
 
 # style to be used for IDs in repr()
 s4id = astyle.Style.fromenv("LL_XIST_STYLE_ID", "yellow:black")
@@ -174,8 +177,43 @@ class Presenter:
 	to be printed on the screen.
 	"""
 
-	def __init__(self, node):
+	def __init__(self, node, maxdepth=None, maxchildren=None):
+		"""
+		Create a presenter for the XIST node :obj:`node`.
+
+		If :obj:`maxdepth` is not :const:`None`, nodes nested deeper than
+		:obj:`maxdepth` levels will be replaced by a line that shows the number
+		of elided nodes. If :obj:`maxchildren` is not :const:`None`, only the
+		first :obj:`maxchildren` child nodes of any fragment or element will be
+		output, followed by a line that shows the number of remaining children.
+		"""
 		self.node = node
+		self.maxdepth = maxdepth
+		self.maxchildren = maxchildren
+
+	def __str__(self):
+		return "\n".join(str(line.content) for line in self)
+
+	def write(self, stream):
+		"""
+		Write the output of the presenter to the file-like object :obj:`stream`
+		line by line. Lines are written as soon as they are produced, so (unlike
+		:meth:`__str__`) the complete output is never held in memory.
+		"""
+		for line in self:
+			stream.write(str(line.content))
+			stream.write("\n")
+
+	def _limit(self, node):
+		# Return the number of children of :obj:`node` that should be output
+		# (according to ``maxdepth`` and ``maxchildren``). Must be called
+		# after the index for the children has been pushed onto ``_path``.
+		count = len(node)
+		if self.maxdepth is not None and len(self._path) > self.maxdepth:
+			return 0
+		if self.maxchildren is not None and count > self.maxchildren:
+			return self.maxchildren
+		return count
 
 	@misc.notimplemented
 	def presentText(self, node):
@@ -256,7 +294,7 @@ class TreePresenter(Presenter):
 	# When inside attributes the presenting methods yield astyle.Text objects
 	# Outside of attributes Line objects are yielded
 
-	def __init__(self, node, indent=None, defaultxmlns=None):
+	def __init__(self, node, indent=None, defaultxmlns=None, maxdepth=None, maxchildren=None):
 		"""
 		Create a :class:`TreePresenter` object for the XIST node :obj:`node` using
 		:obj:`indent` for indenting each tree level. If :obj:`indent` is
@@ -266,15 +304,28 @@ class TreePresenter(Presenter):
 
 		If :obj:`defaultxmlns` is not ``None``, elements from this namespace will
 		be output without any namespace name.
+
+		For :obj:`maxdepth` and :obj:`maxchildren` see :class:`Presenter`.
 		"""
-		Presenter.__init__(self, node)
+		Presenter.__init__(self, node, maxdepth, maxchildren)
 		if indent is None:
 			indent = os.environ.get("LL_XIST_INDENT", "\t")
 		self.indent = indent
 		self.defaultxmlns = xsc.nsname(defaultxmlns)
 
-	def __str__(self):
-		return "\n".join(str(line.content) for line in self)
+	def _presentchildren(self, node):
+		self._path.append(0)
+		limit = self._limit(node)
+		for child in node:
+			if self._path[-1] >= limit:
+				break
+			yield from child.present(self)
+			self._path[-1] += 1
+		if limit < len(node):
+			count = len(node)-limit
+			text = f"{count:,} more {'child' if count == 1 else 'children'}" if limit else f"{count:,} {'child' if count == 1 else 'children'}"
+			yield Line(node, None, self._path[:], self.strindent(len(self._path)) + s4elided("... (", text, ")"))
+		self._path.pop()
 
 	def strindent(self, level):
 		return s4tab(level*self.indent)
@@ -331,11 +382,7 @@ class TreePresenter(Presenter):
 					self._path[:],
 					s4frag(indent, "<", ns, ":", name, ">"),
 				)
-				self._path.append(0)
-				for child in node:
-					yield from child.present(self)
-					self._path[-1] += 1
-				self._path.pop(-1)
+				yield from self._presentchildren(node)
 				yield Line(
 					node,
 					node.endloc,
@@ -417,11 +464,7 @@ class TreePresenter(Presenter):
 					self._path[:],
 					indent + firstline,
 				)
-				self._path.append(0)
-				for child in node:
-					yield from child.present(self)
-					self._path[-1] += 1
-				self._path.pop()
+				yield from self._presentchildren(node.content)
 				lastline = s4element(indent, "</", xmlns, node.xmlname, ">")
 				yield Line(
 					node,
@@ -511,21 +554,51 @@ class CodePresenter(Presenter):
 	This makes it possible to quickly convert HTML/XML files to XIST constructor
 	calls.
 	"""
-	def __init__(self, node, indent=None):
+	def __init__(self, node, indent=None, maxdepth=None, maxchildren=None):
 		"""
 		Create a :class:`CodePresenter` object for the XIST node :obj:`node` using
 		:obj:`indent` for indenting each tree level. If :obj:`indent` is
 		:const:`None` use the value of the environment variable ``LL_XIST_INDENT``
 		as the indent string (falling back to a tab if the environment variable
 		doesn't exist).
+
+		For :obj:`maxdepth` and :obj:`maxchildren` see :class:`Presenter`.
+		Elided nodes will be output as ``...``.
 		"""
-		Presenter.__init__(self, node)
+		Presenter.__init__(self, node, maxdepth, maxchildren)
 		if indent is None:
 			indent = os.environ.get("LL_XIST_INDENT", "\t")
 		self.indent = indent
 
-	def __str__(self):
-		return "\n".join(str(line.content) for line in self)
+	def _presentchildren(self, node, comma):
+		# Present the children of :obj:`node` and append a comma to the last line
+		# of each child (except for the last one, if :obj:`comma` is false).
+		# Only one line is buffered, so memory usage doesn't depend on the size
+		# of the children.
+		self._path.append(0)
+		limit = len(node) if self._inattr else self._limit(node)
+		for child in node:
+			if self._path[-1] >= limit:
+				break
+			last = None
+			for line in child.present(self):
+				if last is not None:
+					yield last
+				last = line
+			if last is not None:
+				if comma or self._path[-1] < len(node)-1:
+					last.content += ","
+				yield last
+			self._path[-1] += 1
+		if limit < len(node):
+			count = len(node)-limit
+			line = astyle.style_default(self._indent(), s4elided("..."))
+			if comma:
+				line += ","
+			text = f"{count:,} more {'child' if count == 1 else 'children'}" if limit else f"{count:,} {'child' if count == 1 else 'children'}"
+			line += s4elided(f" # {text}")
+			yield Line(node, None, self._path[:], line)
+		self._path.pop()
 
 	def __iter__(self):
 		self._inattr = 0
@@ -562,19 +635,8 @@ class CodePresenter(Presenter):
 			if not self._inattr: # skip "(" for attributes, they will be added by presentElement()
 				yield Line(node, node.startloc, self._path[:], astyle.style_default(self._indent(), name, "("))
 			self._level += 1
-			self._path.append(0)
-			for (i, child) in enumerate(node):
-				if i == len(node)-1:
-					yield from child.present(self)
-				else:
-					lines = list(child.present(self))
-					for (j, line) in enumerate(lines):
-						if j == len(lines)-1:
-							line.content += ","
-						yield line
-				self._path[-1] += 1
+			yield from self._presentchildren(node, False)
 			self._level -= 1
-			self._path.pop()
 			if not self._inattr:
 				yield Line(node, node.startloc, self._path[:], astyle.style_default(self._indent(), ")"))
 		else:
@@ -650,18 +712,7 @@ class CodePresenter(Presenter):
 		if len(node.content) or len(node.attrs):
 			yield Line(node, node.startloc, self._path[:], astyle.style_default(self._indent(), name, "("))
 			self._level += 1
-			self._path.append(0)
-			for (i, child) in enumerate(node):
-				if i == len(node)-1 and not node.attrs:
-					yield from child.present(self)
-				else:
-					lines = list(child.present(self))
-					for (j, line) in enumerate(lines):
-						if j == len(lines)-1:
-							line.content += ","
-						yield line
-				self._path[-1] += 1
-			self._path.pop()
+			yield from self._presentchildren(node.content, bool(node.attrs))
 
 			pyattrs = []
 			otherattrs = []
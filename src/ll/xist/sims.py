@@ -215,25 +215,46 @@ class Elements:
 		are OK.
 		"""
 		self.elements = elements
+		self._xmlns = None # Namespaces of :obj:`elements` (calculated on first use)
+		self._wrong = {} # Maps node classes to whether they are invalid children
 
 	def __repr__(self):
 		elements = ", ".join(f"{cls.__module__}.{cls.__qualname__}" for cls in self.elements)
 		return f"Elements({elements})"
 
+	def _iswrong(self, child):
+		# Return whether :obj:`child` is an element that is not allowed
+		# (and cache the result for the class of :obj:`child`)
+		if self._xmlns is None:
+			self._xmlns = frozenset(el.xmlns for el in self.elements if el.xmlns is not None)
+		cls = child.__class__
+		if not issubclass(cls, xsc.Element) or issubclass(cls, self.elements):
+			wrong = False
+		elif cls is xsc.Element:
+			# Generic elements have their namespace in the instance, so we can't cache the result
+			return child.xmlns in self._xmlns
+		else:
+			wrong = cls.xmlns in self._xmlns
+		self._wrong[cls] = wrong
+		return wrong
+
 	def validate(self, path):
 		"""
 		check that the content of :obj:`node` is valid.
 		"""
 		node = path[-1]
-		ns = None
 		if isinstance(node, xsc.Element):
+			checkelements = node.xmlns is not None
+			wrong = self._wrong
 			for child in node.content:
 				if badtext(child):
 					yield IllegalTextWarning(path, child)
-				elif isinstance(child, xsc.Element) and node.xmlns is not None and not isinstance(child, self.elements):
-					if ns is None: # Calculate the first time we need it
-						ns = {el.xmlns for el in self.elements if el.xmlns is not None}
-					if child.xmlns in ns:
+				elif checkelements:
+					try:
+						iswrong = wrong[child.__class__]
+					except KeyError:
+						iswrong = self._iswrong(child)
+					if iswrong:
 						yield WrongElementWarning(path, child)
 
 
@@ -250,7 +271,7 @@ class ElementsOrText(Elements):
 		namespaces of those elements is invalid. Elements from other namespaces
 		are OK.
 		"""
-		self.elements = elements
+		Elements.__init__(self, *elements)
 
 	def __repr__(self):
 		elements = ", ".join(f"{cls.__module__}.{cls.__name__}" for cls in self.elements)
@@ -261,14 +282,15 @@ class ElementsOrText(Elements):
 		Check that the content of :obj:`node` is valid.
 		"""
 		node = path[-1]
-		ns = None
-		if isinstance(node, xsc.Element):
+		if isinstance(node, xsc.Element) and node.xmlns is not None:
+			wrong = self._wrong
 			for child in node.content:
-				if isinstance(child, xsc.Element) and node.xmlns is not None and not isinstance(child, self.elements):
-					if ns is None: # Calculate the first time we need it
-						ns = {el.xmlns for el in self.elements if el.xmlns is not None}
-					if child.xmlns in ns:
-						yield WrongElementWarning(path, child)
+				try:
+					iswrong = wrong[child.__class__]
+				except KeyError:
+					iswrong = self._iswrong(child)
+				if iswrong:
+					yield WrongElementWarning(path, child)
 
 
 class NotElements:
@@ -284,6 +306,7 @@ class NotElements:
 		which this validator is attached.
 		"""
 		self.elements = elements
+		self._wrong = {} # Maps node classes to whether they are invalid children
 
 	def __repr__(self):
 		elements = ", ".join(f"{cls.__module__}.{cls.__name__}" for cls in self.elements)
@@ -292,8 +315,14 @@ class NotElements:
 	def validate(self, path):
 		node = path[-1]
 		if isinstance(node, xsc.Element):
+			wrong = self._wrong
 			for child in node.content:
-				if isinstance(child, self.elements):
+				cls = child.__class__
+				try:
+					iswrong = wrong[cls]
+				except KeyError:
+					iswrong = wrong[cls] = issubclass(cls, self.elements)
+				if iswrong:
 					yield WrongElementWarning(path, child)
 
 
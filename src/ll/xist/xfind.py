@@ -23,7 +23,7 @@ __ http://www.w3.org/TR/xpath
 """
 
 
-import builtins
+import builtins, operator
 from collections import abc
 
 from ll import misc
@@ -122,6 +122,154 @@ def selector(*objs):
 	return OrCombinator(*objs)
 
 
+###
+### Cached information about the siblings of a node
+###
+
+class Siblings:
+	"""
+	A :class:`Siblings` object contains a list of sibling nodes (in the
+	attribute ``nodes``) and the position of each node in this list.
+	"""
+
+	def __init__(self, nodes=()):
+		self.nodes = []
+		self.positions = {}
+		for node in nodes:
+			self.append(node)
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def append(self, node):
+		"""
+		Append :obj:`node` to the list of siblings.
+		"""
+		self.positions.setdefault(id(node), len(self.nodes))
+		self.nodes.append(node)
+
+	def index(self, node):
+		"""
+		Return the position of :obj:`node` in the list of siblings (or ``None``
+		if :obj:`node` isn't in the list).
+		"""
+		return self.positions.get(id(node))
+
+
+class SiblingInfo(Siblings):
+	"""
+	A :class:`SiblingInfo` object caches the positions of the children of the
+	node :obj:`parent`. Further subsets of the children (e.g. all children of a
+	certain type) can be retrieved via :meth:`group`.
+
+	:class:`SiblingInfo` objects are created by :func:`siblings`.
+	"""
+
+	def __init__(self, parent):
+		self.version = xsc.Frag._version
+		self.content = self._content(parent)
+		Siblings.__init__(self, self.content)
+		self.parent = parent
+		self.groups = {}
+
+	@staticmethod
+	def _content(parent):
+		return parent._readcontent() if isinstance(parent, xsc.Element) else parent
+
+	def isvalid(self, node):
+		"""
+		Return whether the cached information is still valid for :obj:`node`
+		(i.e. the parent still contains exactly the cached nodes and
+		:obj:`node` is one of them).
+		"""
+		content = self._content(self.parent)
+		if content is not self.content or len(content) != len(self.nodes):
+			return False
+		pos = self.positions.get(id(node))
+		if pos is None or content[pos] is not node:
+			return False
+		version = xsc.Frag._version
+		if version != self.version:
+			# Children of some fragment have been replaced, removed or reordered
+			# since the last check, so compare all children
+			if not all(map(operator.is_, content, self.nodes)):
+				return False
+			self.version = version
+		return True
+
+	def update(self):
+		"""
+		Update the cached information if children have been appended to the
+		parent (as it happens during parsing with :func:`ll.xist.parse.itertree`).
+		Return whether this was possible.
+		"""
+		content = self._content(self.parent)
+		if content is not self.content:
+			return False
+		count = len(self.nodes)
+		newcount = len(content)
+		if newcount < count or (count and content[count-1] is not self.nodes[-1]):
+			return False
+		for i in range(count, newcount):
+			child = content[i]
+			self.append(child)
+			for (filter, group) in self.groups.values():
+				if filter(child):
+					group.append(child)
+		return True
+
+	def group(self, key, filter):
+		"""
+		Return a :class:`Siblings` object containing all children for which the
+		callable :obj:`filter` returns true. :obj:`key` must be a hashable object
+		that identifies :obj:`filter`, the result will be cached under this key.
+		"""
+		try:
+			return self.groups[key][1]
+		except KeyError:
+			group = Siblings(child for child in self.nodes if filter(child))
+			self.groups[key] = (filter, group)
+			return group
+
+
+def siblings(path):
+	"""
+	Return a :class:`SiblingInfo` object for the parent of the last node in the
+	list :obj:`path` (i.e. for ``path[-2]``).
+
+	If :obj:`path` is an :class:`xsc.Path` object (as it is used by
+	:meth:`xsc.Node.walk`) the :class:`SiblingInfo` object will be cached in
+	:obj:`path`, so that it can be reused for all other children of the parent
+	during the traversal. The cached object will be updated if children have
+	been appended to the parent and recreated if children have been replaced,
+	removed or reordered.
+	"""
+	parent = path[-2]
+	cache = getattr(path, "siblings", None)
+	if cache is None or not isinstance(parent, (xsc.Frag, xsc.Element)):
+		return SiblingInfo(parent)
+	depth = len(path)
+	info = cache.get(depth)
+	if info is None or info.parent is not parent:
+		info = cache[depth] = SiblingInfo(parent)
+	elif not info.isvalid(path[-1]):
+		if not info.update() or not info.isvalid(path[-1]):
+			info = cache[depth] = SiblingInfo(parent)
+	return info
+
+
+def _replacelast(path, node):
+	# Return a copy of :obj:`path` with the last node replaced by :obj:`node`.
+	# If :obj:`path` is an :class:`xsc.Path` the sibling cache will be shared.
+	newpath = path[:-1]
+	newpath.append(node)
+	cache = getattr(path, "siblings", None)
+	if cache is not None:
+		newpath = xsc.Path(newpath)
+		newpath.siblings = cache
+	return newpath
+
+
 ###
 ### Selectors for the :meth:`walk` method.
 ###
@@ -476,11 +624,9 @@ class OnlyOfTypeSelector(Selector):
 			node = path[-1]
 			parent = path[-2]
 			if isinstance(parent, (xsc.Frag, xsc.Element)):
-				for child in parent:
-					if isinstance(child, node.__class__):
-						if child is not node:
-							return False
-				return True
+				type = node.__class__
+				group = siblings(path).group(("isinstance", type), lambda child: isinstance(child, type))
+				return not group.nodes or (len(group) == 1 and group.nodes[0] is node)
 		return False
 
 	def __str__(self):
@@ -935,14 +1081,10 @@ class AdjacentSiblingCombinator(BinaryCombinator):
 	def __contains__(self, path):
 		if len(path) > 1 and path in self.right:
 			# Find sibling
-			node = path[-1]
-			sibling = None
-			for child in path[-2]:
-				if child is node:
-					break
-				sibling = child
-			if sibling is not None:
-				return path[:-1]+[sibling] in self.left
+			info = siblings(path)
+			pos = info.index(path[-1])
+			if pos:
+				return _replacelast(path, info.nodes[pos-1]) in self.left
 		return False
 
 	symbol = " * "
@@ -980,12 +1122,12 @@ class GeneralSiblingCombinator(BinaryCombinator):
 
 	def __contains__(self, path):
 		if len(path) > 1 and path in self.right:
-			node = path[-1]
-			for child in path[-2]:
-				if child is node: # no previous siblings
-					return False
-				if path[:-1]+[child] in self.left:
-					return True
+			info = siblings(path)
+			pos = info.index(path[-1])
+			if pos: # ``None`` or ``0`` means no previous siblings
+				for child in info.nodes[:pos]:
+					if _replacelast(path, child) in self.left:
+						return True
 		return False
 
 	symbol = " ** "
@@ -1180,9 +1322,9 @@ class nthchild(Selector):
 	def __contains__(self, path):
 		if len(path) > 1:
 			if self.index in ("even", "odd"):
-				for (i, child) in enumerate(path[-2]):
-					if child is path[-1]:
-						return (i % 2) == (self.index == "odd")
+				i = siblings(path).index(path[-1])
+				if i is not None:
+					return (i % 2) == (self.index == "odd")
 			else:
 				try:
 					return path[-2][self.index] is path[-1]
@@ -1226,19 +1368,18 @@ class nthoftype(Selector):
 
 	def _find(self, path):
 		types = self.types if self.types else path[-1].__class__
-		for child in path[-2]:
-			if isinstance(child, types):
-				yield child
+		return siblings(path).group(("isinstance", types), lambda child: isinstance(child, types))
 
 	def __contains__(self, path):
 		if len(path) > 1:
+			group = self._find(path)
 			if self.index in ("even", "odd"):
-				for (i, child) in enumerate(self._find(path)):
-					if child is path[-1]:
-						return (i % 2) == (self.index == "odd")
+				i = group.index(path[-1])
+				if i is not None:
+					return (i % 2) == (self.index == "odd")
 			else:
 				try:
-					return misc.item(self._find(path), self.index) is path[-1]
+					return group.nodes[self.index] is path[-1]
 				except IndexError:
 					return False
 		return False
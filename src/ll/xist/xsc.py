@@ -18,7 +18,7 @@ classes and a few helper classes and functions.
 __docformat__ = "reStructuredText"
 
 
-import sys, random, copy, warnings, threading, weakref, types, codecs
+import sys, random, copy, operator, warnings, threading, types, codecs, itertools, weakref, collections
 
 import cssutils
 
@@ -332,13 +332,24 @@ class Converter:
 	element :class:`ll.xist.ns.doc.section`.
 	"""
 
-	def __init__(self, node=None, root=None, mode=None, stage=None, target=None, lang=None, makeaction=None, makeproject=None):
+	def __init__(self, node=None, root=None, mode=None, stage=None, target=None, lang=None, makeaction=None, makeproject=None, cache=None):
 		"""
 		Create a :class:`Converter`. Arguments are used to initialize the
 		:class:`Converter` properties of the same name.
+
+		:obj:`cache` can be used to enable caching of the conversion results for
+		nodes whose class has the attribute ``convert_pure`` set to true.
+		:obj:`cache` may be ``None`` (no caching), ``True`` (use a new cache) or
+		a dictionary that will be used as the cache. Passing the same dictionary
+		to several converters reuses the conversion results across conversion
+		calls. (For more info see :meth:`convertcached`.)
 		"""
 		self.states = [ ConverterState(node=node, root=root, mode=mode, stage=stage, target=target, lang=lang, makeaction=makeaction, makeproject=makeproject) ]
 		self.contexts = {}
+		if cache is True:
+			cache = {}
+		self.cache = cache
+		self._fingerprints = {} # Maps ``id(node)`` to ``(node, fingerprint)`` (see :meth:`_fingerprint`)
 
 	class node(misc.propclass):
 		"""
@@ -517,6 +528,61 @@ class Converter:
 	def __setitem__(self, key, value):
 		self.contexts[key] = value
 
+	def convertcached(self, node):
+		"""
+		Convert :obj:`node` by calling its :meth:`convert` method.
+
+		If the converter has a cache and the class of :obj:`node` has its
+		``convert_pure`` attribute set to true, the result of the conversion
+		will be put into the cache and will be reused when an equal node
+		(i.e. one with the same type, content and attributes) is converted again
+		in the same :prop:`mode`, :prop:`stage`, :prop:`target` and :prop:`lang`.
+		This means that the result of the :meth:`convert` call must only depend
+		on the node itself (its content and attributes) and those four converter
+		properties (and not e.g. on the converter's contexts). Note that the
+		result might carry the source locations of another (equal) node.
+
+		Each call returns a copy-on-write clone of the cached result (see
+		:meth:`Node.clone`), so the results of different conversions can be
+		modified independently.
+
+		Trees containing nodes for which no fingerprint can be computed (i.e.
+		nodes that are not text, processing instructions, comments, elements,
+		entities or fragments) are cached by identity instead (then the node
+		must not be modified after it has been converted and the cache keeps a
+		reference to it, so its ``id`` can't be reused by another node).
+		"""
+		cache = self.cache
+		if cache is None or not node.convert_pure:
+			return node.convert(self)
+		state = self.states[-1]
+		fingerprint = self._fingerprint(node)
+		key = (id(node) if fingerprint is None else fingerprint, state.mode, state.stage, state.target, state.lang)
+		try:
+			(cachednode, result) = cache[key]
+		except KeyError:
+			pass
+		else:
+			# For identity keys the cache keeps :obj:`node` alive, but a shared
+			# cache might have been filled by someone else, so make sure that the
+			# node is really the same
+			if fingerprint is not None or cachednode is node:
+				return result.clone(True)
+		result = node.convert(self)
+		cache[key] = (node if fingerprint is None else None, result.clone(True))
+		return result
+
+	def _fingerprint(self, node):
+		# Return the fingerprint of :obj:`node` (see :meth:`Node._fingerprint`).
+		# Fingerprints are remembered for the lifetime of the converter, so that
+		# the fingerprints of nested nodes aren't computed again.
+		try:
+			return self._fingerprints[id(node)][1]
+		except KeyError:
+			fingerprint = node._fingerprint(self)
+			self._fingerprints[id(node)] = (node, fingerprint)
+			return fingerprint
+
 
 ###
 ### Publisher for serializing XML trees to strings
@@ -754,6 +820,25 @@ class Publisher:
 					self._prefix2ns[prefix] = xmlns
 		return prefix
 
+	def _registerprefixes(self, node):
+		# Register the prefixes for all elements and attributes in :obj:`node`.
+		# This does the same as iterating through
+		# ``node.walknodes(Element, Attr, enterattrs=True)``, but doesn't copy
+		# content shared between elements (see :meth:`Node.clone`).
+		if isinstance(node, Element):
+			self.getobjectprefix(node)
+			self._registerprefixes(node._readattrs())
+			for child in node._readcontent():
+				self._registerprefixes(child)
+		elif isinstance(node, Attrs):
+			for attr in node.values():
+				self.getobjectprefix(attr)
+		elif isinstance(node, Attr):
+			self.getobjectprefix(node)
+		elif isinstance(node, Frag):
+			for child in node:
+				self._registerprefixes(child)
+
 	def iterbytes(self, node, base=None, allowschemerelurls=False):
 		"""
 		Output the node :obj:`node`. This method is a generator that will yield
@@ -765,8 +850,7 @@ class Publisher:
 		self._ns2prefix.clear()
 		self._prefix2ns.clear()
 		# iterate through every node in the tree
-		for n in node.walknodes(Element, Attr, enterattrs=True):
-			self.getobjectprefix(n)
+		self._registerprefixes(node)
 		# Add the prefixes forced by ``self.showxmlns``
 		for xmlns in self.showxmlns:
 			self.getnamespaceprefix(xmlns)
@@ -853,6 +937,27 @@ class Publisher:
 ### Cursor for the :meth:`walk` method
 ###
 
+class Path(list):
+	"""
+	A :class:`Path` object is a list of nodes from the root of a tree to a node
+	in this tree (it is used as the ``path`` attribute of :class:`Cursor`
+	objects).
+
+	In addition to the nodes a :class:`Path` object contains a cache for
+	information about the siblings of the nodes in the path (in the attribute
+	``siblings``). This cache is used by selectors that have to look at the
+	siblings of a node (like :class:`ll.xist.xfind.nthchild`), so that the
+	children of a parent node have to be examined only once during a tree
+	traversal instead of once for every child (see
+	:func:`ll.xist.xfind.siblings`).
+	"""
+	__slots__ = ("siblings",)
+
+	def __init__(self, nodes=()):
+		list.__init__(self, nodes)
+		self.siblings = {}
+
+
 class Cursor:
 	"""
 	A :class:`Cursor` object is used by the :meth:`walk` method during tree
@@ -870,8 +975,9 @@ class Cursor:
 		The current node being traversed.
 
 	``path``
-		A list of nodes that contains the path through the tree from the root to
-		the current node (i.e. ``path[0] is root`` and ``path[-1] is node``).
+		A :class:`Path` object (i.e. a list of nodes) that contains the path
+		through the tree from the root to the current node (i.e.
+		``path[0] is root`` and ``path[-1] is node``).
 
 	``index``
 		A path of indices (e.g. ``[0, 1]`` if the current node is the second child
@@ -933,7 +1039,7 @@ class Cursor:
 		the same name. (see the class docstring for info about their use).
 		"""
 		self.root = self.node = node
-		self.path = [node]
+		self.path = Path([node])
 		self.index = []
 		self.event = None
 		self.entercontent = self._entercontent = entercontent
@@ -1020,11 +1126,17 @@ class Node(object, metaclass=_Node_Meta):
 	overwrite :meth:`convert` or :meth:`publish`.
 	"""
 
+	# Derived classes get an instance dictionary, unless they use
+	# ``__slots__`` themselves (like :class:`CharacterData` does)
+	__slots__ = ()
+
 	# location of this node in the XML file (will be hidden in derived classes,
 	# but is specified here, so that no special tests are required. In derived
-	# classes this will be set by the parser)
-	startloc = None
-	endloc = None
+	# classes this will be set by the parser). The value is either ``None``, a
+	# :class:`Location` object or the compact form of a location (an :class:`int`
+	# as returned by :meth:`Location.compact`).
+	_startloc = None
+	_endloc = None
 
 	# Subclasses relevant for parsing (i.e. Element, ProcInst and Entity)
 	# have an additional class attribute named register. This attribute may have
@@ -1038,6 +1150,18 @@ class Node(object, metaclass=_Node_Meta):
 	prettyindentbefore = 0
 	prettyindentafter = 0
 
+	# Set this to true, if the result of :meth:`convert` only depends on the
+	# node itself and the converter properties ``mode``, ``stage``, ``target``
+	# and ``lang``. The result can then be cached (see :meth:`Converter.convertcached`)
+	convert_pure = False
+
+	def _fingerprint(self, converter):
+		# Return a hashable object describing the type, content and attributes
+		# of :obj:`self` that is used as the key for caching conversion results
+		# (or ``None`` if the node can only be cached by identity). Fingerprints
+		# of nested nodes must be fetched via ``converter._fingerprint()``.
+		return None
+
 	def __repr__(self):
 		return f"<{self.__module__}:{self.__qualname__} object at {id(self):#x}>"
 
@@ -1074,11 +1198,25 @@ class Node(object, metaclass=_Node_Meta):
 		from ll.xist import xfind
 		return xfind.IsSelector(self) | other
 
-	def clone(self):
+	def clone(self, shared=False):
 		"""
 		Return a clone of :obj:`self`. Compared to :meth:`deepcopy` :meth:`clone`
 		will create multiple instances of objects that can be found in the tree
 		more than once. :meth:`clone` can't clone trees that contain cycles.
+
+		If :obj:`shared` is true, cloning is done copy-on-write: The clone and
+		:obj:`self` share the content and attributes of elements, until they are
+		accessed via the attributes ``content`` or ``attrs`` of either of them
+		(which every method that modifies the element does). Then (only) the
+		accessed part of the tree will be copied (again sharing the content of
+		the child nodes). This makes cloning large trees an operation that
+		doesn't depend on the size of the tree, e.g. when a prototype tree is
+		cloned and only a few attributes will be changed.
+
+		Note that this means that references to the content, attributes or child
+		nodes of :obj:`self` that have been fetched before calling :meth:`clone`
+		must not be used for modifications afterwards (they are shared with the
+		clone). Fetch them again from :obj:`self` instead.
 		"""
 		return self
 
@@ -1111,7 +1249,7 @@ class Node(object, metaclass=_Node_Meta):
 		# Subclasses of ``Node`` implement this method by calling the appropriate
 		# ``present*`` method in the publisher (i.e. double dispatch)
 
-	def conv(self, converter=None, root=None, mode=None, stage=None, target=None, lang=None, function=None, makeaction=None, makeproject=None):
+	def conv(self, converter=None, root=None, mode=None, stage=None, target=None, lang=None, function=None, makeaction=None, makeproject=None, cache=None):
 		"""
 		Convenience method for calling :meth:`convert`.
 
@@ -1120,13 +1258,16 @@ class Node(object, metaclass=_Node_Meta):
 		called, this means that you should not call :meth:`conv` in any of the
 		recursive calls, as you would loose this information. Call :meth:`convert`
 		directly instead.
+
+		:obj:`cache` is passed to the :class:`Converter` constructor, if a new
+		converter is created.
 		"""
 		if converter is None:
-			converter = Converter(node=self, root=root, mode=mode, stage=stage, target=target, lang=lang, makeaction=makeaction, makeproject=makeproject)
-			return self.convert(converter)
+			converter = Converter(node=self, root=root, mode=mode, stage=stage, target=target, lang=lang, makeaction=makeaction, makeproject=makeproject, cache=cache)
+			return converter.convertcached(self)
 		else:
 			converter.push(node=self, root=root, mode=mode, stage=stage, target=target, lang=lang, makeaction=makeaction, makeproject=makeproject)
-			node = self.convert(converter)
+			node = converter.convertcached(self)
 			converter.pop()
 			return node
 
@@ -1404,12 +1545,47 @@ class Node(object, metaclass=_Node_Meta):
 		"""
 		return self
 
+	def _compactedorself(self):
+		# Return :obj:`self` if compacting wouldn't change it (so that the
+		# caller can share it instead of copying it), else the compacted node
+		return self.compacted()
+
+	@property
+	def startloc(self):
+		"""
+		The location where this node starts in the source (a :class:`Location`
+		object or :const:`None`).
+		"""
+		loc = self._startloc
+		if loc.__class__ is int:
+			loc = Location.fromcompact(loc)
+		return loc
+
+	@startloc.setter
+	def startloc(self, value):
+		self._startloc = value
+
+	@property
+	def endloc(self):
+		"""
+		The location where this node ends in the source (a :class:`Location`
+		object or :const:`None`).
+		"""
+		loc = self._endloc
+		if loc.__class__ is int:
+			loc = Location.fromcompact(loc)
+		return loc
+
+	@endloc.setter
+	def endloc(self, value):
+		self._endloc = value
+
 	def _decoratenode(self, node):
 		# Decorate the :class:`Node` :obj:`node` with the same location
-		# information as :obj:`self`.
+		# information as :obj:`self` (without materializing compact locations).
 
-		node.startloc = self.startloc
-		node.endloc = self.endloc
+		node._startloc = self._startloc
+		node._endloc = self._endloc
 		return node
 
 	def mapped(self, function, converter=None, **converterargs):
@@ -1436,6 +1612,11 @@ class Node(object, metaclass=_Node_Meta):
 		"""
 		return self
 
+	def _normalizedorself(self):
+		# Return :obj:`self` if normalizing wouldn't change it (so that the
+		# caller can share it instead of copying it), else the normalized node
+		return self.normalized()
+
 	def __mul__(self, factor):
 		"""
 		Return a :class:`Frag` with :obj:`factor` times the node as an entry.
@@ -1475,10 +1656,15 @@ class CharacterData(Node):
 	(Provides nearly the same functionality as :class:`UserString`,
 	but omits a few methods.)
 	"""
-	__slots__ = ("_content",)
+	__slots__ = ("_content", "_startloc", "_endloc")
 
 	def __init__(self, *content):
 		self._content = "".join(str(x) for x in content)
+		self._startloc = None
+		self._endloc = None
+
+	def _fingerprint(self, converter):
+		return (self.__class__, self._content)
 
 	def __repr__(self):
 		if self.startloc is not None:
@@ -1502,6 +1688,8 @@ class CharacterData(Node):
 
 	def __setstate__(self, content):
 		self._content = content
+		self._startloc = None
+		self._endloc = None
 
 	class content(misc.propclass):
 		"""
@@ -1656,6 +1844,7 @@ class Text(CharacterData):
 	attributes) will be "escaped" with the appropriate character entities when
 	this node is published.
 	"""
+	__slots__ = ()
 
 	def __str__(self):
 		return self._content
@@ -1684,6 +1873,18 @@ class Text(CharacterData):
 		cursor.restore()
 
 
+def _repr_pretty_children(p, children):
+	# Output the child nodes :obj:`children` to the IPython pretty printer
+	# :obj:`p` (honoring its maximum sequence length)
+	maxlen = getattr(p, "max_seq_length", 0)
+	for (i, child) in enumerate(children):
+		p.breakable()
+		if maxlen and i >= maxlen:
+			p.text(f"... ({len(children)-i:,} more)")
+			break
+		p.pretty(child)
+
+
 class Frag(Node, list):
 	"""
 	A fragment contains a list of nodes and can be used for dynamically
@@ -1691,8 +1892,21 @@ class Frag(Node, list):
 	is a :class:`Frag`.
 	"""
 
+	# Store the location in slots (even for subclasses with an instance
+	# dictionary), as this avoids creating the dictionary for :class:`Attr`
+	# objects created by the parser
+	__slots__ = ("_startloc", "_endloc")
+
+	# Bumped whenever children of any fragment get replaced, removed or
+	# reordered (appending doesn't count), so that cached positions of children
+	# can be checked cheaply (see :func:`ll.xist.xfind.siblings`)
+	_versions = itertools.count(1)
+	_version = 0
+
 	def __init__(self, *content):
 		list.__init__(self)
+		self._startloc = None
+		self._endloc = None
 		for child in content:
 			child = tonode(child)
 			if isinstance(child, Frag):
@@ -1718,9 +1932,7 @@ class Frag(Node, list):
 				p.text(f"location={str(self.startloc)!r}")
 			if cycle:
 				p.text("...")
-			for child in self:
-				p.breakable()
-				p.pretty(child)
+			_repr_pretty_children(p, self)
 			p.breakable()
 			p.text(f"at {id(self):#x}")
 
@@ -1755,17 +1967,61 @@ class Frag(Node, list):
 		"""
 		del self[:]
 
+	@staticmethod
+	def _changed():
+		# Record that the children of a fragment have been replaced, removed or reordered
+		Frag._version = next(Frag._versions)
+
+	def conv(self, converter=None, root=None, mode=None, stage=None, target=None, lang=None, function=None, makeaction=None, makeproject=None, cache=None, processes=None):
+		"""
+		Convenience method for calling :meth:`convert`.
+
+		If :obj:`processes` is ``None`` this works like :meth:`Node.conv`.
+		Otherwise each child of :obj:`self` is treated as an independent document
+		and is converted in a separate process from a pool of :obj:`processes`
+		worker processes (``0`` uses as many processes as there are CPUs). In
+		this case no :obj:`converter` may be passed, the children and the result
+		of their conversion must be pickleable and each child gets its own
+		:class:`Converter` (so converter contexts can't be shared between the
+		children).
+		"""
+		if processes is None:
+			return super().conv(converter=converter, root=root, mode=mode, stage=stage, target=target, lang=lang, function=function, makeaction=makeaction, makeproject=makeproject, cache=cache)
+		if converter is not None:
+			raise ValueError("can't pass a converter for a conversion in multiple processes")
+		import concurrent.futures
+		if isinstance(target, types.ModuleType):
+			# Modules can't be pickled, so pass the module name instead
+			target = target.__name__
+		convargs = dict(root=root, mode=mode, stage=stage, target=target, lang=lang, makeaction=makeaction, makeproject=makeproject, cache=True if cache is not None else None)
+		with concurrent.futures.ProcessPoolExecutor(processes or None) as executor:
+			futures = [executor.submit(_convchild, child, convargs) for child in self]
+			node = self._create()
+			for future in futures:
+				node.append(future.result())
+		return self._decoratenode(node)
+
 	def convert(self, converter):
 		node = self._create()
+		cache = converter.cache
 		for child in self:
-			convertedchild = child.convert(converter)
+			if cache is not None and child.convert_pure:
+				convertedchild = converter.convertcached(child)
+			else:
+				convertedchild = child.convert(converter)
 			assert isinstance(convertedchild, Node), f"the convert method returned the illegal object {convertedchild!r} (type {type(convertedchild)!r}) when converting {self!r}"
 			node.append(convertedchild)
 		return self._decoratenode(node)
 
-	def clone(self):
+	def _fingerprint(self, converter):
+		fingerprints = tuple(converter._fingerprint(child) for child in self)
+		if None in fingerprints:
+			return None
+		return (self.__class__, fingerprints)
+
+	def clone(self, shared=False):
 		node = self._create()
-		list.extend(node, (child.clone() for child in self))
+		list.extend(node, (child.clone(shared) for child in self))
 		return self._decoratenode(node)
 
 	def __copy__(self):
@@ -1831,7 +2087,7 @@ class Frag(Node, list):
 			from ll.xist import xfind
 
 			def iterate(selector):
-				path = [self, None]
+				path = Path([self, None])
 				for child in self:
 					path[-1] = child
 					if path in selector:
@@ -1862,14 +2118,16 @@ class Frag(Node, list):
 				list.__setitem__(self, slice(l-1, l), value)
 			else:
 				list.__setitem__(self, slice(index, index+1), value)
+			self._changed()
 		elif isinstance(index, slice):
 			list.__setitem__(self, index, Frag(value))
+			self._changed()
 		else:
 			from ll.xist import xfind
 			selector = xfind.selector(index)
 			value = Frag(value)
 			newcontent = []
-			path = [self, None]
+			path = Path([self, None])
 			for child in self:
 				path[-1] = child
 				if path in selector:
@@ -1877,6 +2135,7 @@ class Frag(Node, list):
 				else:
 					newcontent.append(child)
 			list.__setitem__(self, slice(0, len(self)), newcontent)
+			self._changed()
 
 	def __delitem__(self, index):
 		"""
@@ -1897,10 +2156,12 @@ class Frag(Node, list):
 			del node[index[-1]]
 		elif isinstance(index, (int, slice)):
 			list.__delitem__(self, index)
+			self._changed()
 		else:
 			from ll.xist import xfind
 			selector = xfind.selector(index)
 			list.__setitem__(self, slice(0, len(self)), [child for child in self if [self, child] not in selector])
+			self._changed()
 
 	def __mul__(self, factor):
 		"""
@@ -1944,12 +2205,43 @@ class Frag(Node, list):
 		"""
 		other = Frag(*others)
 		list.__setitem__(self, slice(index, index), other)
+		self._changed()
+
+	def pop(self, index=-1):
+		node = list.pop(self, index)
+		self._changed()
+		return node
+
+	def remove(self, node):
+		list.remove(self, node)
+		self._changed()
+
+	def reverse(self):
+		list.reverse(self)
+		self._changed()
+
+	def sort(self, *, key=None, reverse=False):
+		list.sort(self, key=key, reverse=reverse)
+		self._changed()
+
+	def __imul__(self, factor):
+		list.__imul__(self, factor)
+		self._changed()
+		return self
 
 	def compacted(self):
+		node = self._compactedorself()
+		return self.clone(True) if node is self else node
+
+	def _compactedorself(self):
+		children = [child._compactedorself() for child in self]
+		if all(map(operator.is_, children, self)):
+			return self
 		node = self._create()
-		for child in self:
-			compactedchild = child.compacted()
+		for (child, compactedchild) in zip(self, children):
 			assert isinstance(compactedchild, Node), f"the compact method returned the illegal object {compactedchild!r} (type {type(compactedchild)!r}) when compacting {child!r}"
+			if compactedchild is child:
+				compactedchild = child.clone(True)
 			if compactedchild is not Null:
 				list.append(node, compactedchild)
 		return self._decoratenode(node)
@@ -1968,7 +2260,7 @@ class Frag(Node, list):
 			if len(node):
 				node.append(newseparator)
 				if clone:
-					newseparator = newseparator.clone()
+					newseparator = newseparator.clone(True)
 			node.append(child)
 		return node
 
@@ -2015,10 +2307,18 @@ class Frag(Node, list):
 		return node
 
 	def normalized(self):
+		node = self._normalizedorself()
+		return self.clone(True) if node is self else node
+
+	def _normalizedorself(self):
+		children = [child._normalizedorself() for child in self]
+		if all(map(operator.is_, children, self)) and not any(isinstance(child1, Text) and isinstance(child2, Text) for (child1, child2) in zip(children, children[1:])):
+			return self
 		node = self._create()
 		lasttypeOK = False
-		for child in self:
-			normalizedchild = child.normalized()
+		for (child, normalizedchild) in zip(self, children):
+			if normalizedchild is child:
+				normalizedchild = child.clone(True)
 			thistypeOK = isinstance(normalizedchild, Text)
 			if thistypeOK and lasttypeOK:
 				node[-1] += normalizedchild
@@ -2050,10 +2350,20 @@ class Frag(Node, list):
 		cursor.node = cursor.path[-1]
 
 
+def _convchild(node, convargs):
+	# Helper for :meth:`Frag.conv`: Convert :obj:`node` in a worker process
+	target = convargs["target"]
+	if isinstance(target, str):
+		import importlib
+		convargs["target"] = importlib.import_module(target)
+	return node.conv(**convargs)
+
+
 class Comment(CharacterData):
 	"""
 	An XML comment.
 	"""
+	__slots__ = ()
 
 	def __str__(self):
 		return ""
@@ -2091,6 +2401,7 @@ class DocType(CharacterData, metaclass=_DocType_Meta):
 	"""
 	An XML document type declaration.
 	"""
+	__slots__ = ()
 
 	def convert(self, converter):
 		return self
@@ -2205,6 +2516,7 @@ class Null(CharacterData):
 	"""
 	node that does not contain anything.
 	"""
+	__slots__ = ()
 
 	def __repr__(self):
 		return "ll.xist.xsc.Null"
@@ -2619,13 +2931,23 @@ class URLAttr(Attr):
 class _Attrs_Meta(type(Node)):
 	def __new__(cls, name, bases, dict):
 		self = super(_Attrs_Meta, cls).__new__(cls, name, bases, dict)
-		self._byxmlname = weakref.WeakValueDictionary() # map XML name to attribute class
-		self._bypyname = weakref.WeakValueDictionary() # map Python name to attribute class
-		self._defaultattrs = weakref.WeakValueDictionary() # map XML name to attribute class with default value
+		# (Normal dictionaries are much faster to fill than weak ones, but they keep
+		# the attribute classes alive as long as the :class:`Attrs` class exists)
+		self._byxmlname = {} # map XML name to attribute class
+		self._bypyname = {} # map Python name to attribute class
+		self._defaultattrs = {} # map XML name to attribute class with default value
+		self._keys = {} # shared ``(xmlns, name)`` tuples used as keys for the attribute dictionaries
+		self._requiredattrs = None # set of required attribute classes (calculated on first use)
 
 		# go through the attributes and register them in the cache
-		for key in dir(self):
-			value = getattr(self, key)
+		# (collecting them from the class dictionaries in reversed MRO order
+		# gives the same result as ``getattr()`` for every name in ``dir()``,
+		# but is much faster)
+		attrs = {}
+		for base in reversed(self.__mro__):
+			attrs.update(base.__dict__)
+		for key in sorted(attrs):
+			value = attrs[key]
 			if isinstance(value, _Attr_Meta):
 				self.add(value)
 		return self
@@ -2735,16 +3057,17 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 		cls._bypyname[(value.xmlns, value.__name__)] = value
 		if value.default:
 			cls._defaultattrs[(value.xmlns, value.xmlname)] = value
+		cls._requiredattrs = None
 
 	def _create(self):
 		node = self.__class__() # "virtual" constructor
 		node.clear()
 		return node
 
-	def clone(self):
+	def clone(self, shared=False):
 		node = self._create()
 		for (key, value) in dict.items(self):
-			dict.__setitem__(node, key, value.clone())
+			dict.__setitem__(node, key, value.clone(shared))
 		return self._decoratenode(node)
 
 	def __copy__(self):
@@ -2787,7 +3110,8 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 			return dict.__getitem__(self, (attrxmlns, attrname))
 		except KeyError: # if the attribute is not there generate a new empty one
 			attrvalue = self._makeattr(attrxmlns, attrname, attrclass)
-			dict.__setitem__(self, (attrxmlns, attrname), attrvalue)
+			key = (attrxmlns, attrname)
+			dict.__setitem__(self, type(self)._keys.setdefault(key, key), attrvalue)
 			return attrvalue
 
 	def __setitem__(self, name, value):
@@ -2805,7 +3129,8 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 			node[name[-1]] = value
 		(attrxmlns, attrname, attrclass) = self._attrinfo(name)
 		attrvalue = self._makeattr(attrxmlns, attrname, attrclass, value)
-		dict.__setitem__(self, (attrxmlns, attrname), attrvalue)
+		key = (attrxmlns, attrname)
+		dict.__setitem__(self, type(self)._keys.setdefault(key, key), attrvalue)
 
 	def __delitem__(self, name):
 		"""
@@ -2833,19 +3158,31 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 		return node
 
 	def compacted(self):
+		node = self._compactedorself()
+		return self.clone() if node is self else node
+
+	def _compactedorself(self):
+		values = [(value, value._compactedorself()) for value in self.values()]
+		if all(newvalue is value for (value, newvalue) in values):
+			return self
 		node = self._create()
-		for value in self.values():
-			newvalue = value.compacted()
+		for (value, newvalue) in values:
 			assert isinstance(newvalue, Node), f"the compacted method returned the illegal object {newvalue!r} (type {type(newvalue)!r}) when compacting the attribute {value.__class__.__qualname__} with the value {value!r}"
-			node[value] = newvalue
+			node[value] = value.clone() if newvalue is value else newvalue
 		return node
 
 	def normalized(self):
+		node = self._normalizedorself()
+		return self.clone() if node is self else node
+
+	def _normalizedorself(self):
+		values = [(value, value._normalizedorself()) for value in self.values()]
+		if all(newvalue is value for (value, newvalue) in values):
+			return self
 		node = self._create()
-		for value in self.values():
-			newvalue = value.normalized()
+		for (value, newvalue) in values:
 			assert isinstance(newvalue, Node), f"the normalized method returned the illegal object {newvalue!r} (type {type(newvalue)!r}) when normalizing the attribute {value.__class__.__qualname__} with the value {value!r}"
-			node[value] = newvalue
+			node[value] = value.clone() if newvalue is value else newvalue
 		return node
 
 	def present(self, presenter):
@@ -2854,18 +3191,21 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 	def validate(self, recursive=True, path=None):
 		if path is None:
 			path = []
-		# collect required attributes
-		attrs = {value for value in self.declaredattrs() if value.required}
+		cls = type(self)
+		# collect required attributes (this is done only once per class)
+		required = cls._requiredattrs
+		if required is None:
+			required = cls._requiredattrs = frozenset(value for value in cls.declaredattrs() if value.required)
+		attrs = set(required)
+		validateattr = self.validateattr
 		path.append(None)
 		# Check each existing attribute and remove it from the list of required ones
-		for value in self.values():
-			path[-1] = value
-			yield from self.validateattr(path)
-			yield from value.validate(recursive, path)
-			try:
-				attrs.remove(value.__class__)
-			except KeyError:
-				pass
+		for value in dict.values(self):
+			if value:
+				path[-1] = value
+				yield from validateattr(path)
+				yield from value.validate(recursive, path)
+				attrs.discard(value.__class__)
 		path.pop()
 		# are there any required attributes remaining that haven't been specified? => issue warnings about it
 		for attr in attrs:
@@ -2873,7 +3213,7 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 
 	def validateattr(self, path):
 		node = path[-1]
-		if node.xmlns is None and not self.isdeclared(node):
+		if node.xmlns is None and not type(self).isdeclared(node):
 			yield UndeclaredAttrWarning(self.__class__, node)
 
 	def publish(self, publisher):
@@ -2882,6 +3222,8 @@ class Attrs(Node, dict, metaclass=_Attrs_Meta):
 
 	@classmethod
 	def isdeclared(cls, name):
+		if isinstance(name, (_Attr_Meta, Attr)): # fast path
+			return (name.xmlns, name.xmlname) in cls._byxmlname
 		(attrxmlns, attrname, attrclass) = cls._attrinfo(name)
 		return (attrxmlns, attrname) in cls._byxmlname
 
@@ -3113,6 +3455,10 @@ class Element(Node, metaclass=_Element_Meta):
 
 	Attrs = Attrs
 
+	# Content and attributes shared with other elements (see :meth:`clone`)
+	_sharedcontent = None
+	_sharedattrs = None
+
 	def __init__(self, *content, **attrs):
 		"""
 		Create a new :class:`Element` instance.
@@ -3177,14 +3523,12 @@ class Element(Node, metaclass=_Element_Meta):
 				p.text("...")
 			else:
 				self.attrs._repr_pretty_content_(p)
-				for child in self.content:
-					p.breakable()
-					p.pretty(child)
+				_repr_pretty_children(p, self.content)
 			p.breakable()
 			p.text(f"at {id(self):#x}")
 
 	def __str__(self):
-		return str(self.content)
+		return str(self._readcontent())
 
 	def _str(self):
 		return f"element {{{self.xmlns}}}{self.xmlname}"
@@ -3240,7 +3584,7 @@ class Element(Node, metaclass=_Element_Meta):
 
 	def __eq__(self, other):
 		if isinstance(other, Element):
-			return self.xmlname == other.xmlname and self.xmlns == other.xmlns and self.content == other.content and self.attrs == other.attrs
+			return self.xmlname == other.xmlname and self.xmlns == other.xmlns and self._readcontent() == other._readcontent() and self._readattrs() == other._readattrs()
 		return NotImplemented
 
 	def validate(self, recursive=True, path=None):
@@ -3285,12 +3629,94 @@ class Element(Node, metaclass=_Element_Meta):
 		node.attrs = self.attrs.convert(converter)
 		return self._decoratenode(node)
 
-	def clone(self):
+	def _fingerprint(self, converter):
+		attrfingerprints = []
+		for (key, value) in dict.items(self._readattrs()):
+			fingerprint = converter._fingerprint(value)
+			if fingerprint is None:
+				return None
+			attrfingerprints.append((key, fingerprint))
+		contentfingerprint = converter._fingerprint(self._readcontent())
+		if contentfingerprint is None:
+			return None
+		# The attribute order is part of the fingerprint, as it shows up in the output
+		return (self.__class__, self.xmlns, self.xmlname, tuple(attrfingerprints), contentfingerprint)
+
+	def clone(self, shared=False):
 		node = self._create()
-		node.content = self.content.clone() # this is faster than passing it in the constructor (no :func:`tonode` call)
-		node.attrs = self.attrs.clone()
+		if shared:
+			# Both :obj:`self` and :obj:`node` copy the content and attributes on
+			# their next access
+			node._setsharedcontent(self._sharecontent())
+			node._setsharedattrs(self._shareattrs())
+		else:
+			node.content = self.content.clone() # this is faster than passing it in the constructor (no :func:`tonode` call)
+			node.attrs = self.attrs.clone()
 		return self._decoratenode(node)
 
+	def _sharecontent(self):
+		# Put the content of :obj:`self` into the shared state (i.e. it will be
+		# copied on the next access via ``content``) and return it
+		content = self.__dict__.pop("content", None)
+		if content is None:
+			return self._sharedcontent
+		self._sharedcontent = content
+		return content
+
+	def _shareattrs(self):
+		# Put the attributes of :obj:`self` into the shared state (i.e. they will
+		# be copied on the next access via ``attrs``) and return them
+		attrs = self.__dict__.pop("attrs", None)
+		if attrs is None:
+			return self._sharedattrs
+		self._sharedattrs = attrs
+		return attrs
+
+	def _setsharedcontent(self, content):
+		# Use the shared :obj:`content` as the content of :obj:`self`
+		self.__dict__.pop("content", None)
+		self._sharedcontent = content
+
+	def _setsharedattrs(self, attrs):
+		# Use the shared :obj:`attrs` as the attributes of :obj:`self`
+		self.__dict__.pop("attrs", None)
+		self._sharedattrs = attrs
+
+	def __getattr__(self, name):
+		# Copy the content or attributes shared with other elements on first
+		# access (see :meth:`clone`)
+		if name == "content":
+			content = self._sharedcontent
+			if content is not None:
+				del self._sharedcontent
+				self.content = content = content.clone(True)
+				return content
+		elif name == "attrs":
+			attrs = self._sharedattrs
+			if attrs is not None:
+				del self._sharedattrs
+				self.attrs = attrs = attrs.clone()
+				return attrs
+		raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
+	def _readcontent(self):
+		# Return the content for reading without copying shared content
+		content = self.__dict__.get("content")
+		if content is None:
+			content = self._sharedcontent
+			if content is None:
+				content = self.content
+		return content
+
+	def _readattrs(self):
+		# Return the attributes for reading without copying shared attributes
+		attrs = self.__dict__.get("attrs")
+		if attrs is None:
+			attrs = self._sharedattrs
+			if attrs is None:
+				attrs = self.attrs
+		return attrs
+
 	def __copy__(self):
 		node = self._create()
 		node.content = copy.copy(self.content)
@@ -3358,10 +3784,11 @@ class Element(Node, metaclass=_Element_Meta):
 					yield publisher.encode('"')
 			# reset the note, so the next element won't create the attributes again
 			publisher._publishxmlns = False
-		yield from self.attrs.publish(publisher)
-		if len(self):
+		yield from self._readattrs().publish(publisher)
+		content = self._readcontent()
+		if len(content):
 			yield publisher.encode(">")
-			yield from self.content.publish(publisher)
+			yield from content.publish(publisher)
 			yield publisher.encode("</")
 			yield publisher.encode(name)
 			yield publisher.encode(">")
@@ -3382,7 +3809,7 @@ class Element(Node, metaclass=_Element_Meta):
 		if publisher.inattr:
 			# publish the content only when we are inside an attribute. This works much like using the plain string value,
 			# but even works with processing instructions, or what the abbreviation entities return
-			return self.content.publish(publisher) # return a generator-iterator
+			return self._readcontent().publish(publisher) # return a generator-iterator
 		else:
 			return self._publishfull(publisher) # return a generator-iterator
 
@@ -3414,7 +3841,7 @@ class Element(Node, metaclass=_Element_Meta):
 			from ll.xist import xfind
 
 			def iterate(selector):
-				path = [self, None]
+				path = Path([self, None])
 				for child in self:
 					path[-1] = child
 					if path in selector:
@@ -3435,7 +3862,7 @@ class Element(Node, metaclass=_Element_Meta):
 			selector = xfind.selector(index)
 			value = Frag(value)
 			newcontent = []
-			path = [self, None]
+			path = Path([self, None])
 			for child in self:
 				path[-1] = child
 				if path in selector:
@@ -3466,15 +3893,32 @@ class Element(Node, metaclass=_Element_Meta):
 		"""
 		Return the number of children.
 		"""
-		return len(self.content)
+		return len(self._readcontent())
 
 	def __iter__(self):
 		return iter(self.content)
 
 	def compacted(self):
+		node = self._compactedorself()
+		return self.clone(True) if node is self else node
+
+	def _compactedorself(self):
+		if self.__class__.compacted is not Element.compacted:
+			return self.compacted()
+		(content, attrs) = (self._readcontent(), self._readattrs())
+		(newcontent, newattrs) = (content._compactedorself(), attrs._compactedorself())
+		if newcontent is content and newattrs is attrs:
+			return self
 		node = self._create()
-		node.content = self.content.compacted()
-		node.attrs = self.attrs.compacted()
+		# Unchanged parts are shared copy-on-write with :obj:`self`
+		if newcontent is content:
+			node._setsharedcontent(self._sharecontent())
+		else:
+			node.content = newcontent
+		if newattrs is attrs:
+			node._setsharedattrs(self._shareattrs())
+		else:
+			node.attrs = newattrs
 		return self._decoratenode(node)
 
 	def withsep(self, separator, clone=False):
@@ -3483,7 +3927,7 @@ class Element(Node, metaclass=_Element_Meta):
 		nodes of :obj:`self`. For more info see :meth:`Frag.withsep`.
 		"""
 		node = self._create()
-		node.attrs = self.attrs.clone()
+		node._setsharedattrs(self._shareattrs())
 		node.content = self.content.withsep(separator, clone)
 		return node
 
@@ -3492,7 +3936,7 @@ class Element(Node, metaclass=_Element_Meta):
 		Return a reversed version of :obj:`self`.
 		"""
 		node = self._create()
-		node.attrs = self.attrs.clone()
+		node._setsharedattrs(self._shareattrs())
 		node.content = self.content.reversed()
 		return node
 
@@ -3501,7 +3945,7 @@ class Element(Node, metaclass=_Element_Meta):
 		Return a filtered version of the :obj:`self`.
 		"""
 		node = self._create()
-		node.attrs = self.attrs.clone()
+		node._setsharedattrs(self._shareattrs())
 		node.content = self.content.filtered(function)
 		return node
 
@@ -3510,7 +3954,7 @@ class Element(Node, metaclass=_Element_Meta):
 		Return a shuffled version of the :obj:`self`.
 		"""
 		node = self._create()
-		node.attrs = self.attrs.clone()
+		node._setsharedattrs(self._shareattrs())
 		node.content = self.content.shuffled()
 		return node
 
@@ -3521,14 +3965,31 @@ class Element(Node, metaclass=_Element_Meta):
 		assert isinstance(node, Node), f"the mapped method returned the illegal object {node!r} (type {type(node)!r}) when mapping {self!r}"
 		if node is self:
 			node = self._create()
-			node.content = Frag(self.content.mapped(function, converter))
-			node.attrs = self.attrs.clone()
+			node.content = Frag(self._readcontent().mapped(function, converter))
+			node._setsharedattrs(self._shareattrs())
 		return node
 
 	def normalized(self):
+		node = self._normalizedorself()
+		return self.clone(True) if node is self else node
+
+	def _normalizedorself(self):
+		if self.__class__.normalized is not Element.normalized:
+			return self.normalized()
+		(content, attrs) = (self._readcontent(), self._readattrs())
+		(newcontent, newattrs) = (content._normalizedorself(), attrs._normalizedorself())
+		if newcontent is content and newattrs is attrs:
+			return self
 		node = self._create()
-		node.attrs = self.attrs.normalized()
-		node.content = self.content.normalized()
+		# Unchanged parts are shared copy-on-write with :obj:`self`
+		if newcontent is content:
+			node._setsharedcontent(self._sharecontent())
+		else:
+			node.content = newcontent
+		if newattrs is attrs:
+			node._setsharedattrs(self._shareattrs())
+		else:
+			node.attrs = newattrs
 		return node
 
 	def pretty(self, level=0, indent="\t"):
@@ -3669,6 +4130,9 @@ class Entity(Node, metaclass=_Entity_Meta):
 		if self.__class__ is Entity:
 			yield UndeclaredNodeWarning(self)
 
+	def _fingerprint(self, converter):
+		return (self.__class__, self.xmlns, self.xmlname)
+
 	def convert(self, converter):
 		return self
 
@@ -3805,8 +4269,22 @@ class Pool(misc.Pool):
 	A :class:`Pool` stores a collection of XIST classes and can be passed to a
 	parser. The parser will ask the pool which classes to use when elements,
 	processing instructions etc. have to be instantiated.
+
+	The results of :meth:`elementclass`, :meth:`procinstclass`,
+	:meth:`entityclass` and :meth:`attrkey` (including the results found in
+	base pools) are cached. The cache is invalidated as soon as a class is
+	registered in or removed from the pool or one of its base pools. The
+	attributes :attr:`cachehits`
+	and :attr:`cachemisses` count how often a result could be taken from the
+	cache or had to be looked up in the pool and its base pools.
 	"""
 
+	# Every change to a pool gives it (and all pools that use it as a direct or
+	# indirect base pool and have filled their cache) a new version from this
+	# counter (:func:`next` is thread safe, ``+=`` wouldn't be). A pool whose
+	# cache has been filled with a different version clears its cache first.
+	_versions = itertools.count(1)
+
 	def __init__(self, *objects):
 		"""
 		Create a :class:`Pool` object. All items in :obj:`objects` will be
@@ -3818,8 +4296,50 @@ class Pool(misc.Pool):
 		self._charrefsbyname = {}
 		self._charrefsbycodepoint = {}
 		self._attrsbyname = {}
+		self._elementcache = {}
+		self._procinstcache = {}
+		self._entitycache = {}
+		self._attrkeycache = {}
+		self._version = next(Pool._versions)
+		self._cacheversion = None
+		self._derived = weakref.WeakSet() # Pools whose cache depends on this pool
+		self.cachehits = 0
+		self.cachemisses = 0
 		misc.Pool.__init__(self, *objects)
 
+	def _allpools(self):
+		# Return a list of :obj:`self` and all its (direct and indirect) base pools
+		pools = []
+		seen = set()
+		def add(pool):
+			if id(pool) not in seen:
+				seen.add(id(pool))
+				pools.append(pool)
+				for base in pool.bases:
+					add(base)
+		add(self)
+		return pools
+
+	def _changed(self):
+		# Give :obj:`self` and all pools whose cache depends on it a new version
+		self._version = next(Pool._versions)
+		for pool in list(self._derived):
+			pool._version = next(Pool._versions)
+
+	def _checkcache(self):
+		# Clear the cache if the pool or one of its base pools has been changed
+		# since the cache was filled
+		version = self._version
+		if self._cacheversion != version:
+			for pool in self._allpools():
+				if pool is not self:
+					pool._derived.add(self)
+			self._elementcache.clear()
+			self._procinstcache.clear()
+			self._entitycache.clear()
+			self._attrkeycache.clear()
+			self._cacheversion = version
+
 	def register(self, object):
 		"""
 		Register :obj:`object` in the pool. :obj:`object` can be:
@@ -3871,6 +4391,9 @@ class Pool(misc.Pool):
 						pass
 		elif isinstance(object, Pool):
 			self.bases.append(object)
+		# Bump the version only after the registry has been changed, so that a
+		# lookup filling the cache in between can't store the old state under the new version
+		self._changed()
 
 	def __enter__(self):
 		self.prev = threadlocalpool.pool
@@ -3890,6 +4413,7 @@ class Pool(misc.Pool):
 		self._entitiesbyname.clear()
 		self._attrsbyname.clear()
 		misc.Pool.clear(self)
+		self._changed()
 
 	def clone(self):
 		"""
@@ -3923,14 +4447,24 @@ class Pool(misc.Pool):
 		:class:`Element` will be returned.
 		"""
 		xmlns = nsname(xmlns)
+		self._checkcache()
+		key = (xmlns, name)
 		try:
-			return self._elementsbyname[(xmlns, name)]
+			result = self._elementcache[key]
 		except KeyError:
-			for base in self.bases:
-				result = base.elementclass(xmlns, name)
-				if result is not Element:
-					return result
-		return Element
+			self.cachemisses += 1
+			try:
+				result = self._elementsbyname[key]
+			except KeyError:
+				result = Element
+				for base in self.bases:
+					result = base.elementclass(xmlns, name)
+					if result is not Element:
+						break
+			self._elementcache[key] = result
+		else:
+			self.cachehits += 1
+		return result
 
 	def element(self, xmlns, name):
 		"""
@@ -3971,14 +4505,23 @@ class Pool(misc.Pool):
 		:obj:`name`. If the processing instruction can't be found an
 		return :class:`ProcInst`.
 		"""
+		self._checkcache()
 		try:
-			return self._procinstsbyname[name]
+			result = self._procinstcache[name]
 		except KeyError:
-			for base in self.bases:
-				result = base.procinstclass(name)
-				if result is not ProcInst:
-					return result
-		return ProcInst
+			self.cachemisses += 1
+			try:
+				result = self._procinstsbyname[name]
+			except KeyError:
+				result = ProcInst
+				for base in self.bases:
+					result = base.procinstclass(name)
+					if result is not ProcInst:
+						break
+			self._procinstcache[name] = result
+		else:
+			self.cachehits += 1
+		return result
 
 	def procinst(self, name, content):
 		"""
@@ -4016,14 +4559,23 @@ class Pool(misc.Pool):
 		Return the entity class for the entity with the XML name :obj:`name`.
 		If the entity can't be found return :class:`Entity`.
 		"""
+		self._checkcache()
 		try:
-			return self._entitiesbyname[name]
+			result = self._entitycache[name]
 		except KeyError:
-			for base in self.bases:
-				result = base.entityclass(name)
-				if result is not Entity:
-					return result
-		return Entity
+			self.cachemisses += 1
+			try:
+				result = self._entitiesbyname[name]
+			except KeyError:
+				result = Entity
+				for base in self.bases:
+					result = base.entityclass(name)
+					if result is not Entity:
+						break
+			self._entitycache[name] = result
+		else:
+			self.cachehits += 1
+		return result
 
 	def entity(self, name):
 		"""
@@ -4053,14 +4605,25 @@ class Pool(misc.Pool):
 		if xmlns is None:
 			return name
 		xmlns = nsname(xmlns)
+		self._checkcache()
+		key = (xmlns, name)
 		try:
-			return self._attrsbyname[(xmlns, name)]
+			result = self._attrkeycache[key]
 		except KeyError:
-			for base in self.bases:
-				result = base.attrkey(name, xmlns)
-				if isinstance(result, _Attr_Meta):
-					return result
-		return (xmlns, name)
+			self.cachemisses += 1
+			try:
+				result = self._attrsbyname[key]
+			except KeyError:
+				result = key
+				for base in self.bases:
+					baseresult = base.attrkey(xmlns, name)
+					if isinstance(baseresult, _Attr_Meta):
+						result = baseresult
+						break
+			self._attrkeycache[key] = result
+		else:
+			self.cachehits += 1
+		return result
 
 	def text(self, content):
 		"""
@@ -4193,6 +4756,197 @@ def procinst(xmlname, *content):
 	return procinst
 
 
+###
+### Compact binary serialization of XIST trees
+###
+
+# Opcodes used in the serialized format (text nodes are stored as plain strings)
+_OP_ELEMENT = 0
+_OP_PLAINELEMENT = 1
+_OP_FRAG = 2
+_OP_COMMENT = 3
+_OP_PROCINST = 4
+_OP_PLAINPROCINST = 5
+_OP_DOCTYPE = 6
+_OP_ENTITY = 7
+_OP_PLAINENTITY = 8
+_OP_CHARACTERDATA = 9
+_OP_NULL = 10
+
+_treeformat = "xist-tree-1"
+
+
+class _TreeDumper:
+	# Converts a node into nested tuples of built-in objects that can be
+	# serialized by :mod:`marshal`. Classes are stored in a class table and
+	# referenced by their index.
+
+	def __init__(self):
+		self.classes = {}
+
+	def classindex(self, cls):
+		try:
+			return self.classes[cls]
+		except KeyError:
+			index = self.classes[cls] = len(self.classes)
+			return index
+
+	def content(self, node):
+		return tuple(self.node(child) for child in node)
+
+	def attrs(self, attrs):
+		result = []
+		for (key, value) in dict.items(attrs):
+			if value:
+				result.append(key)
+				result.append(self.classindex(value.__class__))
+				result.append(self.content(value))
+		return tuple(result)
+
+	def node(self, node):
+		cls = node.__class__
+		if cls is Text:
+			return node._content
+		elif isinstance(node, Element):
+			if cls is Element:
+				return (_OP_PLAINELEMENT, node.xmlns, node.xmlname, self.attrs(node.attrs), self.content(node.content))
+			return (_OP_ELEMENT, self.classindex(cls), self.classindex(node.attrs.__class__), self.attrs(node.attrs), self.content(node.content))
+		elif isinstance(node, Frag):
+			return (_OP_FRAG, self.classindex(cls), self.content(node))
+		elif isinstance(node, Entity):
+			if cls is Entity:
+				return (_OP_PLAINENTITY, node.xmlname)
+			return (_OP_ENTITY, self.classindex(cls))
+		elif isinstance(node, Comment):
+			return (_OP_COMMENT, node._content)
+		elif isinstance(node, ProcInst):
+			if cls is ProcInst:
+				return (_OP_PLAINPROCINST, node.xmlname, node._content)
+			return (_OP_PROCINST, self.classindex(cls), node._content)
+		elif isinstance(node, DocType):
+			return (_OP_DOCTYPE, self.classindex(cls), node._content)
+		elif node is Null:
+			return (_OP_NULL,)
+		elif isinstance(node, CharacterData):
+			return (_OP_CHARACTERDATA, self.classindex(cls), node._content)
+		else:
+			raise IllegalObjectError(node)
+
+
+class _TreeLoader:
+	# Recreates the nodes from the nested tuples created by :class:`_TreeDumper`
+
+	def __init__(self, classes):
+		self.classes = [self.loadclass(modulename, qualname) for (modulename, qualname) in classes]
+
+	@staticmethod
+	def loadclass(modulename, qualname):
+		try:
+			obj = sys.modules[modulename]
+		except KeyError:
+			import importlib
+			obj = importlib.import_module(modulename)
+		for name in qualname.split("."):
+			obj = getattr(obj, name)
+		return obj
+
+	def content(self, frag, data):
+		node = self.node
+		list.extend(frag, [node(child) for child in data])
+		return frag
+
+	def attrs(self, attrscls, data):
+		attrs = attrscls.__new__(attrscls)
+		keys = attrscls._keys
+		classes = self.classes
+		for i in range(0, len(data), 3):
+			key = data[i]
+			key = keys.setdefault(key, key)
+			cls = classes[data[i+1]]
+			attr = self.content(cls(), data[i+2])
+			if cls is Attr:
+				(attr.xmlns, attr.xmlname) = key
+			dict.__setitem__(attrs, key, attr)
+		return attrs
+
+	@staticmethod
+	def characterdata(cls, content):
+		# Bypass the constructor, as it might modify the content
+		node = cls.__new__(cls)
+		node.__setstate__(content)
+		return node
+
+	def node(self, data):
+		if data.__class__ is str:
+			node = Text.__new__(Text)
+			node._content = data
+			node._startloc = node._endloc = None
+			return node
+		opcode = data[0]
+		if opcode == _OP_ELEMENT:
+			cls = self.classes[data[1]]
+			node = cls.__new__(cls)
+			node.attrs = self.attrs(self.classes[data[2]], data[3])
+			node.content = self.content(Frag(), data[4])
+		elif opcode == _OP_PLAINELEMENT:
+			node = Element.__new__(Element)
+			node.xmlns = data[1]
+			node.xmlname = data[2]
+			node.attrs = self.attrs(Element.Attrs, data[3])
+			node.content = self.content(Frag(), data[4])
+		elif opcode == _OP_FRAG:
+			node = self.content(self.classes[data[1]](), data[2])
+		elif opcode == _OP_ENTITY:
+			node = self.classes[data[1]]()
+		elif opcode == _OP_PLAINENTITY:
+			node = entity(data[1])
+		elif opcode == _OP_COMMENT:
+			node = self.characterdata(Comment, data[1])
+		elif opcode == _OP_PROCINST or opcode == _OP_DOCTYPE or opcode == _OP_CHARACTERDATA:
+			node = self.characterdata(self.classes[data[1]], data[2])
+		elif opcode == _OP_PLAINPROCINST:
+			node = self.characterdata(ProcInst, data[2])
+			node.xmlname = data[1]
+		elif opcode == _OP_NULL:
+			node = Null
+		else:
+			raise ValueError(f"unknown opcode {opcode!r}")
+		return node
+
+
+def dumptree(node):
+	"""
+	Serialize the XIST tree :obj:`node` into a compact :class:`bytes` object,
+	that can be turned back into a tree with :func:`loadtree`.
+
+	Classes are stored only once (by module and name), text nodes are stored as
+	strings and the serialized data is written via :mod:`marshal`, so loading
+	the tree is much faster than unpickling it or reparsing the original XML.
+	However as with :mod:`marshal` the format might change between XIST
+	versions, so this should only be used for caching.
+
+	Location information is not stored and element instances will be created
+	without calling their constructor.
+	"""
+	import marshal
+	dumper = _TreeDumper()
+	data = dumper.node(node)
+	classes = tuple((cls.__module__, cls.__qualname__) for cls in dumper.classes)
+	return marshal.dumps((_treeformat, classes, data))
+
+
+def loadtree(data):
+	"""
+	Recreate the XIST tree from the :class:`bytes` object :obj:`data` that has
+	been created by :func:`dumptree`.
+	"""
+	import marshal
+	(format, classes, data) = marshal.loads(data)
+	if format != _treeformat:
+		raise ValueError(f"unknown serialization format {format!r}")
+	return _TreeLoader(classes).node(data)
+
+
 ###
 ### Location information
 ###
@@ -4203,6 +4957,25 @@ class Location:
 	"""
 	__slots__ = ("url", "line", "col")
 
+	# Layout of the compact form of a location (see :meth:`compact`): The
+	# column uses the lowest 20 bits, the line the next 24 bits and the rest
+	# is the index of the URL in ``_urls``.
+	_colbits = 20
+	_linebits = 24
+	_maxcol = (1 << _colbits) - 1
+	_maxline = (1 << _linebits) - 1
+
+	# Registry of the URLs used by compact locations: This maps the index to
+	# (a copy of) the URL for the :attr:`_maxurls` most recently used URLs.
+	# Indexes are never reused, so compact locations whose URL has been dropped
+	# from the registry will simply have no URL.
+	_urls = collections.OrderedDict()
+	_urlindexes = {} # Maps the URLs in ``_urls`` to their index
+	_maxurls = 1000
+	_nexturlindex = 0
+	_urllock = threading.Lock()
+	_lasturl = None # ``(url, index)`` of the last registered URL
+
 	def __init__(self, url=None, line=None, col=None):
 		"""
 		Create a new :class:`Location` object using the arguments passed in.
@@ -4224,6 +4997,60 @@ class Location:
 			return Location(url=self.url, col=0)
 		return Location(url=self.url, line=self.line+offset, col=0)
 
+	@classmethod
+	def compact(cls, url, line, col):
+		"""
+		Return the location ``Location(url, line, col)`` in compact form.
+
+		The compact form is an :class:`int` that combines :obj:`line`,
+		:obj:`col` and an index into a process-wide registry of URLs (so each
+		URL is stored only once). As :class:`int` objects are much smaller than
+		:class:`Location` objects and aren't tracked by the garbage collector,
+		parsers use this to record the location of nodes cheaply. Assigning the
+		result to :obj:`Node.startloc` or :obj:`Node.endloc` is supported,
+		reading those attributes recreates the :class:`Location` object.
+
+		If :obj:`line` or :obj:`col` are :const:`None` or too large to fit into
+		the compact form, a :class:`Location` object is returned instead.
+
+		The registry stores a copy of the URL, so modifying :obj:`url` later
+		doesn't change existing locations. It only keeps the 1000 most recently
+		used URLs, so memory usage doesn't grow with the number of parsed
+		documents. The compact locations for URLs that have been dropped from the
+		registry are recreated without a URL.
+		"""
+		if line is None or col is None or not (0 <= line <= cls._maxline and 0 <= col <= cls._maxcol):
+			return cls(url, line, col)
+		# The last URL is stored as the registered copy and compared by value,
+		# so a URL object that has been modified since isn't mistaken for it
+		last = cls._lasturl
+		if last is not None and last[0] == url:
+			index = last[1]
+		else:
+			with cls._urllock:
+				index = cls._urlindexes.get(url)
+				if index is None:
+					index = cls._nexturlindex
+					cls._nexturlindex += 1
+					key = url.clone() if isinstance(url, url_.URL) else url
+					cls._urls[index] = key
+					cls._urlindexes[key] = index
+					while len(cls._urls) > cls._maxurls:
+						(oldindex, oldurl) = cls._urls.popitem(last=False)
+						del cls._urlindexes[oldurl]
+				else:
+					cls._urls.move_to_end(index)
+				cls._lasturl = (cls._urls[index], index)
+		return (((index << cls._linebits) | line) << cls._colbits) | col
+
+	@classmethod
+	def fromcompact(cls, value):
+		"""
+		Recreate the :class:`Location` object from the compact form
+		:obj:`value` (as returned by :meth:`compact`).
+		"""
+		return cls(cls._urls.get(value >> (cls._linebits + cls._colbits)), (value >> cls._colbits) & cls._maxline, value & cls._maxcol)
+
 	def __str__(self):
 		url = str(self.url) if self.url is not None else "???"
 		line = str(self.line) if self.line is not None else "?"
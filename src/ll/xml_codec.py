@@ -104,11 +104,14 @@ class IncrementalDecoder(codecs.IncrementalDecoder):
 		# (in which case the buffer of the underlying codec might kick in),
 		# we're implementing buffering ourselves to avoid some overhead.
 		if self.decoder is None:
-			input = self.buffer + input
+			if self.buffer:
+				input = self.buffer + input
 			if self.encoding is None:
 				self.encoding = _detectencoding(input, final)
 				if self.encoding is None:
-					self.buffer = input # retry the complete input on the next call
+					# retry the complete input on the next call (:obj:`input` might
+					# be a :class:`memoryview`, so make sure we have a :class:`bytes` object)
+					self.buffer = bytes(input)
 					return "" # no encoding determined yet, so no output
 			if self.encoding == "xml":
 				raise ValueError("xml not allowed as encoding name")
@@ -0,0 +1,88 @@
+#! /usr/bin/env/python
+# -*- coding: utf-8 -*-
+# cython: language_level=3, always_allow_keywords=True
+
+## Copyright 2019 by LivingLogic AG, Bayreuth/Germany
+## Copyright 2019 by Walter Dörwald
+##
+## All Rights Reserved
+##
+## See ll/xist/__init__.py for the license
+
+
+import os
+
+import pytest
+
+from ll import url
+from ll.scripts import ucp
+
+
+def maketree(tmpdir):
+	source = tmpdir.mkdir("source")
+	for i in range(20):
+		source.join(f"dir{i%3}", f"file{i}.txt").write(f"content {i}\n" * i, ensure=True)
+	return source
+
+
+def readtree(dir):
+	return {str(path.relto(dir)): path.read() for path in dir.visit() if path.isfile()}
+
+
+def test_copy_jobs(tmpdir):
+	source = maketree(tmpdir)
+	target = tmpdir.join("target")
+	ucp.main([f"{source}/", f"{target}/", "-r", "-j4"])
+	assert readtree(target) == readtree(source)
+
+
+def test_copy_update(tmpdir):
+	source = maketree(tmpdir)
+	target = tmpdir.join("target")
+	ucp.main([f"{source}/", f"{target}/", "-r"])
+
+	# Modify a target file (but keep size and make it newer)
+	targetfile = target.join("dir1", "file1.txt")
+	targetfile.write("CONTENT 1\n")
+	os.utime(targetfile, (2e9, 2e9))
+	ucp.main([f"{source}/", f"{target}/", "-r", "--update"])
+	assert targetfile.read() == "CONTENT 1\n"
+
+	# ``--checksum`` detects the change
+	ucp.main([f"{source}/", f"{target}/", "-r", "--checksum", "-j2"])
+	assert readtree(target) == readtree(source)
+
+	# Files with a different size will be copied with ``--update``
+	targetfile.write("gurk")
+	ucp.main([f"{source}/", f"{target}/", "-r", "--update"])
+	assert readtree(target) == readtree(source)
+
+
+def test_copy_update_missing(tmpdir):
+	source = maketree(tmpdir)
+	target = tmpdir.join("target")
+	ucp.main([f"{source}/", f"{target}/", "-r", "--update"])
+	assert readtree(target) == readtree(source)
+
+
+def test_copy_update_error(tmpdir, monkeypatch):
+	# Errors other than a missing target must not be hidden
+	source = maketree(tmpdir)
+	target = tmpdir.join("target")
+	ucp.main([f"{source}/", f"{target}/", "-r"])
+	def size(self, **kwargs):
+		raise PermissionError(self)
+	monkeypatch.setattr(url.URL, "size", size)
+	with pytest.raises(PermissionError):
+		ucp.main([f"{source}/", f"{target}/", "-r", "--update"])
+
+
+def test_copy_ssh_samehost(tmpdir, monkeypatch):
+	# Copy between two directories on the same ssh server (with one
+	# connection per worker for both source and target)
+	pytest.importorskip("execnet")
+	monkeypatch.setattr(url.SshConnection, "_gatewayspec", lambda self: "popen")
+	source = maketree(tmpdir)
+	target = tmpdir.join("target")
+	ucp.main([f"ssh://localhost{source}/", f"ssh://localhost{target}/", "-r", "-j2"])
+	assert readtree(target) == readtree(source)
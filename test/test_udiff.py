@@ -0,0 +1,89 @@
+#! /usr/bin/env/python
+# -*- coding: utf-8 -*-
+# cython: language_level=3, always_allow_keywords=True
+
+## Copyright 2019 by LivingLogic AG, Bayreuth/Germany
+## Copyright 2019 by Walter Dörwald
+##
+## All Rights Reserved
+##
+## See ll/xist/__init__.py for the license
+
+
+import pytest
+
+from ll import url
+from ll.scripts import udiff
+
+
+def maketrees(tmpdir):
+	dir1 = tmpdir.mkdir("dir1")
+	dir2 = tmpdir.mkdir("dir2")
+	for i in range(20):
+		dir1.join(f"sub{i%3}", f"file{i}.txt").write(f"line {i}\n" * i, ensure=True)
+		dir2.join(f"sub{i%3}", f"file{i}.txt").write(f"line {i}\n" * i, ensure=True)
+	dir2.join("sub1", "file4.txt").write("line 4\nchanged\n")
+	dir2.join("sub2", "file5.txt").write("line 5 \n" * 5)
+	dir1.join("only1.txt").write("foo\n")
+	return (dir1, dir2)
+
+
+def test_brief(tmpdir, capsys):
+	(dir1, dir2) = maketrees(tmpdir)
+	udiff.main([f"{dir1}/", f"{dir2}/", "-r", "--brief", "-cno"])
+	out = capsys.readouterr().out
+	assert out == (
+		f"only1.txt: only in {dir1}/\n"
+		f"Files {dir1}/sub1/file4.txt and {dir2}/sub1/file4.txt differ\n"
+		f"Files {dir1}/sub2/file5.txt and {dir2}/sub2/file5.txt differ\n"
+	)
+
+	# Ignoring trailing whitespace makes ``file5.txt`` equal
+	udiff.main([f"{dir1}/", f"{dir2}/", "-r", "--brief", "-btrail", "-cno"])
+	out = capsys.readouterr().out
+	assert "file5.txt" not in out
+	assert "file4.txt" in out
+
+
+def test_jobs(tmpdir, capsys):
+	(dir1, dir2) = maketrees(tmpdir)
+	udiff.main([f"{dir1}/", f"{dir2}/", "-r", "-cno"])
+	expected = capsys.readouterr().out
+	assert "+changed" in expected
+	udiff.main([f"{dir1}/", f"{dir2}/", "-r", "-cno", "-j4"])
+	assert capsys.readouterr().out == expected
+
+
+def test_readonce(tmpdir, capsys, monkeypatch):
+	(dir1, dir2) = maketrees(tmpdir)
+	dir2.join("sub1", "file7.txt").write("line 8\n" * 7)
+	opened = []
+	open = url.LocalConnection.open
+	def countingopen(self, u, *args, **kwargs):
+		opened.append(str(u))
+		return open(self, u, *args, **kwargs)
+	monkeypatch.setattr(url.LocalConnection, "open", countingopen)
+	udiff.main([f"{dir1}/sub1/file7.txt", f"{dir2}/sub1/file7.txt", "-cno"])
+	assert "+line 8" in capsys.readouterr().out
+	assert sorted(opened) == [f"{dir1}/sub1/file7.txt", f"{dir2}/sub1/file7.txt"]
+
+
+def test_mmap(tmpdir, capsys, monkeypatch):
+	(dir1, dir2) = maketrees(tmpdir)
+	def read(self, *args):
+		raise AssertionError("read() called")
+	# Local files are only memory mapped, never read into memory
+	monkeypatch.setattr(url.FileResource, "read", read, raising=False)
+	udiff.main([f"{dir1}/sub1/file4.txt", f"{dir2}/sub1/file4.txt", "-cno"])
+	assert "+changed" in capsys.readouterr().out
+	udiff.main([f"{dir1}/sub1/file7.txt", f"{dir2}/sub1/file7.txt", "-cno", "-v"])
+	assert "+line" not in capsys.readouterr().out
+
+
+def test_error(tmpdir, monkeypatch):
+	(dir1, dir2) = maketrees(tmpdir)
+	def size(self, **kwargs):
+		raise ValueError("broken")
+	monkeypatch.setattr(url.URL, "size", size)
+	with pytest.raises(ValueError):
+		udiff.main([f"{dir1}/", f"{dir2}/", "-r", "-cno", "-j4"])
@@ -10,6 +10,10 @@
 ## See ll/xist/__init__.py for the license
 
 
+import time, asyncio
+
+import pytest
+
 from ll import url
 
 
@@ -378,3 +382,431 @@ def test_schemerelurls():
 	u3 = u2.relative(u1, allowschemerel=True)
 	assert u3.scheme is None
 	assert str(u3) == "../images/logo.png"
+
+
+def test_walk_local(tmpdir):
+	tmpdir.join("b.txt").write("gurk")
+	tmpdir.mkdir("a").join("c.txt").write("hurz")
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+
+	with url.Context():
+		events = []
+		for cursor in root.walk(beforedir=True, afterdir=True, file=True):
+			assert cursor.entry is not None
+			assert cursor.stat().st_mode == (root/cursor.url).stat().st_mode
+			assert cursor.owner() == (root/cursor.url).owner()
+			if cursor.isfile:
+				assert cursor.stat().st_size == 4
+			events.append((cursor.event, str(cursor.url)))
+		assert events == [
+			("beforedir", "a/"),
+			("file", "a/c.txt"),
+			("afterdir", "a/"),
+			("file", "b.txt"),
+		]
+		assert [str(u) for u in root.walkfiles()] == ["a/c.txt", "b.txt"]
+
+
+class PopenConnection(url.SshConnection):
+	# Talks to a local Python process instead of an ssh server
+	def _gatewayspec(self):
+		return "popen"
+
+
+def test_ssh_batch(tmpdir):
+	pytest.importorskip("execnet")
+	tmpdir.join("b.txt").write("gurk\n" * 50000)
+	tmpdir.mkdir("a").join("c.txt").write("hurz")
+	tmpdir.mkdir("z").join("d.py").write("")
+	root = url.URL(f"ssh://localhost{tmpdir}/")
+
+	connection = PopenConnection(None, "localhost")
+	try:
+		stats = connection.stat_many([root/"a/c.txt", root/"b.txt"])
+		assert [stat.st_size for stat in stats] == [4, 250000]
+		with pytest.raises(FileNotFoundError):
+			connection.stat_many([root/"nix.txt"])
+
+		events = []
+		for cursor in connection.walk(root):
+			assert cursor.stat().st_mode == (tmpdir/str(cursor.url)).stat().mode
+			events.append(str(cursor.url))
+		assert events == ["a/", "a/c.txt", "b.txt", "z/", "z/d.py"]
+		assert [str(u) for u in connection.walkfiles(root, skipdir="z")] == ["a/c.txt", "b.txt"]
+		assert [str(u) for u in connection.walkdirs(root)] == ["a/", "z/"]
+		assert [str(u) for u in connection.walkall(root, include="*.txt")] == ["a/c.txt", "b.txt"]
+
+		with connection.open(root/"b.txt", "rb") as f:
+			assert f.readline() == b"gurk\n"
+			assert f.read(3) == b"gur"
+			assert f.tell() == 8
+			assert f.readline(1) == b"k"
+			assert len(list(f)) == 49999
+			f.seek(-5, 2)
+			assert f.read() == b"gurk\n"
+	finally:
+		connection.close()
+
+
+def test_ssh_stream(tmpdir):
+	pytest.importorskip("execnet")
+	root = url.URL(f"ssh://localhost{tmpdir}/")
+	data = bytes(range(256)) * 10000
+
+	connection = PopenConnection(None, "localhost")
+	try:
+		for compress in (False, True):
+			with connection.open(root/"data.bin", "wb") as f:
+				assert f.writechunks((data[i:i+10000] for i in range(0, len(data), 10000)), compress=compress, window=2) == len(data)
+			assert tmpdir.join("data.bin").read_binary() == data
+
+			with connection.open(root/"data.bin", "rb") as f:
+				assert f.read(10) == data[:10]
+				chunks = list(f.iterchunks(chunksize=100000, compress=compress, window=2))
+				assert b"".join(chunks) == data[10:]
+				assert max(len(chunk) for chunk in chunks) <= 100000
+
+		# Stopping early and errors must leave the channel in a usable state
+		with connection.open(root/"data.bin", "rb") as f:
+			for chunk in f.iterchunks(chunksize=1000, window=2):
+				break
+			# ... and make the remote side stop reading
+			pos = f.tell()
+			assert pos < 10000
+			assert f.read(10) == data[pos:pos+10]
+		with connection.open(root/"data.bin", "wb") as f:
+			with pytest.raises(Exception):
+				list(f.iterchunks())
+		assert connection.stat(root/"data.bin").st_size == 0
+	finally:
+		connection.close()
+
+
+def test_ssh_stream_samehost(tmpdir):
+	# Copying between two files on the same server uses one connection for both
+	pytest.importorskip("execnet")
+	root = url.URL(f"ssh://localhost{tmpdir}/")
+	data = bytes(range(256)) * 10000
+	tmpdir.join("source.bin").write_binary(data)
+
+	connection = PopenConnection(None, "localhost")
+	try:
+		for compress in (False, True):
+			with connection.open(root/"source.bin", "rb") as fileread:
+				with connection.open(root/"target.bin", "wb") as filewrite:
+					assert filewrite.writechunks(fileread.iterchunks(chunksize=10000, compress=compress, window=2), compress=compress, window=2) == len(data)
+			assert tmpdir.join("target.bin").read_binary() == data
+		# The connection is still usable
+		assert connection.stat(root/"target.bin").st_size == len(data)
+	finally:
+		connection.close()
+
+
+@pytest.fixture
+def httpserver(tmpdir):
+	import threading, functools, http.server
+
+	class Handler(http.server.SimpleHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+		requests = []
+		connections = set()
+
+		def setup(self):
+			super().setup()
+			self.connections.add(self.client_address)
+
+		def end_headers(self):
+			if self.path.endswith(".fresh"):
+				self.send_header("Cache-Control", "max-age=3600")
+			super().end_headers()
+
+		def do_GET(self):
+			self.requests.append(("GET", self.path))
+			if self.path.endswith("?slow"):
+				time.sleep(0.5)
+			super().do_GET()
+
+		def do_HEAD(self):
+			self.requests.append(("HEAD", self.path))
+			super().do_HEAD()
+
+		def log_message(self, format, *args):
+			pass
+
+	tmpdir.join("root").mkdir()
+	server = http.server.ThreadingHTTPServer(("localhost", 0), functools.partial(Handler, directory=str(tmpdir.join("root"))))
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	try:
+		yield (url.URL(f"http://localhost:{server.server_address[1]}/"), tmpdir.join("root"), Handler)
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+def test_http_pool(httpserver):
+	(root, dir, handler) = httpserver
+	dir.join("gurk.txt").write_binary(b"gurk\n" * 1000)
+	with url.Context():
+		assert (root/"gurk.txt").size() == 5000
+		assert (root/"gurk.txt").mimetype() == "text/plain"
+		assert (root/"gurk.txt").mdate() is not None
+		for i in range(3):
+			with (root/"gurk.txt").open("rb") as f:
+				assert f.read() == b"gurk\n" * 1000
+	assert handler.requests == [("HEAD", "/gurk.txt")] * 3 + [("GET", "/gurk.txt")] * 3
+	# All requests use the same keep-alive connection
+	assert len(handler.connections) == 1
+
+
+def test_http_cache(httpserver, tmpdir):
+	(root, dir, handler) = httpserver
+	dir.join("gurk.txt").write_binary(b"gurk")
+	dir.join("hurz.fresh").write_binary(b"hurz")
+	cache = url.HTTPCache(tmpdir.join("cache"))
+	with url.Context(httpcache=cache):
+		for i in range(2):
+			assert (root/"gurk.txt").openread().read() == b"gurk"
+			assert (root/"hurz.fresh").openread().read() == b"hurz"
+		assert (root/"hurz.fresh").size() == 4
+	assert (cache.hits, cache.revalidations, cache.misses) == (2, 1, 2)
+	# The fresh response has been served from the cache without a request
+	assert handler.requests == [("GET", "/gurk.txt"), ("GET", "/hurz.fresh"), ("GET", "/gurk.txt")]
+
+	with pytest.raises(url.urllib.error.HTTPError) as exc:
+		with url.Context(httpcache=cache):
+			(root/"missing.txt").openread()
+	assert exc.value.code == 404
+
+
+def test_metacache(tmpdir):
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+	cache = url.MetadataCache()
+	with url.Context(metacache=cache):
+		u = root/"gurk.txt"
+		assert not u.exists()
+		assert not u.exists()
+		assert (cache.hits, cache.misses) == (1, 1)
+
+		with u.openwrite() as f:
+			f.write(b"gurk")
+		assert u.exists()
+		assert u.size() == 4
+		assert u.size() == 4
+		assert (cache.hits, cache.misses) == (2, 3)
+
+		# Changes made behind the back of the context are not seen ...
+		tmpdir.join("gurk.txt").write_binary(b"gurkhurz")
+		assert u.size() == 4
+		# ... until the cache is invalidated
+		cache.invalidate(u)
+		assert u.size() == 8
+
+		u.rename(root/"hurz.txt")
+		assert not u.exists()
+		assert (root/"hurz.txt").isfile()
+
+		(root/"sub/dir/").makedirs()
+		assert (root/"sub/dir/").isdir()
+		(root/"sub/dir/").rmdir()
+		assert not (root/"sub/dir/").exists()
+		assert (root/"sub/").isdir()
+
+	cache = url.MetadataCache(ttl=0)
+	with url.Context(metacache=cache):
+		(root/"hurz.txt").mdate()
+		(root/"hurz.txt").mdate()
+	assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_metacache_write(tmpdir):
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+	with url.Context(metacache=True):
+		u = root/"sub/dir/gurk.txt"
+		assert not u.withoutfile().exists()
+		f = u.open("wb")
+		assert u.size() == 0
+		f.write(b"hello")
+		f.flush()
+		assert u.size() == 5
+		f.close()
+		assert u.size() == 5
+		assert u.withoutfile().exists()
+
+		with u.open("ab") as f:
+			f.write(b"!")
+		assert u.size() == 6
+
+
+def test_metacache_keys(tmpdir, monkeypatch):
+	tmpdir.join("gurk.txt").write_binary(b"gurk")
+	tmpdir.mkdir("sub").join("gurk.txt").write_binary(b"hurz!")
+	monkeypatch.chdir(tmpdir)
+	cache = url.MetadataCache()
+	with url.Context(metacache=cache):
+		u = url.URL("gurk.txt")
+		assert u.size() == 4
+		# Writing via a different spelling of the same file invalidates the cache
+		with url.File(str(tmpdir.join("gurk.txt"))).openwrite() as f:
+			f.write(b"gurkhurz")
+		assert u.size() == 8
+		assert url.URL("./sub/../gurk.txt").size() == 8
+		# Relative URLs refer to the new directory after changing it
+		monkeypatch.chdir(tmpdir.join("sub"))
+		assert u.size() == 5
+
+		# Invalidating removes everything below a URL, but nothing else
+		(url.Dir(str(tmpdir)) / "gurk.txt").size()
+		assert len(cache) == 2
+		cache.invalidate(url.Dir(str(tmpdir.join("sub"))))
+		assert len(cache) == 1
+		cache.invalidate(url.File(str(tmpdir.join("gurk.txt"))))
+		assert len(cache) == 0
+		assert not cache._children
+
+
+def test_parsecache():
+	u1 = url.URL("http://www.example.com/gurk/hurz.html?a=b&a=c#frag")
+	u2 = url.URL("http://www.example.com/gurk/hurz.html?a=b&a=c#frag")
+	assert u1 == u2
+	u1.query_parts["a"].append("d")
+	u1.path.segments.append("x")
+	u1.file = "gurk.txt"
+	u3 = url.URL("http://www.example.com/gurk/hurz.html?a=b&a=c#frag")
+	assert u3.query_parts == {"a": ["b", "c"]}
+	assert str(u3) == "http://www.example.com/gurk/hurz.html?a=b&a=c#frag"
+	assert u3.path.segments == ["gurk", "hurz.html"]
+
+
+def test_join_plainname():
+	for (base, name, result) in [
+		("http://www.example.com/gurk/hurz.html?a=b#frag", "gurk.txt", "http://www.example.com/gurk/gurk.txt"),
+		("/gurk/../hurz/", "x", "/hurz/x"),
+		("gurk//hurz/", "x", "gurk/hurz/x"),
+		("./gurk/", "x", "gurk/x"),
+		("../gurk/", "x", "../gurk/x"),
+		("", "x", "x"),
+		("/", "x", "/x"),
+		("/gurk/", "..", "/"),
+		("/gurk/", "a:b", "a:b"),
+	]:
+		u = url.URL(base)/name
+		assert str(u) == result
+		assert u.path.segments == url.URL(result).path.segments
+
+
+def test_async_http(httpserver):
+	(root, dir, handler) = httpserver
+	for i in range(20):
+		dir.join(f"{i}.txt").write_binary(b"gurk\n" * i)
+
+	async def fetch(u):
+		async with await u.aopen() as f:
+			return (await f.read(), await f.size(), await f.mimetype())
+
+	async def main():
+		with url.Context(maxperhost=20):
+			start = time.perf_counter()
+			results = await asyncio.gather(*(fetch(root/f"{i}.txt?slow") for i in range(20)))
+			duration = time.perf_counter() - start
+			assert await (root/"3.txt").asize() == 15
+			assert await (root/"3.txt").amimetype() == "text/plain"
+			async with await (root/"3.txt").aopen() as f:
+				assert [line async for line in f] == [b"gurk\n"] * 3
+			with pytest.raises(url.urllib.error.HTTPError):
+				await (root/"missing.txt").aopen()
+		return (results, duration)
+
+	(results, duration) = asyncio.run(main())
+	assert results == [(b"gurk\n" * i, 5 * i, "text/plain") for i in range(20)]
+	# The requests have been done concurrently
+	assert duration < 5
+	assert ("HEAD", "/3.txt") in handler.requests
+
+
+def test_async_http_read(httpserver):
+	(root, dir, handler) = httpserver
+	data = b"".join(b"%d\n" % i for i in range(200000))
+	dir.join("big.txt").write_binary(data)
+
+	async def main():
+		with url.Context():
+			async with await (root/"big.txt").aopen() as f:
+				parts = [await f.read(1000)]
+				parts.append(await f.readline())
+				parts.append(await f.readline(3))
+				while True:
+					part = await f.read(70001)
+					if not part:
+						break
+					parts.append(part)
+			async with await (root/"big.txt").aopen() as f:
+				lines = [line async for line in f]
+			return (parts, lines)
+
+	(parts, lines) = asyncio.run(main())
+	assert all(isinstance(part, bytes) for part in parts)
+	assert b"".join(parts) == data
+	assert len(parts[2]) == 3
+	assert b"".join(lines) == data
+	assert len(lines) == 200000
+
+
+def test_async_metacache(tmpdir):
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+	cache = url.MetadataCache()
+
+	async def main():
+		with url.Context(metacache=cache):
+			u = root/"gurk.txt"
+			assert not await u.aexists()
+			assert not await u.aexists()
+			assert (cache.hits, cache.misses) == (1, 1)
+			async with await u.aopen("wb") as f:
+				await f.write(b"gurk")
+			assert await u.aexists()
+			assert await u.asize() == 4
+			assert await u.asize() == 4
+			assert (cache.hits, cache.misses) == (2, 3)
+			assert u.size() == 4
+			assert (cache.hits, cache.misses) == (3, 3)
+
+	asyncio.run(main())
+
+
+def test_async_file(tmpdir):
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+	tmpdir.mkdir("a").join("c.txt").write("hurz")
+
+	async def main():
+		with url.Context():
+			async with await (root/"b.txt").aopen("wb") as f:
+				await f.write(b"gurk")
+			assert await (root/"b.txt").asize() == 4
+			assert await (root/"b.txt").aisfile()
+			assert not await (root/"x.txt").aexists()
+			async with await (root/"b.txt").aopen("rb") as f:
+				assert await f.read() == b"gurk"
+			assert sorted(map(str, await root.alistdir())) == ["a/", "b.txt"]
+			return sorted([str(u) async for u in root.awalkfiles()])
+
+	assert asyncio.run(main()) == ["a/c.txt", "b.txt"]
+
+
+def test_mmap_readinto(tmpdir):
+	tmpdir.join("gurk.txt").write_binary(b"gurk" * 1000)
+	tmpdir.join("empty.txt").write_binary(b"")
+	root = url.Dir(f"{tmpdir}/", scheme=None)
+	with (root/"gurk.txt").open("rb") as f:
+		data = f.mmap()
+		assert data.readonly
+		assert data[:8] == b"gurkgurk"
+		assert len(data) == 4000
+		buffer = bytearray(3000)
+		assert f.readinto(buffer) == 3000
+		assert f.readinto(buffer) == 1000
+		assert buffer[:4] == b"gurk"
+		assert f.readinto(buffer) == 0
+	assert bytes(data) == b"gurk" * 1000
+	with (root/"empty.txt").open("rb") as f:
+		assert f.mmap() == b""
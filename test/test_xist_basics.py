@@ -291,6 +291,24 @@ def test_repr():
 				str(presenter)
 
 
+def test_presentlimits():
+	node = html.div(html.ul(html.li(i, class_="x") for i in range(5)), html.p("foo", html.b("bar")))
+	for class_ in (present.TreePresenter, present.CodePresenter):
+		full = str(class_(node))
+		stream = io.StringIO()
+		class_(node).write(stream)
+		assert stream.getvalue() == full + "\n"
+
+		output = str(class_(node, maxchildren=2))
+		assert "3 more children" in output
+		assert output.count("li") == full.count("li")*2//5
+
+		output = str(class_(node, maxdepth=1))
+		assert "5 children" in output
+		assert "li" not in output
+		assert "bar" not in output
+
+
 def test_attrsclone():
 	class newa(html.a):
 		def convert(self, converter):
@@ -949,3 +967,107 @@ def test_plainprocinst_mapped():
 def test_clone_plain_attributes():
 	node = html.p({"data-id": 42})
 	assert node.clone().string() == '<p data-id="42"></p>'
+
+
+def test_clone_shared():
+	proto = html.div(html.ul(html.li(i, class_="item") for i in range(3)), id="proto")
+	orgstring = proto.string()
+
+	node = proto.clone(True)
+	assert node.string() == orgstring
+	assert node == proto
+	# Content and attributes are shared until they are accessed
+	assert "content" not in node.__dict__
+	assert "attrs" not in node.__dict__
+
+	node.attrs.id = "copy"
+	node[0][1].attrs.class_ = "selected"
+	node[0].append(html.li(3))
+	assert proto.string() == orgstring
+	assert node.string() == '<div id="copy"><ul><li class="item">0</li><li class="selected">1</li><li class="item">2</li><li>3</li></ul></div>'
+
+	# Modifying the original doesn't change the clone
+	orig = html.div(html.p("a"), html.p("b"))
+	clone = orig.clone(True)
+	orig[0].append("!")
+	orig.append(html.p("c"))
+	orig.attrs.id = "orig"
+	assert orig.string() == '<div id="orig"><p>a!</p><p>b</p><p>c</p></div>'
+	assert clone.string() == "<div><p>a</p><p>b</p></div>"
+	clone[1].append("?")
+	assert orig.string() == '<div id="orig"><p>a!</p><p>b</p><p>c</p></div>'
+	assert clone.string() == "<div><p>a</p><p>b?</p></div>"
+
+	# Shared clones of shared clones
+	node2 = node.clone(True)
+	node2[0][2].attrs.class_ = "last"
+	assert 'class="last"' not in node.string()
+	assert 'class="last"' in node2.string()
+
+	# Fragments
+	frag = xsc.Frag(proto, "foo").clone(True)
+	assert frag == xsc.Frag(proto, "foo")
+	assert frag[0] is not proto
+
+
+def test_pretty_keeps_references():
+	# Read-only methods must not detach content that callers hold references to
+	p = html.p("a", html.b("x"))
+	b = p[1]
+	c = b.content
+	p.pretty()
+	b.append("z")
+	c.append("y")
+	assert b.string() == "<b>xzy</b>"
+
+
+
+def test_shared_results():
+	# ``compacted()``, ``normalized()`` and ``mapped()`` share unchanged parts
+	# of the tree with the original copy-on-write
+	for method in (lambda node: node.compacted(), lambda node: node.normalized(), lambda node: node.mapped(lambda node, converter: node)):
+		orig = html.div(html.ul(html.li("a", class_="x"), html.li("b")), "\n", id="orig")
+		result = method(orig)
+		assert "attrs" not in result.__dict__
+		result.attrs.id = "result"
+		result[0][0].attrs.class_ = "y"
+		result[0].append(html.li("c"))
+		orig[0][1].append("!")
+		assert 'id="orig"' in orig.string()
+		assert 'class="x"' in orig.string()
+		assert "<li>c</li>" not in orig.string()
+		assert 'id="result"' in result.string()
+		assert 'class="y"' in result.string()
+		assert "b!" not in result.string()
+
+	# Nothing to do, so the compacted version is a shared clone
+	orig = html.div(html.p("a"))
+	assert "content" not in orig.compacted().__dict__
+	assert orig.compacted() == orig
+
+	orig = html.div("a", "b", id="orig")
+	result = orig.withsep(", ")
+	assert "attrs" not in result.__dict__
+	result.attrs.id = "result"
+	assert result.string() == '<div id="result">a, b</div>'
+	assert orig.string() == '<div id="orig">ab</div>'
+
+	sep = html.span("x")
+	result = xsc.Frag("a", "b", "c").withsep(sep, clone=True)
+	result[3].append("y")
+	assert result.string() == "a<span>x</span>b<span>xy</span>c"
+	assert sep.string() == "<span>x</span>"
+
+
+def test_compactnodes():
+	# Text nodes and fragments don't need an instance dictionary for the location
+	text = xsc.Text("foo")
+	assert not hasattr(text, "__dict__")
+	assert text.startloc is None
+	text.startloc = xsc.Location(line=42)
+	assert text.startloc.line == 42
+
+	attr = html.a.Attrs.href("foo")
+	assert attr.startloc is None
+	attr.startloc = xsc.Location(line=42)
+	assert "startloc" not in attr.__dict__
@@ -10,6 +10,8 @@
 ## See ll/xist/__init__.py for the license
 
 
+import pickle
+
 from ll.xist import xsc
 from ll.xist.ns import html
 
@@ -42,3 +44,79 @@ def test_mapped():
 			class_="lang", # No replacement in attributes
 		)
 	)
+
+
+class counter(xsc.Element):
+	xmlns = "http://xmlns.example.org/counter"
+	convert_pure = True
+	count = 0
+
+	def convert(self, converter):
+		counter.count += 1
+		return html.span(self.content, class_=converter.mode).convert(converter)
+
+
+class impurecounter(counter):
+	convert_pure = False
+
+
+def test_convertcache():
+	counter.count = 0
+	node = counter("foo")
+	cache = {}
+	doc1 = html.div(node, node).conv(cache=cache)
+	assert counter.count == 1
+	assert doc1 == html.div(html.span("foo"), html.span("foo"))
+	doc2 = html.div(node).conv(cache=cache)
+	assert counter.count == 1
+	assert doc2[0] == doc1[0]
+	# Each conversion gets its own result
+	assert doc2[0] is not doc1[0]
+	doc2[0].append("bar")
+	assert doc1 == html.div(html.span("foo"), html.span("foo"))
+	assert html.div(node).conv(cache=cache) == html.div(html.span("foo"))
+	# A different converter state requires a new conversion
+	assert html.div(node).conv(mode="gurk", cache=cache) == html.div(html.span("foo", class_="gurk"))
+	assert counter.count == 2
+	# Without cache every node is converted
+	html.div(node, node).conv()
+	assert counter.count == 4
+
+
+def test_convertcache_equal():
+	# Equal, but distinct nodes share the conversion result
+	counter.count = 0
+	cache = {}
+	html.div(counter("foo", html.b("bar"))).conv(cache=cache)
+	doc = html.div(counter("foo", html.b("bar"))).conv(cache=cache)
+	assert counter.count == 1
+	assert doc == html.div(html.span("foo", html.b("bar")))
+	# Different content or attributes require a new conversion
+	html.div(counter("foo", html.b("baz"))).conv(cache=cache)
+	assert counter.count == 2
+	html.div(counter("foo", html.b("bar", class_="x"))).conv(cache=cache)
+	assert counter.count == 3
+	html.div(counter(html.b("bar", class_="x"), "foo")).conv(cache=cache)
+	assert counter.count == 4
+
+
+def test_convertcache_impure():
+	counter.count = 0
+	node = impurecounter("foo")
+	html.div(node, node).conv(cache=True)
+	assert counter.count == 2
+
+
+def test_convertprocesses():
+	node = xsc.Frag(html.div(html.p(i)) for i in range(5))
+	assert node.conv(processes=2) == node.conv()
+	assert node.conv(processes=2, target=html) == node.conv()
+
+
+def test_convchild():
+	# Test the helper that :meth:`Frag.conv` runs in the worker processes
+	# (without starting any processes)
+	node = html.div(html.p(1))
+	convargs = dict(root=None, mode=None, stage=None, target="ll.xist.ns.html", lang=None, makeaction=None, makeproject=None, cache=None)
+	(node, convargs) = pickle.loads(pickle.dumps((node, convargs)))
+	assert xsc._convchild(node, convargs) == node.conv()
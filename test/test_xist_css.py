@@ -84,6 +84,16 @@ def test_css():
 	assert list(e.walknodes(css.selector("em[lang|='en']"))) == [e[0], e[1]]
 
 
+def test_css_nthchild_large():
+	e = html.table(html.tr(html.td(i)) for i in range(1000))
+	rows = list(e.walknodes(css.selector("tr:nth-child(odd)")))
+	assert len(rows) == 500
+	assert rows[0] is e[0]
+	assert rows[-1] is e[998]
+	assert list(e.walknodes(css.selector("tr:nth-last-child(1)"))) == [e[-1]]
+	assert list(e.walknodes(css.selector("tr:first-child + tr"))) == [e[1]]
+
+
 def test_applystylesheets1():
 	with xsc.build():
 		with html.html() as e:
@@ -156,6 +166,65 @@ def test_applystylesheets5():
 	assert list(e.walknodes(html.style)) == []
 
 
+def test_applystylesheets_buckets():
+	with xsc.build():
+		with html.html() as e:
+			with html.head():
+				+html.style("* {margin: 0;} p {color: red;} .big {font-size: 20px;} div p.big {font-weight: bold;} #id42 {color: green;}", type="text/css")
+			with html.body():
+				with html.div():
+					+html.p("gurk", class_="big small")
+					+html.p("hurz", id="id42")
+				+html.p("hinz", class_="big")
+
+	css.applystylesheets(e)
+
+	ps = list(e.walknodes(html.p))
+	assert str(ps[0].attrs.style) == "margin: 0; color: red; font-size: 20px; font-weight: bold;"
+	assert str(ps[1].attrs.style) == "margin: 0; color: green;"
+	assert str(ps[2].attrs.style) == "margin: 0; color: red; font-size: 20px;"
+	assert str(e.walknodes(html.div)[0].attrs.style) == "margin: 0;"
+
+
+def test_applystylesheets_cache():
+	def makedoc():
+		with xsc.build():
+			with html.html() as e:
+				with html.head():
+					+html.style("p {color: red;}", type="text/css")
+				with html.body():
+					+html.p("gurk")
+		return e
+
+	css.clearcache()
+	e = makedoc()
+	css.applystylesheets(e, cache=True)
+	assert str(e.walknodes(html.p)[0].attrs.style) == "color: red;"
+	assert len(css._rulecache) == 1
+
+	e = makedoc()
+	css.applystylesheets(e, cache=True)
+	assert str(e.walknodes(html.p)[0].attrs.style) == "color: red;"
+	assert len(css._rulecache) == 1
+
+	css.clearcache()
+	e = makedoc()
+	css.applystylesheets(e)
+	assert str(e.walknodes(html.p)[0].attrs.style) == "color: red;"
+	assert len(css._rulecache) == 0
+
+
+def test_ruleindex_sharedrules():
+	# Compiled rules might be shared between calls via the cache, so building
+	# an index must not change them
+	r1 = css._Rule((0, 0, 1), css.selector("p"), [("color", "color: red")])
+	r2 = css._Rule((0, 0, 1), css.selector("p"), [("color", "color: blue")])
+	index1 = css._RuleIndex([r1, r2])
+	index2 = css._RuleIndex([r2, r1])
+	assert index1.candidates(html.p()) == [r1, r2]
+	assert index2.candidates(html.p()) == [r2, r1]
+
+
 def test_applystylesheets_media():
 	# Check that media="screen" picks up the media stylesheet
 	with xsc.build():
@@ -10,6 +10,8 @@
 ## See ll/xist/__init__.py for the license
 
 
+import sys
+
 import pytest
 
 from ll import url
@@ -153,3 +155,63 @@ def test_textexpr():
 				+detox.textexpr("s")
 
 	assert makeoutput(e, "gurk") == '&quot;a&quot; &lt; &quot;b&quot; &amp; &quot;b&quot; &gt; &quot;a&quot;'
+
+
+def test_codecache(tmpdir):
+	source = xsc.Frag(detox.def_("gurk()"), "hurz", detox.end("def")).string()
+
+	cache = detox.CodeCache(str(tmpdir))
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hurz"
+	assert (cache.hits, cache.diskhits, cache.misses) == (0, 0, 1)
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hurz"
+	assert (cache.hits, cache.diskhits, cache.misses) == (1, 0, 1)
+
+	# A new cache finds the code on disk
+	cache = detox.CodeCache(str(tmpdir))
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hurz"
+	assert (cache.hits, cache.diskhits, cache.misses) == (0, 1, 0)
+
+	# Changing the source invalidates the cache entry
+	source = source.replace("hurz", "hinz")
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hinz"
+	assert (cache.hits, cache.diskhits, cache.misses) == (0, 1, 1)
+
+	# Changing the compiler invalidates the cache entry too
+	cache = detox.CodeCache(str(tmpdir))
+	cache._compilerhash += "changed"
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hinz"
+	assert (cache.hits, cache.diskhits, cache.misses) == (0, 0, 1)
+
+
+def test_codecache_writeerror(tmpdir):
+	source = xsc.Frag(detox.def_("gurk()"), "hurz", detox.end("def")).string()
+	cache = detox.CodeCache(str(tmpdir))
+	# The cache file can't be replaced by the temporary file if it's a directory
+	tmpdir.mkdir(f"gurk.detox.{cache.tag}.pyc")
+	assert "".join(detox.xml2mod(source, filename="gurk.detox", cache=cache).gurk()) == "hurz"
+	assert cache.errors == 1
+	assert tmpdir.listdir() == [tmpdir.join(f"gurk.detox.{cache.tag}.pyc")]
+
+
+def test_codecache_unnamed(tmpdir, monkeypatch):
+	source = xsc.Frag(detox.def_("gurk()"), "hurz", detox.end("def")).string()
+	monkeypatch.chdir(tmpdir)
+	tmpdir.join("unnamed.py").write("")
+	# Templates without a file name are only cached in memory
+	for cache in (detox.CodeCache(), detox.CodeCache(str(tmpdir.join("cache")))):
+		assert "".join(detox.xml2mod(source, cache=cache).gurk()) == "hurz"
+		assert "".join(detox.xml2mod(source, cache=cache).gurk()) == "hurz"
+		assert (cache.hits, cache.misses) == (1, 1)
+	assert tmpdir.listdir() == [tmpdir.join("unnamed.py")]
+def test_import(tmpdir, monkeypatch):
+	tmpdir.join("detoxtest.detox").write(xsc.Frag(detox.def_("gurk()"), "hurz", detox.end("def")).string())
+	monkeypatch.syspath_prepend(str(tmpdir))
+	monkeypatch.setattr("sys.meta_path", sys.meta_path[:])
+	monkeypatch.delitem(sys.modules, "detoxtest", raising=False)
+	cache = detox.CodeCache()
+	detox.enable_import(cache=cache)
+	import detoxtest
+	assert "".join(detoxtest.gurk()) == "hurz"
+	assert cache.misses == 1
+	assert tmpdir.join("__pycache__", f"detoxtest.detox.{cache.tag}.pyc").check()
+	del sys.modules["detoxtest"]
@@ -10,6 +10,10 @@
 ## See ll/xist/__init__.py for the license
 
 
+import sys, subprocess
+
+import pytest
+
 from ll.xist import xsc
 from ll.xist.ns import html, xml, chars, abbr, ihtml, wml, specials, htmlspecials, form, meta, svg, fo, docbook, jsp, struts_html, struts_config, tld
 
@@ -67,3 +71,36 @@ def test_attributeexamples():
 	assert xml.Attrs.lang.__name__ == "lang"
 	assert xml.Attrs.lang.xmlname == "lang"
 	assert xml.Attrs.lang.xmlns == xml.xmlns
+
+
+def test_attrsinheritance():
+	# The attributes of an :class:`Attrs` class include the inherited ones
+	assert html.a.Attrs.isdeclared(html.a.Attrs.href)
+	assert html.a.Attrs.isdeclared(html.a.Attrs.class_)
+	assert html.a.Attrs.isdeclared("class")
+	assert not html.a.Attrs.isdeclared("gurk")
+	assert not html.a.Attrs.isdeclared(html.img.Attrs.src)
+
+
+@pytest.mark.importtime
+def test_importtime():
+	# Check that creating the classes of the bigger namespaces doesn't get
+	# slower again (this measures wall clock time, so it's not part of the
+	# normal test run, use ``make importtime`` instead)
+	budgets = dict(html=60, chars=25, svg=100, fo=130, docbook=200) # milliseconds
+	for (name, budget) in budgets.items():
+		# Use the best of a few runs to reduce the influence of other processes
+		best = None
+		for i in range(5):
+			output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import ll.xist.ns.{name}"], stderr=subprocess.PIPE, check=True, universal_newlines=True).stderr
+			for line in output.splitlines():
+				(selftime, cumulativetime, module) = line.split("|")
+				if module.strip() == f"ll.xist.ns.{name}":
+					selftime = int(selftime.split(":")[1]) / 1000
+					break
+			else:
+				assert False, f"no import time for ll.xist.ns.{name}"
+			if best is None or selftime < best:
+				best = selftime
+		assert best < budget, f"importing ll.xist.ns.{name} takes {best:.1f}ms (budget {budget}ms)"
+
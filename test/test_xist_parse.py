@@ -79,6 +79,62 @@ def test_parselocationexpat():
 	assert node[0][0].startloc.col == 36 # expat reports the *end* of the text
 
 
+def test_parsesharedlocation():
+	# An element and its attributes share the same location object
+	node = parse.tree(b"<a href='gurk' class='hurz'>hinz</a>", parse.Expat(), parse.NS(html), parse.Node())
+	a = node[0]
+	assert a.startloc.col == 0
+	assert a.attrs.href.startloc is a.startloc
+	assert a.attrs.class_.startloc is a.startloc
+	assert a.attrs.class_[0].startloc is a.startloc
+
+
+def test_parsecompactlocation():
+	source = b"<a href='gurk' class='hurz'>hinz<b>kunz</b>\n<i/></a>"
+	def locs(node):
+		return [(str(n.startloc), str(getattr(n, "endloc", None))) for n in node.walknodes(xsc.Element, xsc.Text)]
+
+	node = parse.tree(parse.String(source, url="gurk.xml"), parse.Expat(), parse.NS(html), parse.Node(loc="compact"))
+	a = node[0]
+	assert isinstance(a._startloc, int)
+	assert a.attrs.href._startloc is a._startloc
+	assert a.startloc == xsc.Location(url.URL("gurk.xml"), 0, 0)
+	assert a[2].startloc.line == 1
+	assert str(a.clone().startloc) == str(a.startloc)
+	node2 = parse.tree(parse.String(source, url="gurk.xml"), parse.Expat(), parse.NS(html), parse.Node())
+	assert locs(node) == locs(node2)
+
+	fast = parse.fasttree(parse.String(source, url="gurk.xml"), prefixes=html, loc="compact")
+	assert isinstance(fast[0]._startloc, int)
+	assert locs(fast) == locs(parse.fasttree(parse.String(source, url="gurk.xml"), prefixes=html))
+
+
+def test_compactlocation_registry(monkeypatch):
+	monkeypatch.setattr(xsc.Location, "_maxurls", 3)
+	u = url.URL("gurk.xml")
+	loc = xsc.Location.compact(u, 1, 2)
+	# Modifying the URL doesn't change the location
+	u.path = "hurz.xml"
+	assert xsc.Location.fromcompact(loc) == xsc.Location(url.URL("gurk.xml"), 1, 2)
+	# ... and the modified URL gets its own entry
+	assert xsc.Location.fromcompact(xsc.Location.compact(u, 3, 4)) == xsc.Location(url.URL("hurz.xml"), 3, 4)
+
+	# The registry doesn't grow without bounds
+	for i in range(10):
+		xsc.Location.compact(url.URL(f"gurk{i}.xml"), 1, 2)
+	assert len(xsc.Location._urls) == 3
+	assert len(xsc.Location._urlindexes) == 3
+	# Locations for URLs that have been dropped have no URL
+	assert xsc.Location.fromcompact(loc) == xsc.Location(None, 1, 2)
+
+
+def test_parseinternedstrings():
+	node = parse.tree(b"<ul><li class='x'> </li><li class='x'> </li></ul>", parse.Expat(), parse.NS(html), parse.Node())
+	(li1, li2) = node[0]
+	assert li1[0].content is li2[0].content
+	assert li1.attrs.class_[0].content is li2.attrs.class_[0].content
+
+
 def test_nsparse():
 	# A prepopulated prefix mapping and xmlns attributes should work together
 	xml = b"""
@@ -349,6 +405,22 @@ def test_filesource():
 		assert parsed == expect
 
 
+def test_filesource_mmap(tmpdir):
+	expect = f"<?xml version='1.0' encoding='iso-8859-1'?><a xmlns='{html.xmlns}'>gürk</a>".encode("iso-8859-1")
+	tmpdir.join("gurk.xml").write_binary(expect)
+	source = parse.File(str(tmpdir.join("gurk.xml")), bufsize=7, mmap=True)
+	for i in range(3):
+		parsed = b"".join(data for (evtype, data) in source if evtype == "bytes")
+		assert parsed == expect
+	assert parse.tree(source, parse.Expat(), parse.NS(), parse.Node()).string() == "<a>gürk</a>"
+	assert parse.tree(source, parse.Decoder(), parse.Encoder("utf-8"), parse.Expat(), parse.NS(), parse.Node()).string() == "<a>gürk</a>"
+	assert parse.tree(bytearray(expect), parse.Expat(), parse.NS(), parse.Node()).string() == "<a>gürk</a>"
+	assert parse.tree(memoryview(expect), parse.Expat(), parse.NS(), parse.Node()).string() == "<a>gürk</a>"
+
+	tmpdir.join("empty.xml").write_binary(b"")
+	assert list(parse.File(str(tmpdir.join("empty.xml")), mmap=True)) == [("url", url.File(str(tmpdir.join("empty.xml"))))]
+
+
 def test_streamsource():
 	# Stream objects are not reusable
 	expect = open("setup.py", "rb").read()
@@ -390,6 +462,46 @@ def test_itertree_skip():
 		assert not isinstance(c.node, html.li)
 
 
+def test_itertree_prune():
+	def xml():
+		yield f"<ul xmlns='{html.xmlns}'>".encode("utf-8")
+		for i in range(1000):
+			yield f"<li><b>{i}</b></li>\n".encode("utf-8")
+		yield "</ul>".encode("utf-8")
+
+	for (i, c) in enumerate(parse.itertree(parse.Iter(xml()), parse.Expat(ns=True), parse.Node(), selector=html.li, prune=True)):
+		# The matched node is complete ...
+		assert c.node.string() == f"<li><b>{i}</b></li>"
+		# ... but previously matched nodes have been removed
+		assert len(c.path[-2]) <= 2
+		assert c.path[-2][-1] is c.node
+		assert c.index[-1] == len(c.path[-2]) - 1
+
+
+def test_itertree_prune_enterelementnode():
+	source = b"<a><b>1</b><b>2</b><b>3</b></a>"
+	result = []
+	for c in parse.itertree(parse.String(source), parse.Expat(), parse.NS(html), parse.Node(), selector=html.b, enterelementnode=True, leaveelementnode=False, prune=True):
+		result.append(len(c.path[-2]))
+	assert result == [1, 1, 1]
+
+
+def test_itertree_prune_strings():
+	# The strings kept for reuse must not grow with the document
+	data = b"<a>" + b"".join(b"<b>%d</b>" % i for i in range(3*parse._internsize)) + b"</a>"
+	builder = parse.Node()
+	count = 0
+	for cursor in parse.itertree(parse.String(data), parse.Expat(), parse.NS(html), builder, selector=html.b, prune=True):
+		assert len(builder._strings) <= parse._internsize
+		count += 1
+	assert count == 3*parse._internsize
+	assert len(builder._strings) <= parse._internsize
+
+	node = parse.tree(parse.String(b"<a><b>x</b><b>x</b></a>"), parse.Expat(), parse.NS(html), parse.Node())
+	assert node[0][0][0].content is node[0][1][0].content
+
+
+
 def test_expat_events_on_exception():
 	# Test that all collected events are output before an exception is thrown
 	i = parse.events(b"<x/>schrott", parse.Expat())
@@ -463,3 +575,42 @@ def test_plain_procinst():
 
 	assert len(ws) == 2
 	assert all(issubclass(w.category, xsc.UndeclaredNodeWarning) for w in ws)
+
+
+def test_fasttree():
+	source = b"""<?xml version="1.0" encoding="utf-8"?>
+<!-- comment -->
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:x="http://www.w3.org/1999/xlink" xml:lang="de">
+	<body class="foo">
+		<p>gurk &amp; hurz &gurk; &foo; &bar;<?php echo 42;?></p>
+		<a href="x.html" x:href="y.html" title="">hinz<b>kunz</b></a>
+		<div xmlns="http://www.example.com/foo"><a id="x42"/></div>
+	</body>
+</html>"""
+
+	def walk(node):
+		for path in node.walkpaths(enterattrs=True, enterattr=True):
+			node = path[-1]
+			yield (type(node), node.startloc, getattr(node, "endloc", None))
+
+	pool = xsc.Pool(xml, html, xlink, a, foo, bar)
+	for loc in (False, True, "compact"):
+		for base in (None, "http://www.example.org/"):
+			piped = parse.tree(parse.String(source, url="gurk.xml"), parse.Expat(loc=loc), parse.NS(html), parse.Node(pool=pool, base=base, loc=loc))
+			fast = parse.fasttree(parse.String(source, url="gurk.xml"), pool=pool, prefixes=html, base=base, loc=loc)
+			assert fast == piped
+			assert fast.string() == piped.string()
+			assert list(walk(fast)) == list(walk(piped))
+
+
+def test_fasttree_chunked():
+	source = b"<a>" + b"gurk" * 1000 + b"&amp;<b/>hurz</a>"
+	node = parse.fasttree(parse.Iter(source), prefixes=a.xmlns, pool=xsc.Pool(a))
+	assert len(node[0]) == 3
+	assert str(node[0][0]) == "gurk" * 1000 + "&"
+
+
+def test_fasttree_illegalprefix():
+	with pytest.raises(xsc.IllegalPrefixError):
+		parse.fasttree(b"<x:a xmlns:y='http://www.example.com/'/>")
+
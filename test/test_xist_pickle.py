@@ -29,3 +29,37 @@ def test_pickle():
 	e2 = pickle.loads(pickle.dumps(e, 2))
 	assert e == e2
 	assert e2[3] is e2[-1]
+
+
+def test_dumptree():
+	e = xsc.Frag(
+		xml.XML(),
+		html.DocTypeXHTML10transitional(),
+		xsc.Comment("foo"),
+		html.html(xml.Attrs(lang="de"), lang="de"),
+		php.expression("$foo"),
+		chars.nbsp(),
+		abbr.xml(),
+	)
+	e2 = xsc.loadtree(xsc.dumptree(e))
+	assert e == e2
+	assert xsc.loadtree(xsc.dumptree(xsc.Null)) is xsc.Null
+
+
+def test_dumptree_plain():
+	e = xsc.element(
+		"http://xmlns.example.org/foo",
+		"foo",
+		xsc.entity("bar"),
+		xsc.procinst("baz", "gurk"),
+		"hurz",
+		{"class": "x", ("http://xmlns.example.org/foo", "bar"): ["y", xsc.entity("amp")]},
+	)
+	e2 = xsc.loadtree(xsc.dumptree(e))
+	assert e == e2
+	assert e2.xmlns == "http://xmlns.example.org/foo"
+	assert e2[0].xmlname == "bar"
+	assert e2[1].xmlname == "baz"
+	assert str(e2.attrs["class"]) == "x"
+	assert e2.attrs[("http://xmlns.example.org/foo", "bar")] == e.attrs[("http://xmlns.example.org/foo", "bar")]
+	assert e2.bytes() == e.bytes()
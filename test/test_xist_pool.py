@@ -11,7 +11,7 @@
 
 
 from ll.xist import xsc
-from ll.xist.ns import html, php, chars, abbr
+from ll.xist.ns import xml, html, php, chars, abbr
 
 
 def test_basics_element():
@@ -265,3 +265,72 @@ def test_itermethods():
 	assert pi in list(p2.procinsts())
 	assert en in list(p2.entities())
 	assert cr in list(p2.entities())
+
+
+def test_cache():
+	base = xsc.Pool()
+	pool = xsc.Pool(base)
+	assert pool.elementclass(html, "a") is xsc.Element
+	assert (pool.cachehits, pool.cachemisses) == (0, 1)
+	assert pool.elementclass(html, "a") is xsc.Element
+	assert (pool.cachehits, pool.cachemisses) == (1, 1)
+
+	# Registering a class in a base pool invalidates the cache
+	base.register(html.a)
+	assert pool.elementclass(html, "a") is html.a
+	assert (pool.cachehits, pool.cachemisses) == (1, 2)
+
+	base.clear()
+	assert pool.elementclass(html, "a") is xsc.Element
+
+
+def test_cache_unrelated():
+	pool = xsc.Pool(xsc.Pool())
+	pool.elementclass(html, "a")
+	# Changes to other pools don't invalidate the cache
+	xsc.Pool(html)
+	with xsc.Pool():
+		class gurk(xsc.Element):
+			pass
+	pool.elementclass(html, "a")
+	assert (pool.cachehits, pool.cachemisses) == (1, 1)
+
+
+def test_cache_indirectbase():
+	base2 = xsc.Pool()
+	base1 = xsc.Pool(base2)
+	pool = xsc.Pool(base1)
+	assert pool.elementclass(html, "a") is xsc.Element
+
+	# Changes in indirect base pools invalidate the cache too
+	base2.register(html.a)
+	assert pool.elementclass(html, "a") is html.a
+
+	# ... even if they have been added later
+	base3 = xsc.Pool()
+	base2.register(base3)
+	base3.register(html.p)
+	assert pool.elementclass(html, "p") is html.p
+
+
+
+def test_cache_lookupduringregister():
+	base = xsc.Pool(html.a)
+	pool = xsc.Pool()
+
+	class Bases(dict):
+		def items(self):
+			# Fill the cache while :meth:`register` is running, but before the registry has been changed
+			pool.elementclass(html, "a")
+			return dict.items(self)
+
+	pool.register(Bases(__bases__=[base]))
+	assert pool.elementclass(html, "a") is html.a
+
+def test_attrkeybase():
+	# Global attributes are found in base pools
+	base = xsc.Pool(xml.Attrs.lang)
+	pool = xsc.Pool(base)
+	assert pool.attrkey(xml, "lang") is xml.Attrs.lang
+	assert pool.attrkey(xml, "gurk") == (xml.xmlns, "gurk")
+	assert pool.attrkey(None, "gurk") == "gurk"
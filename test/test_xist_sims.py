@@ -221,3 +221,41 @@ def test_noelementsortext():
 		# Elements from a different namespace are OK
 		e = el1(el2())
 		e.bytes(validate=True)
+
+
+def test_elements_generic():
+	# The validator caches its result per element class, but generic elements have their namespace in the instance
+	with xsc.Pool():
+		class el1(xsc.Element):
+			xmlns = "ns1"
+
+		el1.model = sims.Elements(el1)
+
+		for i in range(2):
+			with warnings.catch_warnings(record=True) as w:
+				warnings.simplefilter("always")
+				el1(xsc.element("ns1", "gurk")).bytes(validate=True)
+			assert [x.category for x in w if issubclass(x.category, sims.SIMSWarning)] == [sims.WrongElementWarning]
+
+			with warnings.catch_warnings(record=True) as w:
+				warnings.simplefilter("always")
+				el1(xsc.element("ns2", "gurk")).bytes(validate=True)
+			assert [x.category for x in w if issubclass(x.category, sims.SIMSWarning)] == []
+
+
+def test_requiredattrs():
+	with xsc.Pool():
+		class el1(xsc.Element):
+			xmlns = "ns1"
+			class Attrs(xsc.Element.Attrs):
+				class foo(xsc.TextAttr):
+					required = True
+
+		assert list(el1(foo="x").validate()) == []
+		assert [w.__class__ for w in el1().validate()] == [xsc.RequiredAttrMissingWarning]
+
+		# Adding a new required attribute invalidates the cached set of required attributes
+		class bar(xsc.TextAttr):
+			required = True
+		el1.Attrs.add(bar)
+		assert [w.__class__ for w in el1(foo="x").validate()] == [xsc.RequiredAttrMissingWarning]
@@ -0,0 +1,70 @@
+#! /usr/bin/env/python
+# -*- coding: utf-8 -*-
+# cython: language_level=3, always_allow_keywords=True
+
+## Copyright 2009-2019 by LivingLogic AG, Bayreuth/Germany
+## Copyright 2009-2019 by Walter Dörwald
+##
+## All Rights Reserved
+##
+## See ll/xist/__init__.py for the license
+
+
+from ll import ul4c
+from ll.xist import xsc
+from ll.xist.ns import html, ul4
+
+
+def node():
+	return xsc.Frag(
+		html.ul(
+			ul4.for_("name in names"),
+			html.li(
+				ul4.printx("name"),
+				class_=ul4.attr_if("selected", cond="name == selected"),
+			),
+			ul4.end("for"),
+		),
+	)
+
+
+def test_totemplate():
+	template = ul4.totemplate(node(), name="names", cache=False)
+	assert isinstance(template, ul4c.Template)
+	assert template.name == "names"
+	assert template.renders(names=["foo", "<bar>"], selected="foo") == '<ul><li class="selected">foo</li><li>&lt;bar&gt;</li></ul>'
+
+
+def test_totemplate_cache():
+	ul4.clearcache()
+	template1 = ul4.totemplate(node())
+	template2 = ul4.totemplate(node())
+	assert template1 is template2
+	template3 = ul4.totemplate(node(), whitespace="strip")
+	assert template3 is not template1
+	ul4.clearcache()
+	template4 = ul4.totemplate(node())
+	assert template4 is not template1
+	assert template4.renders(names=["foo"], selected=None) == template1.renders(names=["foo"], selected=None)
+
+
+def test_totemplate_cache_fingerprint(monkeypatch):
+	ul4.clearcache()
+	template1 = ul4.totemplate(node())
+	# For an equal tree the cached template is used without publishing the tree
+	def string(self, **publishargs):
+		raise AssertionError("string() called")
+	monkeypatch.setattr(xsc.Node, "string", string)
+	assert ul4.totemplate(node()) is template1
+	monkeypatch.undo()
+
+	# The attribute order is part of the fingerprint
+	template2 = ul4.totemplate(html.p(id="a", class_="b"))
+	template3 = ul4.totemplate(html.p(class_="b", id="a"))
+	assert template2.renders() == '<p id="a" class="b"></p>'
+	assert template3.renders() == '<p class="b" id="a"></p>'
+
+	# Unhashable publishing arguments fall back to using the source
+	template4 = ul4.totemplate(node(), prefixes={"html": html})
+	assert ul4.totemplate(node(), prefixes={"html": html}) is template4
+	assert template4 is not template1
@@ -161,6 +161,63 @@ def test_onlyoftype():
 	assert res[2] is node[2]
 
 
+def test_nthchild():
+	e = html.ul(html.li(i) for i in range(6))
+	assert [str(n) for n in e.walknodes(html.li & xfind.nthchild("even"))] == ["0", "2", "4"]
+	assert [str(n) for n in e.walknodes(html.li & xfind.nthchild("odd"))] == ["1", "3", "5"]
+	assert [str(n) for n in e.walknodes(html.li & xfind.nthchild(-1))] == ["5"]
+	assert [str(n) for n in e.walknodes(html.li & xfind.nthchild(0))] == ["0"]
+
+
+def test_nthoftype():
+	e = html.div(html.p(0), html.h1(1), html.p(2), html.h1(3), html.p(4))
+	assert [str(n) for n in e.walknodes(xfind.nthoftype("even", html.p))] == ["0", "4"]
+	assert [str(n) for n in e.walknodes(xfind.nthoftype("odd", html.p))] == ["2"]
+	assert [str(n) for n in e.walknodes(html.h1[-1])] == ["3"]
+	assert [str(n) for n in e.walknodes(xfind.nthoftype(0) & xsc.Element)] == ["0", "1"]
+
+
+def test_siblingcombinators():
+	e = html.div(html.h1(0), html.p(1), html.p(2), html.h2(3), html.p(4))
+	assert [str(n) for n in e.walknodes(html.h1*html.p)] == ["1"]
+	assert [str(n) for n in e.walknodes(html.h2*html.p)] == ["4"]
+	assert [str(n) for n in e.walknodes(html.h1**html.p)] == ["1", "2", "4"]
+	assert [str(n) for n in e.walknodes(html.h2**html.p)] == ["4"]
+	assert [str(n) for n in e.walknodes(xfind.nthchild(0)*html.p)] == ["1"]
+
+
+def test_siblingcache_modified():
+	# The cached sibling information must be updated when the tree changes during the walk
+	e = html.ul(html.li(i) for i in range(5))
+	result = []
+	for cursor in e.walk(html.li & xfind.nthchild("odd")):
+		result.append(str(cursor.node))
+		if str(cursor.node) == "1":
+			e.insert(0, html.li("x"))
+	assert result == ["1", "2", "4"]
+
+
+def test_siblingcache_replaced():
+	# Replacing a sibling in place must invalidate the cached sibling groups
+	e = html.tr(html.td(i) for i in range(4))
+	result = []
+	for cursor in e.walk(html.td, enterelementnode=True):
+		path = cursor.path
+		result.append((str(path[-1]), path in xfind.nthoftype("odd", html.td)))
+		if str(path[-1]) == "0":
+			e[1] = html.th("x")
+	assert result == [("0", False), ("2", True), ("3", False)]
+
+
+def test_siblingcache_itertree():
+	# The tree grows during :func:`parse.itertree`, so the cache must be updated
+	source = b"<ul>" + b"".join(b"<li>%d</li>" % i for i in range(6)) + b"</ul>"
+	result = [str(c.node) for c in parse.itertree(parse.String(source), parse.Expat(), parse.NS(html), parse.Node(), selector=html.li & xfind.nthchild("odd"))]
+	assert result == ["1", "3", "5"]
+	result = [str(c.node) for c in parse.itertree(parse.String(source), parse.Expat(), parse.NS(html), parse.Node(), selector=html.li*html.li)]
+	assert result == ["1", "2", "3", "4", "5"]
+
+
 def test_hasattr():
 	# hasattr
 	res = list(node.walknodes(xfind.hasattr("class")))